@@ -5,45 +5,84 @@ import utils
 st.markdown("# 📥 Plan d'Action & Exports")
 
 # Load and Filter Data
-df = utils.load_data()
+df = utils.load_data(utils.CORE_COLUMNS)
 filtered_df = utils.render_filters(df)
 
 if filtered_df.empty:
     st.warning("Aucune donnée pour les filtres sélectionnés.")
     st.stop()
 
-# Calculate RFM for all filtered customers
-st.info("Calcul des segments sur la population filtrée...")
-rfm_df = utils.calculate_rfm(filtered_df)
+# RFM for all filtered customers (read from the nightly snapshot when the filters match a preset)
+cube = utils.filtered_cube()
+source = cube if cube is not None else filtered_df
+built_at = utils.snapshot_built_at()
+if built_at is not None:
+    rfm_df = utils.memoized('rfm', utils.calculate_rfm, source)
+    st.caption(f"Segments précalculés (snapshot du {built_at}).")
+else:
+    with st.spinner("Calcul des segments sur la population filtrée..."):
+        rfm_df = utils.memoized('rfm', utils.calculate_rfm, source)
 
 # Display Table
 st.subheader("Liste Activable")
 st.write("Utilisez cette liste pour vos campagnes marketing (emailing, relance, etc.).")
 
-# Filter by Segment in the page
+# Segment and score filters are applied before joining the predictions, returns and recommendations
 segments = ['All'] + sorted(rfm_df['Segment'].unique().tolist())
 selected_segment = st.selectbox("Filtrer par Segment :", segments)
+min_score, max_score = st.slider("Score RFM :", 3, 12, (3, 12))
+rfm_df = utils.select_customers(rfm_df, None if selected_segment == 'All' else [selected_segment], min_score, max_score)
+
+# Predicted value (BG/NBD + Gamma-Gamma over the next 12 months) next to the RFM scores
+with st.spinner("Ajustement du modèle de CLV prédictive..."):
+    predictions = utils.memoized('clv_predicted', utils.predict_customer_clv, filtered_df)
+rfm_df = rfm_df.join(predictions)
 
-if selected_segment != 'All':
-    display_df = rfm_df[rfm_df['Segment'] == selected_segment]
+# Cross-sell: products frequently bought with what each customer already bought
+with st.spinner("Calcul des recommandations produits..."):
+    basket_index, recommendations = utils.get_basket()
+rfm_df = rfm_df.join(recommendations)
+
+# Return rate of each customer (returns matched to their purchases at ingestion)
+returns = utils.get_returns()
+if returns is not None:
+    summary = returns[1][returns[1]['Customer ID'].isin(rfm_df.index)]
+    rfm_df = rfm_df.join(utils.return_rates(summary, 'Customer ID')['ReturnRate'])
 else:
-    display_df = rfm_df
+    rfm_df['ReturnRate'] = float('nan')
 
-# Select columns to display
-cols = ['Recency', 'Frequency', 'Monetary', 'RFM_Score', 'Segment', 'RFM_Segment']
-display_df = display_df[cols].sort_values('Monetary', ascending=False)
+sort_options = {"CLV prédite (12 mois)": 'PredictedCLV', "Montant (Monetary)": 'Monetary', "Probabilité d'activité": 'PAlive'}
+sort_by = st.selectbox("Trier par :", list(sort_options))
+cols = ['Recency', 'Frequency', 'Monetary', 'RFM_Score', 'Segment', 'RFM_Segment', 'PAlive', 'ExpectedPurchases', 'PredictedCLV', 'ReturnRate', 'CrossSell']
+display_df = rfm_df[cols].sort_values(sort_options[sort_by], ascending=False)
 
 st.dataframe(display_df, width='stretch')
 
-# Export Button
-csv = display_df.to_csv().encode('utf-8')
+# Export: written in chunks to a temporary file only when the button is clicked
+export_cols = st.multiselect("Colonnes exportées :", cols, default=cols)
+export_format = st.radio("Format :", utils.EXPORT_FORMATS, horizontal=True,
+                         format_func={'csv': 'CSV', 'csv.gz': 'CSV compressé (gzip)', 'parquet': 'Parquet'}.get)
 
 st.download_button(
-    label="📥 Télécharger la liste (CSV)",
-    data=csv,
-    file_name=f'action_plan_{selected_segment}.csv',
-    mime='text/csv',
+    label="📥 Télécharger la liste",
+    data=lambda: utils.export_file(rfm_df, export_format, display_df.index, export_cols or cols),
+    file_name=f'action_plan_{selected_segment}.{export_format}',
+    mime=utils.EXPORT_MIME_TYPES[export_format],
 )
+st.caption(f"{len(display_df):,} clients. Pour les flux CRM planifiés : `python -m app.analytics.exports` (voir README).")
+
+# Frequently bought together: top products of the basket index for a chosen product
+with st.expander("🛒 Produits fréquemment achetés ensemble"):
+    products = basket_index['Antecedent'].unique()
+    selected_product = st.selectbox("Produit (StockCode) :", products)
+    st.dataframe(basket_index[basket_index['Antecedent'] == selected_product].drop(columns='Antecedent').set_index('Rank')
+                 .style.format({'Support': '{:.2%}', 'Confidence': '{:.1%}', 'Lift': '{:.2f}'}), width='stretch')
+    st.download_button(
+        label="📥 Télécharger l'index produits (CSV)",
+        data=basket_index.to_csv(index=False).encode('utf-8'),
+        file_name='frequently_bought_with.csv',
+        mime='text/csv',
+    )
 
 st.markdown("### 📸 Export des Graphiques")
 st.write("Pour exporter les graphiques des autres pages, utilisez le menu '...' en haut à droite de chaque graphique (fonctionnalité native Plotly/Streamlit).")
@@ -0,0 +1,18 @@
+"""Analytics core of the dashboard (cohorts, RFM, CLV, filters), usable without Streamlit."""
+from .data import CORE_COLUMNS, processed_path, processed_dir, compact_frame, read_data, read_cube, is_cube
+from .filters import FilterIndex, filter_data, filter_cube, filter_state_key, dataset_token
+from .cache import AnalyticsCache
+from .cohorts import (month_ordinals, months_to_periods, add_cohort_columns, cohort_pairs,
+                      calculate_cohorts, cohort_tables, calculate_clv_empirical)
+from .rfm import (SEGMENT_SCORE_BINS, SEGMENT_LABELS, calculate_rfm, rfm_values, score_rfm, label_rfm,
+                  monthly_activity, rfm_history, segment_transitions)
+from .kpis import revenue_trend, kpi_summary
+from .rollups import ROLLUP_GRAINS, RollupStore
+from .scenarios import (calculate_clv_formula, simulate_scenarios, SCENARIO_AXES, scenario_clv, clv_grid,
+                        scenario_tornado, target_baselines, simulate_targets)
+from .outofcore import PartitionedStore, partition_cube
+from .bootstrap import BOOTSTRAP_METRICS, bootstrap_replicates, scenario_intervals, bootstrap_scenarios
+from .clv_models import customer_summary, BetaGeoModel, GammaGammaModel, predict_clv, fit_predict_clv
+from .live import LIVE_COLUMNS, LiveAggregates, LiveFeed
+from .sketches import HyperLogLog, QuantileSketch, SketchIndex, whole_months
+from .returns import read_returns, customer_cohorts, return_rates
@@ -0,0 +1,133 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .data import processed_path, processed_dir, compact_frame, read_data
+
+# Market basket analysis over StockCode: every pair statistic comes from one sparse product of the
+# binary invoice x product matrix with itself (co-occurrence counts, item counts on the diagonal).
+BASKET_COLUMNS = ['Invoice', 'StockCode', 'Description', 'Quantity', 'Customer ID']
+BASKET_INDEX_FILE = 'basket_index.parquet'
+TOP_K = 10
+
+def purchase_lines(df):
+    """Purchase lines only: cancellations and negative quantities say nothing about co-purchases."""
+    invoices = df['Invoice'].astype('category')
+    is_cancellation = invoices.cat.categories.astype(str).str.startswith('C')[invoices.cat.codes.to_numpy()]
+    keep = ~is_cancellation
+    if 'Quantity' in df:
+        keep &= df['Quantity'].to_numpy() > 0
+    return df[keep]
+
+def incidence_matrix(rows, columns, column_labels=None):
+    """Sparse binary (row label x column label) matrix of the pairs, with the row and column labels.
+
+    Pairs whose column is not in column_labels (when given) are dropped.
+    """
+    row_codes, row_labels = pd.factorize(rows, sort=True)
+    if column_labels is None:
+        column_codes, column_labels = pd.factorize(columns, sort=True)
+    else:
+        column_codes = pd.Index(column_labels).get_indexer(columns)
+        row_codes, column_codes = row_codes[column_codes >= 0], column_codes[column_codes >= 0]
+    matrix = sparse.csr_matrix((np.ones(len(row_codes), dtype=np.int32), (row_codes, column_codes)),
+                               shape=(len(row_labels), len(column_labels)))
+    matrix.data[:] = 1  # repeated lines of a product in one invoice count once
+    return matrix, row_labels, pd.Index(column_labels)
+
+def basket_matrix(df):
+    """Binary invoice x product matrix of the purchase lines, with invoice and product labels."""
+    purchases = purchase_lines(df)
+    return incidence_matrix(purchases['Invoice'].astype(str).to_numpy(), purchases['StockCode'].astype(str).to_numpy())
+
+def association_rules(df, min_count=2):
+    """Rules A -> B for every pair of products bought together in at least min_count invoices.
+
+    Support: share of invoices with both; confidence: share of A's invoices that also have B;
+    lift: confidence over B's own support (> 1 when B is bought with A more than by chance).
+    """
+    matrix, _, products = basket_matrix(df)
+    n_invoices = matrix.shape[0]
+    co_occurrence = (matrix.T @ matrix).tocoo()
+    item_counts = co_occurrence.diagonal()
+
+    keep = (co_occurrence.row != co_occurrence.col) & (co_occurrence.data >= min_count)
+    antecedents, consequents = co_occurrence.row[keep], co_occurrence.col[keep]
+    counts = co_occurrence.data[keep].astype(np.int64)
+    confidence = counts / item_counts[antecedents]
+    return pd.DataFrame({
+        'Antecedent': products[antecedents],
+        'Consequent': products[consequents],
+        'Count': counts,
+        'Support': counts / n_invoices,
+        'Confidence': confidence,
+        'Lift': confidence / (item_counts[consequents] / n_invoices),
+    })
+
+def basket_index(df, top_k=TOP_K, min_count=2):
+    """Top-K 'frequently bought with' products of each product, by lift then co-purchase count."""
+    rules = association_rules(df, min_count)
+    rules = rules.sort_values(['Antecedent', 'Lift', 'Count'], ascending=[True, False, False], ignore_index=True)
+    rules.insert(2, 'Rank', rules.groupby('Antecedent').cumcount() + 1)
+    index = rules[rules['Rank'] <= top_k].reset_index(drop=True)
+    if 'Description' in df:
+        descriptions = df.groupby(df['StockCode'].astype(str), observed=True)['Description'].first().astype(str)
+        index.insert(3, 'ConsequentDescription', index['Consequent'].map(descriptions))
+    return index
+
+def cross_sell(df, index, n_recommendations=3):
+    """Recommended products per customer, from the basket index and their own purchases.
+
+    A candidate scores the sum of its lifts with every product the customer bought; products the
+    customer already bought are excluded. Returns a CrossSell column (StockCodes, best first).
+    """
+    purchases = purchase_lines(df)
+    products = pd.Index(np.union1d(index['Antecedent'].unique(), index['Consequent'].unique()))
+    bought, customers, _ = incidence_matrix(purchases['Customer ID'].to_numpy(),
+                                            purchases['StockCode'].astype(str).to_numpy(), products)
+    lifts = sparse.csr_matrix((index['Lift'].to_numpy(), (products.get_indexer(index['Antecedent']),
+                                                          products.get_indexer(index['Consequent']))),
+                              shape=(len(products), len(products)))
+
+    scores = (bought @ lifts).tocsr()
+    scores = (scores - scores.multiply(bought)).tocoo()
+    scores.eliminate_zeros()
+
+    # Best n per customer: sort by customer then descending score, keep the first n of each run
+    order = np.lexsort((-scores.data, scores.row))
+    rows, columns = scores.row[order], scores.col[order]
+    starts = np.r_[0, np.flatnonzero(rows[1:] != rows[:-1]) + 1]
+    rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    keep = rank < n_recommendations
+    recommendations = pd.Series(products[columns[keep]], index=customers[rows[keep]])
+    return recommendations.groupby(level=0, sort=False).agg(', '.join).rename('CrossSell').rename_axis('Customer ID').to_frame()
+
+def write_basket_index(index, data_dir=None):
+    """Save the basket index next to the processed data."""
+    path = os.path.join(processed_dir(data_dir), BASKET_INDEX_FILE)
+    index.to_parquet(path, index=False)
+    return path
+
+def read_basket_index(data_dir=None):
+    """Stored basket index (python -m app.analytics.basket), or None if it has not been built."""
+    path = processed_path(BASKET_INDEX_FILE, data_dir)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app.analytics.basket',
+                                     description="Build the 'frequently bought with' index of every product.")
+    parser.add_argument('--data-dir', default=None, help="Processed data directory (default: data/processed).")
+    parser.add_argument('--top-k', type=int, default=TOP_K, help="Products kept per product.")
+    parser.add_argument('--min-count', type=int, default=2, help="Minimum number of invoices with both products.")
+    args = parser.parse_args(argv)
+    df = compact_frame(read_data(BASKET_COLUMNS, args.data_dir))
+    index = basket_index(df, args.top_k, args.min_count)
+    print(f"Wrote {write_basket_index(index, args.data_dir)} ({index['Antecedent'].nunique()} products, {len(index)} rules)")
+
+if __name__ == '__main__':
+    main()
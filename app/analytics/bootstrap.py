@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from .scenarios import customer_activity, average_retention, calculate_clv_formula, scenario_clv
+
+BOOTSTRAP_METRICS = ['Retention', 'AvgOrderValue', 'PurchaseFreq']
+
+def bootstrap_inputs(df):
+    """Per-customer arrays resampled by the bootstrap (line items or customer-month cube).
+
+    Activity pairs are grouped by (cohort, age) cell so that a replicate's cell counts are sums of
+    customer weights over contiguous runs.
+    """
+    _, revenue, invoices, customers, months = customer_activity(df)
+    is_first = np.r_[True, customers[1:] != customers[:-1]]
+    cohort_of_customer = months[is_first]
+    pair_cohorts = cohort_of_customer[customers]
+
+    first_cohort = cohort_of_customer.min()
+    n_cohorts = cohort_of_customer.max() - first_cohort + 1
+    ages = months - pair_cohorts
+    n_ages = ages.max() + 1
+    cells = (pair_cohorts - first_cohort) * n_ages + ages
+    order = np.argsort(cells, kind='stable')
+    cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    return {
+        'revenue': revenue,
+        'invoices': invoices,
+        'pair_customers': customers[order],
+        'cell_starts': starts,
+        'cells': cells[starts],
+        'shape': (n_cohorts, n_ages),
+    }
+
+def replicate_metrics(inputs, weights):
+    """Retention, AOV and purchase frequency for a batch of customer weight vectors (one row each)."""
+    revenue = weights @ inputs['revenue']
+    invoices = weights @ inputs['invoices']
+    n_customers = weights.sum(axis=1)
+
+    # Weighted distinct customers per (cohort, age) cell, scattered back to full matrices
+    pair_weights = weights[:, inputs['pair_customers']]
+    cell_counts = np.add.reduceat(pair_weights, inputs['cell_starts'], axis=1)
+    n_cohorts, n_ages = inputs['shape']
+    counts = np.zeros((len(weights), n_cohorts * n_ages))
+    counts[:, inputs['cells']] = cell_counts
+    retention = average_retention(counts.reshape(len(weights), n_cohorts, n_ages))
+
+    return np.column_stack([retention, revenue / invoices, invoices / n_customers])
+
+def bootstrap_batch(inputs, n_replicates, seed):
+    """Metrics of n_replicates customer resamples drawn from one seed."""
+    rng = np.random.default_rng(seed)
+    n_customers = len(inputs['revenue'])
+    # Resampling n customers with replacement = multinomial counts of each customer
+    weights = rng.multinomial(n_customers, np.full(n_customers, 1 / n_customers), size=n_replicates).astype(float)
+    return replicate_metrics(inputs, weights)
+
+def resample(inputs, n_replicates=1000, seed=0, batch_size=None):
+    """Bootstrap metrics of n_replicates resamples of bootstrap_inputs, in seeded batches."""
+    if batch_size is None:
+        # Keep each batch's (replicates x activity pairs) weight matrix around 2M entries
+        batch_size = max(1, min(n_replicates, 2_000_000 // max(len(inputs['pair_customers']), 1)))
+    sizes = [min(batch_size, n_replicates - start) for start in range(0, n_replicates, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    # In process: the batches are matrix products already, a process pool only added pickling overhead
+    batches = [bootstrap_batch(inputs, size, batch_seed) for size, batch_seed in zip(sizes, seeds)]
+    return pd.DataFrame(np.vstack(batches), columns=BOOTSTRAP_METRICS)
+
+def bootstrap_replicates(df, n_replicates=1000, seed=0, batch_size=None):
+    """Bootstrap distribution of retention, AOV and purchase frequency, resampling customers.
+    
+    Replicates are drawn in batches, each from its own child of SeedSequence(seed): for a given dataset
+    and batch size the result is reproducible.
+    """
+    return resample(bootstrap_inputs(df), n_replicates, seed, batch_size)
+
+def scenario_intervals(estimate, replicates, margin, retention_delta=0.0, discount_rate=0.1, avg_discount=0.0, confidence=0.95):
+    """Percentile confidence intervals of the scenario inputs and CLV from bootstrap replicates.
+    
+    estimate holds the full-sample (retention, AOV, frequency); the replicates can be reused for any
+    scenario parameters since only the CLV formula depends on them.
+    """
+    def with_clv(retention, aov, freq):
+        baseline = calculate_clv_formula(aov, freq, margin, retention, discount_rate)
+        scenario = scenario_clv(aov, freq, retention, margin, retention_delta, discount_rate, avg_discount)
+        return [retention, aov, freq, baseline, scenario]
+    
+    metrics = BOOTSTRAP_METRICS + ['BaselineCLV', 'ScenarioCLV']
+    samples = np.column_stack(with_clv(*replicates[BOOTSTRAP_METRICS].to_numpy().T))
+    alpha = (1 - confidence) / 2
+    return pd.DataFrame({
+        'Estimate': np.array(with_clv(*estimate), dtype=float),
+        'Lower': np.quantile(samples, alpha, axis=0),
+        'Upper': np.quantile(samples, 1 - alpha, axis=0),
+        'StdErr': samples.std(axis=0, ddof=1),
+    }, index=pd.Index(metrics, name='Metric'))
+
+def bootstrap_scenarios(df, margin, retention_delta=0.0, discount_rate=0.1, avg_discount=0.0,
+                        n_replicates=1000, confidence=0.95, seed=0):
+    """Point estimates and percentile confidence intervals of the scenario inputs and CLV."""
+    inputs = bootstrap_inputs(df)
+    estimate = replicate_metrics(inputs, np.ones((1, len(inputs['revenue']))))[0]
+    replicates = resample(inputs, n_replicates, seed)
+    return scenario_intervals(estimate, replicates, margin, retention_delta, discount_rate, avg_discount, confidence)
@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+class AnalyticsCache:
+    """Size-bounded LRU cache of filtered frames and derived analytics, shared by all pages and sessions."""
+    
+    def __init__(self, max_entries=64, max_bytes=512 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+    
+    @staticmethod
+    def sizeof(value):
+        """Approximate memory footprint of a cached result."""
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            size = value.memory_usage(index=True)
+            return int(size.sum()) if isinstance(value, pd.DataFrame) else int(size)
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, (tuple, list)):
+            return sum(AnalyticsCache.sizeof(v) for v in value)
+        if isinstance(value, dict):
+            return sum(AnalyticsCache.sizeof(v) for v in value.values())
+        return 64
+    
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        
+        # Computed outside the lock so other sessions are not blocked meanwhile
+        value = compute()
+        size = self.sizeof(value)
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self.bytes += size
+                while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self.bytes -= evicted_size
+                    self.evictions += 1
+        return value
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+    
+    def stats(self):
+        """Hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+            }
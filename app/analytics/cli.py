@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+
+from .data import CORE_COLUMNS, compact_frame, read_data, read_cube
+from .filters import filter_data, filter_cube
+from .cohorts import calculate_cohorts, calculate_clv_empirical
+from .rfm import calculate_rfm
+from .kpis import revenue_trend, kpi_summary
+from .scenarios import simulate_scenarios
+from .outofcore import PartitionedStore
+
+def parse_filter_spec(args):
+    """Filter state from a JSON spec file, overridden by explicit command-line options."""
+    spec = {'country_filter': ['All'], 'date_range': None, 'min_order_value': 0, 'returns_mode': 'Inclure'}
+    if args.spec:
+        with open(args.spec) as f:
+            spec.update(json.load(f))
+    if args.countries:
+        spec['country_filter'] = args.countries
+    if args.start or args.end:
+        current = spec['date_range'] or [None, None]
+        spec['date_range'] = [args.start or current[0], args.end or current[1]]
+    if args.min_order is not None:
+        spec['min_order_value'] = args.min_order
+    if args.returns_mode:
+        spec['returns_mode'] = args.returns_mode
+    return spec
+
+def export_analytics(spec, output_dir, data_dir=None, discount_rate=0.1, use_cube=True, out_of_core=False):
+    """Compute every dashboard analytic for a filter spec and write them to output_dir."""
+    date_range = spec['date_range']
+    if out_of_core:
+        # Partitions are streamed and reduced to a cube: the line items are never loaded at once
+        store = PartitionedStore(data_dir=data_dir)
+        if date_range and None in date_range:
+            months = store.months()
+            date_range = [date_range[0] or months[0].start_time.date(), date_range[1] or months[-1].end_time.date()]
+        filters = dict(spec, date_range=date_range)
+        cube = store.cube(**filters)
+        source = cube
+    else:
+        df = compact_frame(read_data(CORE_COLUMNS, data_dir))
+        if date_range and None in date_range:
+            dates = df['InvoiceDate']
+            date_range = [date_range[0] or dates.min().date(), date_range[1] or dates.max().date()]
+        filters = dict(spec, date_range=date_range)
+        filtered_df = filter_data(df, **filters)
+        cube = filter_cube(read_cube(data_dir), **filters) if use_cube else None
+        source = cube if cube is not None else filtered_df
+    
+    retention, cohort_sizes, cohort_counts = calculate_cohorts(source)
+    clv_curve = calculate_clv_empirical(source)
+    kpis = kpi_summary(source)
+    kpis['avg_retention'] = float(retention.iloc[:, 1:].mean().mean())
+    kpis['avg_clv_empirical'] = float(clv_curve.max()) if not clv_curve.empty else 0.0
+    kpis['scenario_baseline'] = {k: float(v) for k, v in simulate_scenarios(source, 0, 0, discount_rate).items()}
+    
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = {
+        'rfm.csv': calculate_rfm(source),
+        'retention.csv': retention,
+        'cohort_sizes.csv': cohort_sizes.rename('CohortSize'),
+        'cohort_counts.csv': cohort_counts,
+        'clv_empirical.csv': clv_curve.rename('CumulativeRevenuePerCustomer'),
+        'revenue_trend_month.csv': revenue_trend(source, 'Mois'),
+        'revenue_trend_quarter.csv': revenue_trend(source, 'Trimestre'),
+    }
+    written = []
+    for name, table in outputs.items():
+        path = os.path.join(output_dir, name)
+        table.to_csv(path, index=not name.startswith('revenue_trend'))
+        written.append(path)
+    
+    path = os.path.join(output_dir, 'kpis.json')
+    with open(path, 'w') as f:
+        json.dump({'filters': {**filters, 'date_range': [str(d) for d in date_range] if date_range else None},
+                   'source': 'partitions' if out_of_core else 'cube' if cube is not None else 'lines', 'kpis': kpis}, f, indent=2)
+    written.append(path)
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app.analytics',
+                                     description="Compute and export the dashboard analytics for a filter spec (no Streamlit needed).")
+    parser.add_argument('--spec', help="JSON file with country_filter, date_range, min_order_value and returns_mode.")
+    parser.add_argument('--countries', nargs='+', help="Countries to keep (default: All).")
+    parser.add_argument('--start', help="First day of the period (YYYY-MM-DD).")
+    parser.add_argument('--end', help="Last day of the period, inclusive (YYYY-MM-DD).")
+    parser.add_argument('--min-order', type=float, default=None, help="Minimum invoice total (£).")
+    parser.add_argument('--returns-mode', choices=['Inclure', 'Exclure', 'Neutraliser'])
+    parser.add_argument('--discount-rate', type=float, default=0.1)
+    parser.add_argument('--data-dir', default=None, help="Processed data directory (default: data/processed).")
+    parser.add_argument('--output', default='exports/analytics', help="Output directory.")
+    parser.add_argument('--no-cube', action='store_true', help="Always compute from line items.")
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="Stream the month-partitioned store one partition at a time (datasets larger than RAM).")
+    args = parser.parse_args(argv)
+    
+    spec = parse_filter_spec(args)
+    for path in export_analytics(spec, args.output, args.data_dir, args.discount_rate, use_cube=not args.no_cube,
+                                 out_of_core=args.out_of_core):
+        print(f"Wrote {path}")
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import gammaln, hyp2f1
+
+from .data import is_cube
+
+# Customer-level predictive CLV: BG/NBD for the purchase process, Gamma-Gamma for spend per order.
+# Times are in days; a purchase invoice is a transaction (as for the RFM Frequency), cancellations are not.
+
+def customer_summary(df, observation_end=None):
+    """Per-customer (frequency, recency, T, monetary) from line items, cancellation invoices left out.
+
+    frequency: repeat invoices (invoices - 1); recency: days from first to last invoice;
+    T: days from first invoice to the end of the observation period (by default the last invoice
+    date of df); monetary: average invoice value. The cube mixes cancellations into its invoice
+    counts and dates, so it cannot be used here.
+    """
+    if is_cube(df):
+        raise ValueError("customer_summary needs line items: the cube counts cancellation invoices as transactions")
+    invoices = df['Invoice'].astype('category')
+    is_cancellation = invoices.cat.categories.astype(str).str.startswith('C')[invoices.cat.codes.to_numpy()]
+    purchases = df[~is_cancellation]
+    customers = purchases.groupby('Customer ID', observed=True).agg(
+        First=('InvoiceDate', 'min'),
+        Last=('InvoiceDate', 'max'),
+        Invoices=('Invoice', 'nunique'),
+        Revenue=('TotalAmount', 'sum'),
+    )
+    if observation_end is None:
+        observation_end = df['InvoiceDate'].max()
+    day = pd.Timedelta(days=1)
+    return pd.DataFrame({
+        'frequency': customers['Invoices'] - 1,
+        'recency': (customers['Last'] - customers['First']) / day,
+        'T': (pd.Timestamp(observation_end) - customers['First']) / day,
+        'monetary': customers['Revenue'] / customers['Invoices'],
+    })
+
+def compress(columns):
+    """Distinct rows of the given arrays with their counts, and the inverse mapping back to customers."""
+    stacked = np.column_stack(columns)
+    unique, inverse, counts = np.unique(stacked, axis=0, return_inverse=True, return_counts=True)
+    return unique.T, inverse.ravel(), counts
+
+class BetaGeoModel:
+    """BG/NBD model (Fader, Hardie & Lee 2005) with parameters r, alpha, a, b."""
+
+    def __init__(self, penalizer=0.0):
+        self.penalizer = penalizer
+        self.params = None
+
+    @staticmethod
+    def log_likelihood(params, frequency, recency, T):
+        """Per-customer log-likelihood, vectorized over customers."""
+        r, alpha, a, b = params
+        x, t_x = frequency, recency
+        common = (gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+                  + gammaln(a + b) + gammaln(b + x) - gammaln(b) - gammaln(a + b + x))
+        alive = -(r + x) * np.log(alpha + T)
+        # Term of customers who may have dropped out after their last purchase (repeat buyers only)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dropped = np.where(x > 0, np.log(a) - np.log(np.maximum(b + x - 1, 1e-12)) - (r + x) * np.log(alpha + t_x), -np.inf)
+        return common + np.logaddexp(alive, dropped)
+
+    def fit(self, summary, initial=None, warm_start=True):
+        """Maximum likelihood fit on distinct (frequency, recency, T) rows weighted by their counts.
+
+        Refits start from the current parameters (warm start) unless initial is given.
+        """
+        (x, t_x, T), _, counts = compress([summary['frequency'], summary['recency'], summary['T']])
+        scale = T.max() / 10 if len(T) else 1.0  # alpha is fitted on rescaled times for conditioning
+        if initial is None:
+            initial = self.params if warm_start and self.params is not None else {'r': 1.0, 'alpha': scale, 'a': 1.0, 'b': 1.0}
+        start = np.log([initial['r'], initial['alpha'] / scale, initial['a'], initial['b']])
+
+        def objective(log_params):
+            params = np.exp(log_params)
+            ll = self.log_likelihood(params, x, t_x / scale, T / scale)
+            return -(counts @ ll) / counts.sum() + self.penalizer * (params ** 2).sum()
+
+        result = minimize(objective, start, method='L-BFGS-B', bounds=[(-10, 10)] * 4)
+        r, alpha, a, b = np.exp(result.x)
+        self.params = {'r': float(r), 'alpha': float(alpha * scale), 'a': float(a), 'b': float(b)}
+        self.log_likelihood_ = -result.fun * counts.sum()
+        return self
+
+    def probability_alive(self, summary):
+        """Probability that each customer is still active at the end of the observation period."""
+        r, alpha, a, b = (self.params[k] for k in ('r', 'alpha', 'a', 'b'))
+        x, t_x, T = (np.asarray(summary[c], dtype=float) for c in ('frequency', 'recency', 'T'))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            odds = np.where(x > 0, a / (b + x - 1) * ((alpha + T) / (alpha + t_x)) ** (r + x), 0.0)
+        return 1 / (1 + odds)
+
+    def expected_purchases(self, t, summary):
+        """Expected number of purchases of each customer in the next t days (t may be an array: one column each)."""
+        r, alpha, a, b = (self.params[k] for k in ('r', 'alpha', 'a', 'b'))
+        x, t_x, T = (np.asarray(summary[c], dtype=float)[:, None] for c in ('frequency', 'recency', 'T'))
+        t = np.atleast_1d(np.asarray(t, dtype=float))[None, :]
+        ratio = (alpha + T) / (alpha + T + t)
+        head = (a + b + x - 1) / (a - 1)
+        body = 1 - ratio ** (r + x) * hyp2f1(r + x, b + x, a + b + x - 1, t / (alpha + T + t))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            odds = np.where(x > 0, a / (b + x - 1) * ((alpha + T) / (alpha + t_x)) ** (r + x), 0.0)
+        expected = head * body / (1 + odds)
+        return expected[:, 0] if expected.shape[1] == 1 else expected
+
+class GammaGammaModel:
+    """Gamma-Gamma spend model (Fader, Hardie & Lee 2005) with parameters p, q, v."""
+
+    def __init__(self, penalizer=0.0):
+        self.penalizer = penalizer
+        self.params = None
+
+    @staticmethod
+    def log_likelihood(params, transactions, monetary):
+        """Per-customer log-likelihood of the average spend over `transactions` orders."""
+        p, q, v = params
+        n, m = transactions, monetary
+        return (gammaln(p * n + q) - gammaln(p * n) - gammaln(q) + q * np.log(v)
+                + (p * n - 1) * np.log(m) + p * n * np.log(n) - (p * n + q) * np.log(n * m + v))
+
+    def fit(self, summary, initial=None, warm_start=True):
+        """Maximum likelihood fit on repeat customers with a positive average spend (warm-started on refits).
+
+        As in the original model, one-time buyers are left out of the fit: their single order says
+        nothing about the spread of a customer's order values. expected_spend still covers them.
+        """
+        spenders = summary[(summary['frequency'] > 0) & (summary['monetary'] > 0)]
+        (n, m), _, counts = compress([spenders['frequency'] + 1, spenders['monetary']])
+        if initial is None:
+            initial = self.params if warm_start and self.params is not None else {'p': 1.0, 'q': 1.0, 'v': 1.0}
+        scale = np.median(m) if len(m) else 1.0  # v is fitted on rescaled amounts for conditioning
+        start = np.log([initial['p'], initial['q'], initial['v'] / scale])
+
+        def objective(log_params):
+            params = np.exp(log_params)
+            ll = self.log_likelihood(params, n, m / scale)
+            return -(counts @ ll) / counts.sum() + self.penalizer * (params ** 2).sum()
+
+        result = minimize(objective, start, method='L-BFGS-B', bounds=[(-10, 10)] * 3)
+        p, q, v = np.exp(result.x)
+        self.params = {'p': float(p), 'q': float(q), 'v': float(v * scale)}
+        return self
+
+    def expected_spend(self, summary):
+        """Expected average invoice value of each customer (population mean when its own is not positive)."""
+        p, q, v = (self.params[k] for k in ('p', 'q', 'v'))
+        n = np.asarray(summary['frequency'], dtype=float) + 1
+        m = np.asarray(summary['monetary'], dtype=float)
+        population_mean = p * v / (q - 1) if q > 1 else np.nan
+        individual = (q - 1) / (p * n + q - 1) * population_mean + p * n / (p * n + q - 1) * m
+        return np.where(m > 0, individual, population_mean)
+
+def predict_clv(summary, purchase_model, spend_model, months=12, discount_rate=0.01, margin=1.0):
+    """Predicted purchases, probability alive, spend and discounted CLV over the next `months` months.
+
+    CLV sums the expected purchases of each 30-day period times the expected spend, discounted
+    at discount_rate per month, times the margin.
+    """
+    horizon = 30.0 * np.arange(months + 1)
+    cumulative = purchase_model.expected_purchases(horizon[1:], summary)
+    cumulative = np.column_stack([np.zeros(len(summary)), cumulative.reshape(len(summary), -1)])
+    discount = (1 + discount_rate) ** -np.arange(1, months + 1)
+    spend = spend_model.expected_spend(summary)
+    return pd.DataFrame({
+        'PAlive': purchase_model.probability_alive(summary),
+        'ExpectedPurchases': cumulative[:, -1],
+        'ExpectedSpend': spend,
+        'PredictedCLV': margin * spend * (np.diff(cumulative, axis=1) @ discount),
+    }, index=summary.index)
+
+def fit_predict_clv(df, months=12, discount_rate=0.01, initial=None):
+    """Fit both models on df and predict; returns the predictions and the fitted parameters.
+
+    initial is a (BG/NBD, Gamma-Gamma) parameter pair from a previous fit, used as a warm start.
+    """
+    summary = customer_summary(df)
+    purchase_initial, spend_initial = initial if initial is not None else (None, None)
+    purchase_model = BetaGeoModel().fit(summary, initial=purchase_initial)
+    spend_model = GammaGammaModel().fit(summary, initial=spend_initial)
+    predictions = predict_clv(summary, purchase_model, spend_model, months, discount_rate)
+    return predictions, (purchase_model.params, spend_model.params)
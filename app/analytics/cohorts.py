@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from .data import is_cube
+
+def month_ordinals(df):
+    """Invoice month of each row as an integer ordinal (months since 1970-01, like Period('M').ordinal)."""
+    months = df['InvoiceMonth'] if 'InvoiceMonth' in df else None
+    if months is not None and pd.api.types.is_integer_dtype(months.dtype):
+        return months.to_numpy(dtype=np.int64)
+    if months is not None and isinstance(months.dtype, pd.PeriodDtype):
+        return pd.PeriodIndex(months).asi8
+    return df['InvoiceDate'].to_numpy().astype('datetime64[M]').astype(np.int64)
+
+def months_to_periods(ordinals):
+    """Convert month ordinals back to a monthly PeriodIndex for display."""
+    return pd.PeriodIndex.from_ordinals(ordinals, freq='M')
+
+def add_cohort_columns(df):
+    """Add CohortMonth and CohortIndex columns to the dataframe (line items or customer-month cube)."""
+    # Shallow copy: new columns are added without duplicating the existing ones
+    df = df.copy(deep=False)
+    
+    # Define Cohort Month (Month of first purchase) on integer month ordinals
+    months = pd.Series(month_ordinals(df), index=df.index)
+    cohort_months = months.groupby(df['Customer ID'].to_numpy()).transform('min')
+    df['CohortMonth'] = months_to_periods(cohort_months.to_numpy())
+    
+    # Calculate Cohort Index (Months since first purchase)
+    df['CohortIndex'] = months - cohort_months + 1
+    
+    return df
+
+def cohort_pairs(df, customer_codes=None):
+    """Distinct (customer code, month ordinal) activity pairs, sorted by customer then month."""
+    if customer_codes is None:
+        customer_codes, _ = pd.factorize(df['Customer ID'])
+    months = month_ordinals(df)
+    first_month = months.min() if len(months) else 0
+    span = (months.max() - first_month + 1) if len(months) else 1
+    keys = np.unique(customer_codes.astype(np.int64) * span + (months - first_month))
+    return keys // span, keys % span + first_month
+
+def calculate_cohorts(df):
+    """Calculate retention matrix and cohort sizes."""
+    customers, months = cohort_pairs(df)
+    
+    # Pairs are sorted by customer then month: the first pair of each customer is its cohort month
+    is_first = np.r_[True, customers[1:] != customers[:-1]]
+    cohort_of_customer = months[is_first]
+    pair_cohorts = cohort_of_customer[np.cumsum(is_first) - 1]
+    
+    # Count distinct customers per (CohortMonth, CohortIndex) cell with one bincount
+    first_cohort = cohort_of_customer.min() if len(cohort_of_customer) else 0
+    n_cohorts = (cohort_of_customer.max() - first_cohort + 1) if len(cohort_of_customer) else 0
+    n_indexes = (months - pair_cohorts).max() + 1 if len(months) else 0
+    cells = (pair_cohorts - first_cohort) * n_indexes + (months - pair_cohorts)
+    counts = np.bincount(cells, minlength=n_cohorts * n_indexes).reshape(n_cohorts, n_indexes)
+    return cohort_tables(counts, first_cohort)
+
+def cohort_tables(counts, first_cohort):
+    """Retention matrix, cohort sizes and counts from a (cohort, age) count matrix starting at first_cohort."""
+    # Keep the cohorts and ages that occur, with NaN for empty cells (as a groupby/pivot would)
+    rows = np.flatnonzero(counts.any(axis=1))
+    cols = np.flatnonzero(counts.any(axis=0))
+    counts = counts[np.ix_(rows, cols)].astype(float)
+    counts[counts == 0] = np.nan
+    cohort_counts = pd.DataFrame(
+        counts,
+        index=months_to_periods(rows + first_cohort).rename('CohortMonth'),
+        columns=pd.Index(cols + 1, name='CohortIndex'),
+    )
+    cohort_sizes = cohort_counts.iloc[:, 0]
+    retention = cohort_counts.divide(cohort_sizes, axis=0)
+    
+    return retention, cohort_sizes, cohort_counts
+
+def calculate_clv_empirical(df):
+    """Calculate Empirical CLV (Cumulative Revenue per Cohort Age)."""
+    # Ensure CohortIndex exists
+    if 'CohortIndex' not in df.columns:
+        df = add_cohort_columns(df)
+
+    # Average revenue per customer at that age
+    # Approach:
+    # 1. Calculate total revenue per cohort per age.
+    # 2. Divide by initial cohort size.
+    # 3. Cumulate over age.
+    
+    amount_column = 'Revenue' if is_cube(df) else 'TotalAmount'
+    cohort_sizes = df.groupby('CohortMonth')['Customer ID'].nunique()
+    
+    cohort_revenue_df = df.groupby(['CohortMonth', 'CohortIndex'])[amount_column].sum().reset_index()
+    cohort_revenue_df = cohort_revenue_df.merge(cohort_sizes.rename('CohortSize'), on='CohortMonth')
+    cohort_revenue_df['RevPerCustomer'] = cohort_revenue_df[amount_column] / cohort_revenue_df['CohortSize']
+    
+    # Average across all cohorts for each age
+    avg_clv_per_age = cohort_revenue_df.groupby('CohortIndex')['RevPerCustomer'].mean().cumsum()
+    
+    return avg_clv_per_age
@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Columns used by the analytics pages (Description, StockCode, Quantity and Price are not displayed)
+CORE_COLUMNS = ['Invoice', 'InvoiceDate', 'InvoiceMonth', 'Customer ID', 'Country', 'TotalAmount']
+
+def processed_path(filename, data_dir=None):
+    """Resolve a file in data/processed whether run from the project root or from app/ (or in data_dir)."""
+    if data_dir is not None:
+        return os.path.join(data_dir, filename)
+    path = os.path.join('data', 'processed', filename)
+    if not os.path.exists(path):
+        path = os.path.join('..', 'data', 'processed', filename)
+    return path
+
+def processed_dir(data_dir=None):
+    """The data/processed directory, from the project root or from app/ (or data_dir)."""
+    if data_dir is not None:
+        return data_dir
+    path = os.path.join('data', 'processed')
+    return path if os.path.isdir(path) else os.path.join('..', 'data', 'processed')
+
+def compact_frame(df):
+    """Memory-compact line items: dictionary-encoded strings, downcast integers, int32 month ordinals."""
+    df = df.copy(deep=False)
+    for column in ('Invoice', 'StockCode', 'Description', 'Country'):
+        if column in df and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(str).astype('category')
+    if 'Customer ID' in df:
+        df['Customer ID'] = df['Customer ID'].astype('int32')
+    if 'Quantity' in df:
+        df['Quantity'] = pd.to_numeric(df['Quantity'], downcast='integer')
+    # Amounts stay float64 so that revenue sums are unchanged
+    if 'InvoiceMonth' in df and isinstance(df['InvoiceMonth'].dtype, pd.PeriodDtype):
+        df['InvoiceMonth'] = pd.PeriodIndex(df['InvoiceMonth']).asi8.astype(np.int32)
+    return df
+
+def read_data(columns=None, data_dir=None):
+    """Read the cleaned dataset: incremental Parquet store, then Parquet file, then CSV."""
+    # Month-partitioned store maintained by `process_data.py --incremental`
+    store_dir = processed_path('online_retail', data_dir)
+    if os.path.isdir(store_dir):
+        df = pd.read_parquet(store_dir, columns=columns)
+        return df.sort_values('InvoiceDate', kind='stable', ignore_index=True) if 'InvoiceDate' in df else df
+
+    parquet_file = processed_path('online_retail_cleaned.parquet', data_dir)
+    if os.path.exists(parquet_file):
+        return pd.read_parquet(parquet_file, columns=columns)
+
+    # CSV fallback: InvoiceMonth is derived from InvoiceDate after parsing
+    usecols = None
+    if columns is not None:
+        usecols = [c for c in columns if c != 'InvoiceMonth']
+        if 'InvoiceMonth' in columns and 'InvoiceDate' not in usecols:
+            usecols.append('InvoiceDate')
+    df = pd.read_csv(processed_path('online_retail_cleaned.csv', data_dir), usecols=usecols)
+        
+    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+    df['InvoiceMonth'] = df['InvoiceDate'].dt.to_period('M')
+    if columns is not None:
+        df = df[columns]
+    return df
+
+def read_cube(data_dir=None):
+    """Read the customer-month cube written by process_data.py (None if it has not been built)."""
+    cube_file = processed_path('customer_month_cube.parquet', data_dir)
+    if not os.path.exists(cube_file):
+        return None
+    return pd.read_parquet(cube_file)
+
+def is_cube(df):
+    """Tell a customer-month cube (one row per Customer ID, InvoiceMonth, Country) from line items."""
+    return 'Lines' in df.columns
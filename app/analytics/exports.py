@@ -0,0 +1,178 @@
+import argparse
+import gzip
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .data import CORE_COLUMNS, compact_frame, read_data, read_cube
+from .filters import filter_data, filter_cube
+from .rfm import calculate_rfm
+from .clv_models import customer_summary, BetaGeoModel, GammaGammaModel, predict_clv
+from .returns import read_returns, return_rates
+from .basket import BASKET_COLUMNS, basket_index, cross_sell, read_basket_index
+from .cli import parse_filter_spec
+
+# Customer activation lists (the action plan table) written in chunks, so that an export never holds
+# more than one chunk of formatted output in memory.
+EXPORT_FORMATS = ['csv', 'csv.gz', 'parquet']
+EXPORT_MIME_TYPES = {'csv': 'text/csv', 'csv.gz': 'application/gzip', 'parquet': 'application/vnd.apache.parquet'}
+ACTIVATION_COLUMNS = ['Recency', 'Frequency', 'Monetary', 'RFM_Score', 'Segment', 'RFM_Segment',
+                      'PAlive', 'ExpectedPurchases', 'PredictedCLV', 'ReturnRate', 'CrossSell']
+CLV_COLUMNS = ['PAlive', 'ExpectedPurchases', 'PredictedCLV']
+EXPORT_CHUNK_ROWS = 50_000
+
+def select_customers(rfm, segments=None, min_score=None, max_score=None):
+    """Rows of an RFM table matching the segment and RFM_Score predicates."""
+    mask = pd.Series(True, index=rfm.index)
+    if segments:
+        mask &= rfm['Segment'].isin(segments)
+    if min_score is not None:
+        mask &= rfm['RFM_Score'] >= min_score
+    if max_score is not None:
+        mask &= rfm['RFM_Score'] <= max_score
+    return rfm[mask]
+
+def activation_list(source, columns=None, segments=None, min_score=None, max_score=None, min_clv=None,
+                    returns_summary=None, recommendations=None, months=12, discount_rate=0.01, lines=None):
+    """Action plan table of the customers matching the predicates, with only the requested columns.
+
+    Segment and score predicates are applied to the RFM table first: the predictive CLV models are
+    fitted on every customer but predict only the kept ones, and the return rate and cross-sell
+    columns are joined only when requested. The models need line items: pass them as lines when
+    source is the cube.
+    """
+    columns = list(columns or ACTIVATION_COLUMNS)
+    table = select_customers(calculate_rfm(source), segments, min_score, max_score)
+
+    if table.empty:
+        # Nothing to fit or join: just the requested columns
+        return table.reindex(columns=columns)
+    if min_clv is not None or any(column in columns for column in CLV_COLUMNS):
+        summary = customer_summary(lines if lines is not None else source)
+        purchase_model = BetaGeoModel().fit(summary)
+        spend_model = GammaGammaModel().fit(summary)
+        # Customers with cancellations only have no purchase summary (their predictions stay missing)
+        kept = summary.loc[summary.index.intersection(table.index)]
+        table = table.join(predict_clv(kept, purchase_model, spend_model, months, discount_rate))
+        if min_clv is not None:
+            table = table[table['PredictedCLV'] >= min_clv]
+    if 'ReturnRate' in columns:
+        if returns_summary is None:
+            table['ReturnRate'] = float('nan')
+        else:
+            kept = returns_summary[returns_summary['Customer ID'].isin(table.index)]
+            table = table.join(return_rates(kept, 'Customer ID')['ReturnRate'])
+    if 'CrossSell' in columns:
+        table = table.join(recommendations['CrossSell']) if recommendations is not None else table.assign(CrossSell=None)
+    return table[columns]
+
+def export_format(path):
+    """Export format from a file name (csv, csv.gz or parquet)."""
+    for fmt in sorted(EXPORT_FORMATS, key=len, reverse=True):
+        if str(path).endswith('.' + fmt):
+            return fmt
+    raise ValueError(f"Unknown export format for {path} (expected one of: {', '.join(EXPORT_FORMATS)})")
+
+def parquet_schema(chunk):
+    """Arrow schema of a table from its first chunk (columns that are all missing there are strings)."""
+    schema = pa.Schema.from_pandas(chunk)
+    return pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field for field in schema],
+                     metadata=schema.metadata)
+
+def write_export(table, target, fmt=None, chunk_rows=EXPORT_CHUNK_ROWS, rows=None, columns=None):
+    """Write table to a path or binary file object in chunks of rows; returns the number of rows written.
+
+    fmt defaults to the extension of target: 'csv', 'csv.gz' (gzip-compressed CSV) or 'parquet'.
+    rows and columns (labels, in output order) select part of table chunk by chunk, without building it.
+    """
+    fmt = fmt or export_format(target)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    positions = np.arange(len(table)) if rows is None else table.index.get_indexer(rows)
+    column_positions = np.arange(table.shape[1]) if columns is None else table.columns.get_indexer(columns)
+    if (positions < 0).any() or (column_positions < 0).any():
+        raise KeyError("Rows or columns to export are missing from the table")
+    chunks = (table.iloc[positions[start:start + chunk_rows], column_positions]
+              for start in range(0, max(len(positions), 1), chunk_rows))
+
+    if fmt == 'parquet':
+        writer = None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    schema = parquet_schema(chunk)
+                    writer = pq.ParquetWriter(target, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema))
+        finally:
+            if writer is not None:
+                writer.close()
+        return len(positions)
+
+    binary = open(target, 'wb') if isinstance(target, (str, os.PathLike)) else target
+    try:
+        stream = gzip.GzipFile(fileobj=binary, mode='wb') if fmt == 'csv.gz' else binary
+        text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        for number, chunk in enumerate(chunks):
+            chunk.to_csv(text, header=number == 0)
+        text.flush()
+        text.detach()
+        if stream is not binary:
+            stream.close()
+    finally:
+        if binary is not target:
+            binary.close()
+    return len(positions)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app.analytics.exports',
+                                     description="Export a customer activation list (CRM feed) for a filter spec and segment predicates.")
+    parser.add_argument('--spec', help="JSON file with country_filter, date_range, min_order_value and returns_mode.")
+    parser.add_argument('--countries', nargs='+', help="Countries to keep (default: All).")
+    parser.add_argument('--start', help="First day of the period (YYYY-MM-DD).")
+    parser.add_argument('--end', help="Last day of the period, inclusive (YYYY-MM-DD).")
+    parser.add_argument('--min-order', type=float, default=None, help="Minimum invoice total (£).")
+    parser.add_argument('--returns-mode', choices=['Inclure', 'Exclure', 'Neutraliser'])
+    parser.add_argument('--segments', nargs='+', help="Segments to export (default: all).")
+    parser.add_argument('--min-score', type=int, default=None, help="Minimum RFM_Score.")
+    parser.add_argument('--max-score', type=int, default=None, help="Maximum RFM_Score.")
+    parser.add_argument('--min-clv', type=float, default=None, help="Minimum predicted 12-month CLV (£).")
+    parser.add_argument('--columns', nargs='+', choices=ACTIVATION_COLUMNS, help="Columns to export (default: all).")
+    parser.add_argument('--chunk-rows', type=int, default=EXPORT_CHUNK_ROWS, help="Rows written per chunk.")
+    parser.add_argument('--data-dir', default=None, help="Processed data directory (default: data/processed).")
+    parser.add_argument('--output', default='exports/action_plan.csv.gz',
+                        help="Output file; the extension sets the format (.csv, .csv.gz or .parquet).")
+    args = parser.parse_args(argv)
+
+    spec = parse_filter_spec(args)
+    df = compact_frame(read_data(CORE_COLUMNS, args.data_dir))
+    if spec['date_range'] and None in spec['date_range']:
+        dates = df['InvoiceDate']
+        spec['date_range'] = [spec['date_range'][0] or dates.min().date(), spec['date_range'][1] or dates.max().date()]
+    columns = args.columns or ACTIVATION_COLUMNS
+    cube = filter_cube(read_cube(args.data_dir), **spec)
+    # The predictive CLV models need the line items even when the cube serves the RFM table
+    needs_lines = cube is None or args.min_clv is not None or any(column in columns for column in CLV_COLUMNS)
+    lines = filter_data(df, **spec) if needs_lines else None
+    source = cube if cube is not None else lines
+    del df
+
+    returns = read_returns(args.data_dir) if 'ReturnRate' in columns else None
+    recommendations = None
+    if 'CrossSell' in columns:
+        basket_lines = compact_frame(read_data(BASKET_COLUMNS, args.data_dir))
+        index = read_basket_index(args.data_dir)
+        recommendations = cross_sell(basket_lines, index if index is not None else basket_index(basket_lines))
+        del basket_lines
+
+    table = activation_list(source, columns, args.segments, args.min_score, args.max_score, args.min_clv,
+                            returns[1] if returns is not None else None, recommendations, lines=lines)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    rows = write_export(table, args.output, chunk_rows=args.chunk_rows)
+    print(f"Wrote {args.output} ({rows} customers)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+def filter_cube(cube, country_filter, date_range, min_order_value=0, returns_mode='Inclure'):
+    """Apply the sidebar filters to the cube, or return None when they need line-level data."""
+    # Invoice thresholds and return handling depend on individual lines
+    if cube is None or min_order_value > 0 or returns_mode != 'Inclure':
+        return None
+    
+    filtered_cube = cube
+    if date_range:
+        start_date = pd.to_datetime(date_range[0])
+        end_date = pd.to_datetime(date_range[1]) + pd.Timedelta(days=1)
+        last_month = pd.to_datetime(date_range[1]).to_period('M')
+        in_months = (cube['InvoiceMonth'] >= start_date.to_period('M')) & (cube['InvoiceMonth'] <= last_month)
+        filtered_cube = cube[in_months]
+        # The cube is only exact when every selected month lies entirely inside the date range
+        if (filtered_cube['FirstInvoiceDate'] < start_date).any() or (filtered_cube['LastInvoiceDate'] >= end_date).any():
+            return None
+    
+    if country_filter and 'All' not in country_filter:
+        filtered_cube = filtered_cube[filtered_cube['Country'].isin(country_filter)]
+    return filtered_cube
+
+class FilterIndex:
+    """Indexes for the sidebar filters, built once per loaded dataset and reused by filter_data.
+    
+    Invoices are atomic for every filter (one date, one country, one 'C' prefix per invoice),
+    so invoice totals can be computed once on the whole dataset.
+    """
+    
+    def __init__(self, df):
+        self.n_rows = len(df)
+        
+        # Sorted date index: a date range becomes a [lo, hi) slice found by binary search
+        dates = df['InvoiceDate'].to_numpy()
+        self.is_sorted = bool((dates[1:] >= dates[:-1]).all())
+        self.order = None if self.is_sorted else np.argsort(dates, kind='stable')
+        self.sorted_dates = dates if self.is_sorted else dates[self.order]
+        
+        # Per-country row bitmaps (packed, 1 bit per row)
+        countries = df['Country'].astype('category')
+        codes = countries.cat.codes.to_numpy()
+        self.country_bitmaps = {country: np.packbits(codes == code)
+                                for code, country in enumerate(countries.cat.categories)}
+        
+        invoices = df['Invoice'].astype('category')
+        self.is_cancellation = invoices.cat.categories.astype(str).str.startswith('C')[invoices.cat.codes.to_numpy()]
+        
+        # Invoice total of each row's invoice, with and without negative amounts neutralised
+        invoice_codes, _ = pd.factorize(df['Invoice'])
+        amounts = df['TotalAmount'].to_numpy(dtype=float)
+        self.invoice_total = np.bincount(invoice_codes, weights=amounts)[invoice_codes]
+        self.invoice_total_neutralised = np.bincount(invoice_codes, weights=np.maximum(amounts, 0))[invoice_codes]
+    
+    def date_slice(self, date_range):
+        """Positions [lo, hi) of the date range in date order (end date inclusive)."""
+        start_date = np.datetime64(pd.to_datetime(date_range[0]))
+        end_date = np.datetime64(pd.to_datetime(date_range[1]) + pd.Timedelta(days=1))
+        lo = np.searchsorted(self.sorted_dates, start_date, side='left')
+        hi = np.searchsorted(self.sorted_dates, end_date, side='left')
+        return lo, hi
+    
+    def country_mask(self, country_filter):
+        """Union of the selected countries' bitmaps as a boolean row mask."""
+        bitmaps = [self.country_bitmaps[c] for c in country_filter if c in self.country_bitmaps]
+        if not bitmaps:
+            return np.zeros(self.n_rows, dtype=bool)
+        return np.unpackbits(np.bitwise_or.reduce(bitmaps), count=self.n_rows).astype(bool)
+    
+    def select(self, country_filter, date_range, min_order_value=0, returns_mode='Inclure'):
+        """Rows matching the filters: a slice when only the date range applies (sorted data), else a boolean mask."""
+        lo, hi = self.date_slice(date_range) if date_range else (0, self.n_rows)
+        by_country = bool(country_filter) and 'All' not in country_filter
+        if self.is_sorted and not by_country and returns_mode != 'Exclure' and min_order_value <= 0:
+            return slice(lo, hi)
+        
+        if self.is_sorted:
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[lo:hi] = True
+        else:
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[self.order[lo:hi]] = True
+        if by_country:
+            mask &= self.country_mask(country_filter)
+        if returns_mode == 'Exclure':
+            mask &= ~self.is_cancellation
+        if min_order_value > 0:
+            totals = self.invoice_total_neutralised if returns_mode == 'Neutraliser' else self.invoice_total
+            mask &= totals >= min_order_value
+        return mask
+
+def filter_data(df, country_filter, date_range, customer_type_filter=None, min_order_value=0, returns_mode='Inclure', index=None):
+    """Filter the dataset based on user inputs (pass a FilterIndex built on df to reuse its indexes)."""
+    if index is None:
+        index = FilterIndex(df)
+    selection = index.select(country_filter, date_range, min_order_value, returns_mode)
+    
+    # A slice of the date-sorted frame is taken without copying; masks are applied once
+    filtered_df = df.iloc[selection] if isinstance(selection, slice) else df[selection]
+        
+    # Returns Handling
+    if returns_mode == 'Neutraliser':
+        # Set negative values to 0 (keep transaction but remove financial impact)
+        filtered_df = filtered_df.assign(TotalAmount=filtered_df['TotalAmount'].clip(lower=0))
+        
+    return filtered_df
+
+def filter_state_key(filters, dataset_token=None):
+    """Canonical hash of a filter state (equivalent selections give the same key)."""
+    countries = filters.get('country_filter')
+    date_range = filters.get('date_range')
+    canonical = {
+        'countries': 'All' if not countries or 'All' in countries else sorted(countries),
+        'date_range': [pd.Timestamp(d).date().isoformat() for d in date_range] if date_range else None,
+        'returns_mode': filters.get('returns_mode', 'Inclure'),
+        'min_order_value': float(filters.get('min_order_value', 0)),
+        'dataset': dataset_token,
+    }
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+def dataset_token(df):
+    """Identity of a loaded dataset, part of the filter state key (changes when the data is refreshed)."""
+    return [len(df), str(df['InvoiceDate'].min()), str(df['InvoiceDate'].max())]
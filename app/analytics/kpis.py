@@ -0,0 +1,41 @@
+from .data import is_cube
+
+def revenue_trend(df, time_unit='Mois'):
+    """Revenue, invoices and active customers per period for the KPI trend chart (line items or cube).
+    
+    The cube is monthly: it only answers 'Mois' and 'Trimestre'.
+    """
+    if is_cube(df):
+        months = df['InvoiceMonth']
+        period = months.astype(str) if time_unit == 'Mois' else months.dt.asfreq('Q').astype(str)
+        grouped = df.groupby(period.rename('Period'))
+        trend = grouped.agg(TotalAmount=('Revenue', 'sum'), Invoices=('Invoices', 'sum'),
+                            ActiveCustomers=('Customer ID', 'nunique'))
+    else:
+        if time_unit == 'Mois':
+            period = df['InvoiceDate'].dt.to_period('M').astype(str)
+        elif time_unit == 'Trimestre':
+            period = df['InvoiceDate'].dt.to_period('Q').astype(str)
+        elif time_unit == 'Semaine':
+            period = df['InvoiceDate'].dt.to_period('W-SUN').dt.start_time.dt.date
+        else:
+            period = df['InvoiceDate'].dt.date
+        grouped = df.groupby(period.rename('Period'), observed=True)
+        trend = grouped.agg(TotalAmount=('TotalAmount', 'sum'), Invoices=('Invoice', 'nunique'),
+                            ActiveCustomers=('Customer ID', 'nunique'))
+    return trend.reset_index()
+
+def kpi_summary(df):
+    """Headline KPIs: total revenue, active customers and average order value (line items or cube)."""
+    if is_cube(df):
+        total_revenue = df['Revenue'].sum()
+        invoices = df['Invoices'].sum()
+    else:
+        total_revenue = df['TotalAmount'].sum()
+        invoices = df['Invoice'].nunique()
+    active_customers = df['Customer ID'].nunique()
+    return {
+        'total_revenue': float(total_revenue),
+        'active_customers': int(active_customers),
+        'avg_order_value': float(total_revenue / invoices) if invoices else 0.0,
+    }
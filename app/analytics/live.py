@@ -0,0 +1,249 @@
+import os
+import queue
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .data import processed_dir
+from .cohorts import cohort_tables
+from .rfm import score_rfm
+
+# Columns a live batch must carry (same schema as the output of process_data.clean_data)
+LIVE_COLUMNS = ['Invoice', 'InvoiceDate', 'Customer ID', 'Country', 'TotalAmount']
+# Drop folder of live batches, next to data/processed: data/live/incoming, data/live/ingested
+LIVE_DIR = 'live'
+# Dropped files untouched for this long are complete (producers that write in place are still writing)
+SETTLE_SECONDS = 2.0
+# First month of a customer not seen yet (any real month ordinal is smaller)
+NO_MONTH = np.iinfo(np.int64).max
+
+def live_dir(data_dir=None):
+    """The data/live folder, from the project root or from app/ (or next to data_dir)."""
+    return os.path.join(os.path.dirname(os.path.normpath(processed_dir(data_dir))), LIVE_DIR)
+
+def prepare_batch(batch):
+    """Validate and type a batch of cleaned transaction lines."""
+    missing = [column for column in LIVE_COLUMNS if column not in batch.columns]
+    if missing:
+        raise ValueError(f"Live batch is missing columns: {', '.join(missing)}")
+    return pd.DataFrame({
+        'Invoice': batch['Invoice'].astype(str).to_numpy(),
+        'InvoiceDate': pd.to_datetime(batch['InvoiceDate']).to_numpy().astype('datetime64[ns]'),
+        'Customer ID': batch['Customer ID'].astype('int64').to_numpy(),
+        'Country': batch['Country'].astype(str).to_numpy(),
+        'TotalAmount': batch['TotalAmount'].astype(float).to_numpy(),
+    })
+
+class LiveAggregates:
+    """Running aggregates updated batch by batch, so KPIs never rescan the whole history.
+
+    Keeps O(1) totals (revenue, distinct invoices, distinct customers), the set of seen invoices (an
+    invoice split across batches is counted once), per-customer state (first month, last invoice date,
+    invoices, revenue, revenue per active month) and counters of active customers and revenue per
+    (cohort month, cohort index) cell. A batch only updates the customers and cells it touches; a
+    customer whose first month moves back (late data) has their cells moved to the new cohort.
+    Updates are serialized by a lock; readers get consistent copies.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invoices = set()
+        self.total_revenue = 0.0
+        self.lines = 0
+        self.batches = 0
+        self.last_invoice_date = None
+        # Per-customer state: row `code` of each array (capacity doubled as customers arrive)
+        self.codes = {}
+        self.n_customers = 0
+        self.customer_ids = np.zeros(0, dtype=np.int64)
+        self.first_month = np.zeros(0, dtype=np.int64)
+        self.last_date = np.zeros(0, dtype='datetime64[ns]')
+        self.frequency = np.zeros(0, dtype=np.int64)
+        self.monetary = np.zeros(0, dtype=float)
+        self.activity = []  # per customer: {month ordinal: revenue}
+        self.cells = {}     # (cohort month ordinal, cohort index): [active customers, revenue]
+
+    def _customer_codes(self, customer_ids):
+        """Rows of the per-customer arrays, allocated for customers not seen before."""
+        new = [customer for customer in customer_ids if customer not in self.codes]
+        if self.n_customers + len(new) > len(self.customer_ids):
+            capacity = max(2 * len(self.customer_ids), self.n_customers + len(new), 1024)
+            grow = capacity - len(self.customer_ids)
+            self.customer_ids = np.r_[self.customer_ids, np.zeros(grow, dtype=np.int64)]
+            self.first_month = np.r_[self.first_month, np.full(grow, NO_MONTH, dtype=np.int64)]
+            self.last_date = np.r_[self.last_date, np.full(grow, np.datetime64('NaT'), dtype='datetime64[ns]')]
+            self.frequency = np.r_[self.frequency, np.zeros(grow, dtype=np.int64)]
+            self.monetary = np.r_[self.monetary, np.zeros(grow)]
+        for customer in new:
+            self.codes[customer] = self.n_customers
+            self.customer_ids[self.n_customers] = customer
+            self.activity.append({})
+            self.n_customers += 1
+        return np.fromiter((self.codes[customer] for customer in customer_ids), dtype=np.int64, count=len(customer_ids))
+
+    def _add_cells(self, code, sign):
+        """Add (sign=1) or remove (sign=-1) every active month of a customer to its cohort's cells."""
+        cohort = int(self.first_month[code])
+        for month, revenue in self.activity[code].items():
+            cell = self.cells.setdefault((cohort, month - cohort + 1), [0, 0.0])
+            cell[0] += sign
+            cell[1] += sign * revenue
+            if cell[0] == 0:
+                del self.cells[(cohort, month - cohort + 1)]
+
+    def update(self, batch):
+        """Fold a batch of cleaned lines into the aggregates; returns the number of lines ingested."""
+        batch = prepare_batch(batch)
+        if batch.empty:
+            return 0
+
+        with self._lock:
+            # Only the first line of an invoice never seen before counts it (here or in a later batch)
+            first_line = ~batch['Invoice'].duplicated()
+            seen = np.fromiter((invoice in self.invoices for invoice in batch['Invoice']), dtype=bool, count=len(batch))
+            new_invoice = first_line & ~seen
+            self.invoices.update(batch.loc[new_invoice, 'Invoice'])
+            self.total_revenue += batch['TotalAmount'].sum()
+            self.lines += len(batch)
+            self.batches += 1
+            batch_last = batch['InvoiceDate'].max()
+            self.last_invoice_date = batch_last if self.last_invoice_date is None else max(self.last_invoice_date, batch_last)
+
+            # Batch activity per (customer, month), then per customer
+            pairs = batch.assign(
+                Month=batch['InvoiceDate'].to_numpy().astype('datetime64[M]').astype(np.int64),
+                NewInvoice=new_invoice.astype(np.int64),
+            ).groupby(['Customer ID', 'Month'], sort=False).agg(
+                Revenue=('TotalAmount', 'sum'), Invoices=('NewInvoice', 'sum'), LastInvoiceDate=('InvoiceDate', 'max'),
+            ).reset_index()
+            customers = pairs.groupby('Customer ID', sort=False).agg(
+                FirstMonth=('Month', 'min'), Invoices=('Invoices', 'sum'), Revenue=('Revenue', 'sum'),
+                LastInvoiceDate=('LastInvoiceDate', 'max'),
+            )
+            codes = self._customer_codes(customers.index.tolist())
+            old_first = self.first_month[codes]
+            new_first = np.minimum(old_first, customers['FirstMonth'].to_numpy())
+            moved = set(codes[(new_first < old_first) & (old_first != NO_MONTH)].tolist())
+            for code in moved:
+                self._add_cells(code, -1)
+
+            self.first_month[codes] = new_first
+            self.frequency[codes] += customers['Invoices'].to_numpy()
+            self.monetary[codes] += customers['Revenue'].to_numpy()
+            self.last_date[codes] = np.fmax(self.last_date[codes], customers['LastInvoiceDate'].to_numpy())
+
+            pair_codes = codes[customers.index.get_indexer(pairs['Customer ID'])]
+            for code, month, revenue in zip(pair_codes.tolist(), pairs['Month'].tolist(), pairs['Revenue'].tolist()):
+                activity = self.activity[code]
+                new_month = month not in activity
+                activity[month] = activity.get(month, 0.0) + revenue
+                if code not in moved:
+                    cohort = int(self.first_month[code])
+                    cell = self.cells.setdefault((cohort, month - cohort + 1), [0, 0.0])
+                    cell[0] += new_month
+                    cell[1] += revenue
+            for code in moved:
+                self._add_cells(code, 1)
+        return len(batch)
+
+    def kpis(self):
+        """Headline KPIs of everything ingested so far (same definitions as kpi_summary)."""
+        with self._lock:
+            cells = pd.DataFrame([(cohort, index, count, revenue) for (cohort, index), (count, revenue) in self.cells.items()],
+                                 columns=['CohortMonth', 'CohortIndex', 'Customers', 'Revenue'])
+            totals = {
+                'total_revenue': float(self.total_revenue),
+                'active_customers': self.n_customers,
+                'invoices': len(self.invoices),
+                'lines': self.lines,
+                'batches': self.batches,
+                'last_invoice_date': self.last_invoice_date,
+            }
+        avg_retention, avg_clv = 0.0, 0.0
+        if len(cells):
+            first_cohort = cells['CohortMonth'].min()
+            counts = np.zeros((cells['CohortMonth'].max() - first_cohort + 1, cells['CohortIndex'].max()), dtype=np.int64)
+            counts[cells['CohortMonth'] - first_cohort, cells['CohortIndex'] - 1] = cells['Customers']
+            retention, cohort_sizes, _ = cohort_tables(counts, first_cohort)
+            if retention.shape[1] > 1:
+                avg_retention = float(retention.iloc[:, 1:].mean().mean())
+            # Empirical CLV: revenue per cohort customer at each age, averaged over cohorts, cumulated
+            sizes = counts[cells['CohortMonth'] - first_cohort, 0]
+            clv_curve = (cells['Revenue'] / sizes).groupby(cells['CohortIndex']).mean().sort_index().cumsum()
+            avg_clv = float(clv_curve.max())
+        return {
+            'total_revenue': totals['total_revenue'],
+            'active_customers': totals['active_customers'],
+            'avg_order_value': totals['total_revenue'] / totals['invoices'] if totals['invoices'] else 0.0,
+            'avg_retention': avg_retention,
+            'avg_clv': avg_clv,
+            'lines': totals['lines'],
+            'batches': totals['batches'],
+            'last_invoice_date': totals['last_invoice_date'],
+        }
+
+    def rfm(self):
+        """Current RFM table, scored from the per-customer running state."""
+        with self._lock:
+            n = self.n_customers
+            rfm = pd.DataFrame({
+                'LastInvoiceDate': self.last_date[:n].copy(),
+                'Frequency': self.frequency[:n].copy(),
+                'Monetary': self.monetary[:n].copy(),
+            }, index=pd.Index(self.customer_ids[:n].astype('int32'), name='Customer ID')).sort_index()
+        snapshot_date = rfm['LastInvoiceDate'].max() + pd.Timedelta(days=1)
+        rfm.insert(0, 'Recency', (snapshot_date - rfm.pop('LastInvoiceDate')).dt.days)
+        return score_rfm(rfm)
+
+def read_batch_file(path):
+    """Read a dropped batch file (CSV or Parquet with the clean_data schema)."""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+class LiveFeed:
+    """Sources of live batches: an in-process queue and a file-drop folder.
+
+    Producers call submit(batch); files (.csv or .parquet) dropped in <folder>/incoming are picked up by
+    poll() and moved to <folder>/ingested once folded into the aggregates. Producers should write a
+    file under another name (e.g. batch.csv.tmp) and rename it when complete; files modified less than
+    settle_seconds ago are left for a later poll in case they are still being written.
+    """
+
+    def __init__(self, aggregates, folder=None, settle_seconds=SETTLE_SECONDS):
+        self.aggregates = aggregates
+        self.folder = folder or live_dir()
+        self.settle_seconds = settle_seconds
+        self.queue = queue.Queue()
+
+    def submit(self, batch):
+        self.queue.put(batch)
+
+    def poll(self):
+        """Ingest every queued batch and dropped file; returns the number of lines ingested."""
+        ingested = 0
+        while True:
+            try:
+                batch = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            ingested += self.aggregates.update(batch)
+
+        incoming = os.path.join(self.folder, 'incoming')
+        if os.path.isdir(incoming):
+            done = os.path.join(self.folder, 'ingested')
+            os.makedirs(done, exist_ok=True)
+            # Files are taken in name order (timestamped names give arrival order)
+            now = time.time()
+            for name in sorted(os.listdir(incoming)):
+                if not name.endswith(('.csv', '.parquet')):
+                    continue
+                path = os.path.join(incoming, name)
+                if now - os.path.getmtime(path) < self.settle_seconds:
+                    continue
+                ingested += self.aggregates.update(read_batch_file(path))
+                shutil.move(path, os.path.join(done, name))
+        return ingested
@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+
+from .data import CORE_COLUMNS, processed_path, compact_frame
+from .filters import filter_data
+
+# Month-partitioned store written by `process_data.py --incremental`: <store>/YYYY-MM/part-*.parquet
+STORE_DIR = 'online_retail'
+CUBE_KEYS = ['Customer ID', 'InvoiceMonth', 'Country']
+
+def partition_cube(df):
+    """Customer-month cube rows of one month partition (an invoice never spans two months)."""
+    lines = df.assign(InvoiceMonth=df['InvoiceDate'].dt.to_period('M'),
+                      ReturnAmount=df['TotalAmount'].where(df['Invoice'].astype(str).str.startswith('C'), 0.0))
+    return lines.groupby(CUBE_KEYS, observed=True).agg(
+        Revenue=('TotalAmount', 'sum'),
+        Invoices=('Invoice', 'nunique'),
+        Lines=('TotalAmount', 'size'),
+        ReturnAmount=('ReturnAmount', 'sum'),
+        FirstInvoiceDate=('InvoiceDate', 'min'),
+        LastInvoiceDate=('InvoiceDate', 'max'),
+    ).reset_index()
+
+class PartitionedStore:
+    """Out-of-core access to the month-partitioned store, one partition in memory at a time.
+
+    Filters are applied per partition and each partition is reduced to customer-month cube rows.
+    Those partial aggregates only need concatenating (months never overlap), and the cohort, RFM,
+    CLV and KPI functions accept the resulting cube, so their outputs match the in-memory path
+    while peak memory is bounded by the largest month plus the cube.
+    """
+
+    def __init__(self, path=None, data_dir=None):
+        self.path = path or processed_path(STORE_DIR, data_dir)
+        if not os.path.isdir(self.path):
+            raise FileNotFoundError(f"No partitioned store at {self.path} (run `python src/process_data.py --incremental`)")
+
+    def months(self, date_range=None):
+        """Months present in the store, restricted to those overlapping date_range."""
+        months = sorted(pd.Period(name, 'M') for name in os.listdir(self.path)
+                        if os.path.isdir(os.path.join(self.path, name)))
+        if date_range:
+            first = pd.Timestamp(date_range[0]).to_period('M')
+            last = pd.Timestamp(date_range[1]).to_period('M')
+            months = [month for month in months if first <= month <= last]
+        return months
+
+    def partitions(self, date_range=None, country_filter=None, columns=CORE_COLUMNS):
+        """Yield (month, compact line items) for each partition in range; skipped months are never read."""
+        # Country selection is pushed down to the Parquet reader
+        filters = None
+        if country_filter and 'All' not in country_filter:
+            filters = [('Country', 'in', list(country_filter))]
+        for month in self.months(date_range):
+            df = pd.read_parquet(os.path.join(self.path, str(month)), columns=columns, filters=filters)
+            if len(df):
+                yield month, compact_frame(df)
+
+    def filter(self, country_filter, date_range, min_order_value=0, returns_mode='Inclure'):
+        """filter_data applied partition by partition: yields the filtered line items of each month."""
+        for _, df in self.partitions(date_range, country_filter):
+            filtered_df = filter_data(df, country_filter, date_range, min_order_value=min_order_value,
+                                      returns_mode=returns_mode)
+            if len(filtered_df):
+                yield filtered_df
+
+    def cube(self, country_filter, date_range, min_order_value=0, returns_mode='Inclure'):
+        """Customer-month cube of the filtered data, built from per-partition partial aggregates."""
+        parts = [partition_cube(df) for df in self.filter(country_filter, date_range, min_order_value, returns_mode)]
+        if not parts:
+            return pd.DataFrame(columns=CUBE_KEYS + ['Revenue', 'Invoices', 'Lines', 'ReturnAmount',
+                                                    'FirstInvoiceDate', 'LastInvoiceDate'])
+        cube = pd.concat(parts, ignore_index=True)
+        cube['Customer ID'] = cube['Customer ID'].astype('int32')
+        cube['Country'] = cube['Country'].astype(str).astype('category')
+        return cube.sort_values(['InvoiceMonth', 'Customer ID'], ignore_index=True)
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .data import processed_path
+from .cohorts import month_ordinals, months_to_periods
+
+# Written by src/process_data.py at ingestion (match_returns / summarize_returns)
+RETURNS_FILE = 'returns_matched.parquet'
+RETURN_SUMMARY_FILE = 'returns_by_customer_product.parquet'
+
+def read_returns(data_dir=None):
+    """Matched return lines and per (Customer ID, StockCode) summary, or None if they have not been built."""
+    matched_file = processed_path(RETURNS_FILE, data_dir)
+    summary_file = processed_path(RETURN_SUMMARY_FILE, data_dir)
+    if not (os.path.exists(matched_file) and os.path.exists(summary_file)):
+        return None
+    return pd.read_parquet(matched_file), pd.read_parquet(summary_file)
+
+def customer_cohorts(df):
+    """Acquisition month (CohortMonth) of each customer, from line items or the customer-month cube."""
+    months = pd.Series(month_ordinals(df)).groupby(df['Customer ID'].to_numpy()).min()
+    return pd.Series(months_to_periods(months.to_numpy()), index=months.index.rename('Customer ID'), name='CohortMonth')
+
+def return_rates(summary, by='Customer ID', matched=None):
+    """Return rates per customer, product or customer label (e.g. cohort or segment).
+
+    by is a summary column ('Customer ID', 'StockCode') or a Series mapping Customer ID to a label;
+    customers without a label are left out. ReturnRate is the returned share of the amount sold,
+    QuantityReturnRate the returned share of the units sold, MatchedShare the share of returned
+    units paired with their purchase; MedianDaysToReturn comes from the matched lines when given.
+    """
+    if isinstance(by, pd.Series):
+        labels = summary['Customer ID'].map(by)
+        summary = summary[labels.notna().to_numpy()]
+        keys = labels[labels.notna()].rename(by.name or 'Label')
+    else:
+        keys = summary[by]
+    rates = summary.groupby(keys, observed=True).agg(
+        Customers=('Customer ID', 'nunique'),
+        SoldQuantity=('SoldQuantity', 'sum'),
+        SoldAmount=('SoldAmount', 'sum'),
+        ReturnedQuantity=('ReturnedQuantity', 'sum'),
+        ReturnedAmount=('ReturnedAmount', 'sum'),
+        MatchedQuantity=('MatchedQuantity', 'sum'),
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates['ReturnRate'] = rates['ReturnedAmount'] / rates['SoldAmount'].where(rates['SoldAmount'] > 0)
+        rates['QuantityReturnRate'] = rates['ReturnedQuantity'] / rates['SoldQuantity'].where(rates['SoldQuantity'] > 0)
+        rates['MatchedShare'] = rates['MatchedQuantity'] / rates['ReturnedQuantity'].where(rates['ReturnedQuantity'] > 0)
+    if matched is not None:
+        matched_lines = matched[matched['Match'] != 'unmatched']
+        if isinstance(by, pd.Series):
+            matched_keys = matched_lines['Customer ID'].map(by).rename(rates.index.name)
+        else:
+            matched_keys = matched_lines[by]
+        rates['MedianDaysToReturn'] = matched_lines['DaysToReturn'].groupby(matched_keys, observed=True).median()
+    return rates.sort_values('ReturnedAmount', ascending=False)
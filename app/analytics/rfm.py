@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+from .data import is_cube
+from .cohorts import month_ordinals, months_to_periods
+
+# Segment lookup: RFM_Score lower bounds and the segment of each band (scores below 4 are 'At Risk')
+SEGMENT_SCORE_BINS = np.array([4, 5, 6, 7, 8, 9])
+SEGMENT_LABELS = np.array(['At Risk', 'About To Sleep', 'Needs Attention', 'Promising',
+                           'Potential Loyalists', 'Loyal Customers', 'Champions'], dtype=object)
+
+def calculate_rfm(df):
+    """Calculate RFM scores and segments."""
+    return score_rfm(rfm_values(df))
+
+def rfm_values(df):
+    """Recency (days), Frequency (invoices) and Monetary (revenue) per customer, from lines or the cube."""
+    if is_cube(df):
+        # Each invoice belongs to a single customer-month, so invoice counts add up
+        rfm = df.groupby('Customer ID').agg(
+            LastInvoiceDate=('LastInvoiceDate', 'max'),
+            Frequency=('Invoices', 'sum'),
+            Monetary=('Revenue', 'sum'),
+        )
+    else:
+        rfm = df.groupby('Customer ID').agg(
+            LastInvoiceDate=('InvoiceDate', 'max'),
+            Frequency=('Invoice', 'nunique'),
+            Monetary=('TotalAmount', 'sum'),
+        )
+    
+    snapshot_date = rfm['LastInvoiceDate'].max() + pd.Timedelta(days=1)
+    rfm.insert(0, 'Recency', (snapshot_date - rfm.pop('LastInvoiceDate')).dt.days)
+    return rfm
+
+def score_rfm(rfm):
+    """Add R/F/M quartiles, RFM_Segment, RFM_Score and Segment to a Recency/Frequency/Monetary table."""
+    # Create Quartiles (1-4, 4 is best)
+    # Recency: Lower is better -> 4 is lowest quartile
+    r_labels = range(4, 0, -1)
+    f_labels = range(1, 5)
+    m_labels = range(1, 5)
+    
+    r_quartiles = pd.qcut(rfm['Recency'], q=4, labels=r_labels)
+    # Handle duplicates in Frequency/Monetary with rank method if needed, or just duplicates='drop'
+    # Using rank(method='first') is safer for qcut with many duplicates
+    f_quartiles = pd.qcut(rfm['Frequency'].rank(method='first'), q=4, labels=f_labels)
+    m_quartiles = pd.qcut(rfm['Monetary'].rank(method='first'), q=4, labels=m_labels)
+    return label_rfm(rfm, r_quartiles, f_quartiles, m_quartiles)
+
+def label_rfm(rfm, r_quartiles, f_quartiles, m_quartiles):
+    """Attach R/F/M quartile labels, RFM_Segment, RFM_Score and Segment to the RFM table."""
+    rfm = rfm.assign(R=r_quartiles.values, F=f_quartiles.values, M=m_quartiles.values)
+    
+    # Integer scores straight from the quartile labels, then one string conversion for the RFM code
+    r = np.asarray(r_quartiles, dtype=np.int64)
+    f = np.asarray(f_quartiles, dtype=np.int64)
+    m = np.asarray(m_quartiles, dtype=np.int64)
+    rfm['RFM_Segment'] = pd.Series(r * 100 + f * 10 + m, index=rfm.index).astype(str)
+    rfm['RFM_Score'] = r + f + m
+    
+    # Define Segments (binning of RFM_Score through the lookup table)
+    rfm['Segment'] = SEGMENT_LABELS[np.searchsorted(SEGMENT_SCORE_BINS, rfm['RFM_Score'].to_numpy(), side='right')]
+    
+    return rfm
+
+def monthly_activity(df):
+    """Invoices, revenue and last invoice date per (Customer ID, month ordinal), from lines or the cube."""
+    months = month_ordinals(df)
+    if is_cube(df):
+        # A customer can have one cube row per country in a month
+        grouped = df.groupby([df['Customer ID'].to_numpy(), months])
+        activity = grouped.agg(Invoices=('Invoices', 'sum'), Revenue=('Revenue', 'sum'),
+                               LastInvoiceDate=('LastInvoiceDate', 'max'))
+    else:
+        grouped = df.groupby([df['Customer ID'].to_numpy(), months], observed=True)
+        activity = grouped.agg(Invoices=('Invoice', 'nunique'), Revenue=('TotalAmount', 'sum'),
+                               LastInvoiceDate=('InvoiceDate', 'max'))
+    return activity.rename_axis(['Customer ID', 'Month']).reset_index()
+
+def rfm_history(df):
+    """RFM scores and segments as of every month-end, from a single sweep over the months.
+    
+    Per-customer running state (last invoice date, invoice count, revenue) is updated month by month
+    and scored with score_rfm at each boundary; the snapshot date is the first day of the next month.
+    Months whose Recency quartiles cannot be cut (too few distinct values) are skipped.
+    Returns a long table indexed by Customer ID with a Snapshot (monthly period) column.
+    """
+    activity = monthly_activity(df).sort_values('Month', kind='stable')
+    customer_codes, customer_ids = pd.factorize(activity['Customer ID'], sort=True)
+    months = activity['Month'].to_numpy()
+    invoices = activity['Invoices'].to_numpy()
+    revenue = activity['Revenue'].to_numpy()
+    last_dates = activity['LastInvoiceDate'].to_numpy()
+    
+    n_customers = len(customer_ids)
+    seen = np.zeros(n_customers, dtype=bool)
+    last_invoice = np.zeros(n_customers, dtype=last_dates.dtype)
+    frequency = np.zeros(n_customers, dtype=np.int64)
+    monetary = np.zeros(n_customers)
+    
+    snapshots = []
+    all_months = np.arange(months.min(), months.max() + 1) if len(months) else []
+    bounds = np.searchsorted(months, all_months, side='right')
+    start = 0
+    for month, end in zip(all_months, bounds):
+        # Each customer has at most one activity row per month: plain fancy-index updates
+        codes = customer_codes[start:end]
+        seen[codes] = True
+        last_invoice[codes] = np.maximum(last_invoice[codes], last_dates[start:end])
+        frequency[codes] += invoices[start:end]
+        monetary[codes] += revenue[start:end]
+        start = end
+        
+        snapshot_date = (months_to_periods([month + 1])[0]).to_timestamp()
+        state = pd.DataFrame({
+            'Recency': (np.datetime64(snapshot_date, 'ns') - last_invoice[seen]) // np.timedelta64(1, 'D'),
+            'Frequency': frequency[seen],
+            'Monetary': monetary[seen],
+        }, index=pd.Index(customer_ids[seen], name='Customer ID'))
+        try:
+            scored = score_rfm(state)
+        except ValueError:
+            continue
+        scored.insert(0, 'Snapshot', months_to_periods(np.full(len(scored), month)))
+        snapshots.append(scored)
+    
+    return pd.concat(snapshots) if snapshots else pd.DataFrame()
+
+def segment_transitions(history):
+    """Customers moving between segments from each snapshot of rfm_history to the next.
+    
+    Long table (FromSnapshot, ToSnapshot, From, To, Customers); customers absent from the previous
+    snapshot come from 'New'.
+    """
+    snapshots = history['Snapshot'].drop_duplicates().sort_values()
+    following = dict(zip(snapshots.iloc[:-1], snapshots.iloc[1:]))
+    previous = dict(zip(snapshots.iloc[1:], snapshots.iloc[:-1]))
+    before = history.loc[history['Snapshot'].isin(list(following)), ['Snapshot', 'Segment']].reset_index()
+    before['ToSnapshot'] = before['Snapshot'].map(following)
+    after = history.loc[history['Snapshot'] != snapshots.iloc[0], ['Snapshot', 'Segment']].reset_index()
+    moves = after.merge(before, how='left', left_on=['Customer ID', 'Snapshot'], right_on=['Customer ID', 'ToSnapshot'],
+                        suffixes=('', '_from'))
+    moves = pd.DataFrame({
+        'FromSnapshot': moves['Snapshot'].map(previous),
+        'ToSnapshot': moves['Snapshot'],
+        'From': moves['Segment_from'].fillna('New'),
+        'To': moves['Segment'],
+    })
+    return moves.groupby(['FromSnapshot', 'ToSnapshot', 'From', 'To']).size().rename('Customers').reset_index()
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+# Time-bucket rollups of the line items, built once at load time for the KPI trend chart.
+# Revenue and invoices are additive: daily prefix sums per country answer any date range or bucket in
+# O(1) per country. Active customers are not: distinct (bucket, country, customer) triples are kept per
+# grain and counted for the selected countries.
+ROLLUP_GRAINS = ['Jour', 'Semaine', 'Mois', 'Trimestre']
+
+def bucket_start(days, time_unit):
+    """First day (datetime64[D] ordinal) of the day, ISO week, month or quarter of each day ordinal."""
+    if time_unit == 'Jour':
+        return days
+    if time_unit == 'Semaine':
+        # Day 0 (1970-01-01) was a Thursday: ISO weeks start on the Monday 3 days before
+        return days - (days + 3) % 7
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if time_unit == 'Trimestre':
+        months = months - months % 3
+    return months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+def bucket_labels(starts, time_unit):
+    """Display labels of buckets given by their first day, as revenue_trend labels them."""
+    dates = pd.to_datetime(starts.astype('datetime64[D]'))
+    if time_unit == 'Mois':
+        return dates.to_period('M').astype(str)
+    if time_unit == 'Trimestre':
+        return dates.to_period('Q').astype(str)
+    return dates.date
+
+class RollupStore:
+    """Revenue, invoices and active customers per day, ISO week, month and quarter, per country."""
+
+    def __init__(self, df):
+        days = df['InvoiceDate'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        self.first_day = int(days.min())
+        self.n_days = int(days.max()) - self.first_day + 1
+        country_codes, self.countries = pd.factorize(df['Country'].astype(str), sort=True)
+        n_countries = len(self.countries)
+        cells = country_codes * self.n_days + (days - self.first_day)
+
+        # Daily totals per country, then prefix sums along the days (a leading zero column)
+        revenue = np.bincount(cells, weights=df['TotalAmount'].to_numpy(dtype=float), minlength=n_countries * self.n_days)
+        # An invoice has one date and one country: count it on its first line
+        _, first_lines = np.unique(pd.factorize(df['Invoice'])[0], return_index=True)
+        invoices = np.bincount(cells[first_lines], minlength=n_countries * self.n_days)
+        self.revenue_prefix = np.zeros((n_countries, self.n_days + 1))
+        self.revenue_prefix[:, 1:] = revenue.reshape(n_countries, self.n_days).cumsum(axis=1)
+        self.invoice_prefix = np.zeros((n_countries, self.n_days + 1), dtype=np.int64)
+        self.invoice_prefix[:, 1:] = invoices.reshape(n_countries, self.n_days).cumsum(axis=1)
+
+        # Distinct (bucket, country, customer) triples and all-country counts per bucket, for each grain
+        customer_codes, _ = pd.factorize(df['Customer ID'])
+        n_customers = customer_codes.max() + 1 if len(customer_codes) else 1
+        self.customers = {}
+        for time_unit in ROLLUP_GRAINS:
+            starts = bucket_start(days, time_unit)
+            keys = np.unique((starts.astype(np.int64) * n_countries + country_codes) * n_customers + customer_codes)
+            customers = keys % n_customers
+            bucket_countries = keys // n_customers
+            triples = pd.DataFrame({'Bucket': bucket_countries // n_countries, 'Country': bucket_countries % n_countries,
+                                    'Customer': customers})
+            totals = triples.drop_duplicates(['Bucket', 'Customer'])['Bucket'].value_counts().sort_index()
+            self.customers[time_unit] = (triples, totals)
+
+    def day_positions(self, date_range):
+        """Prefix sum positions [lo, hi) of an inclusive date range, clipped to the data."""
+        if not date_range:
+            return 0, self.n_days
+        start = np.datetime64(pd.to_datetime(date_range[0]), 'D').astype(np.int64) - self.first_day
+        end = np.datetime64(pd.to_datetime(date_range[1]), 'D').astype(np.int64) - self.first_day + 1
+        return int(np.clip(start, 0, self.n_days)), int(np.clip(end, 0, self.n_days))
+
+    def country_rows(self, country_filter):
+        """Rows of the selected countries (every country for None or 'All')."""
+        if not country_filter or 'All' in country_filter:
+            return slice(None)
+        return np.flatnonzero(self.countries.isin(country_filter))
+
+    def range_totals(self, date_range=None, country_filter=None):
+        """Revenue and invoices of a date range from the prefix sums (O(1) per country)."""
+        lo, hi = self.day_positions(date_range)
+        rows = self.country_rows(country_filter)
+        return {
+            'total_revenue': float((self.revenue_prefix[rows, hi] - self.revenue_prefix[rows, lo]).sum()),
+            'invoices': int((self.invoice_prefix[rows, hi] - self.invoice_prefix[rows, lo]).sum()),
+        }
+
+    def trend(self, time_unit='Mois', date_range=None, country_filter=None, lines=None):
+        """Revenue, invoices and active customers per bucket of the range (columns like revenue_trend).
+
+        Buckets cut by the date range have exact revenue and invoices; their active customers are
+        counted on `lines` (the filtered line items) when given, otherwise over the whole bucket.
+        Buckets without any invoice are left out, as revenue_trend has no row for them.
+        """
+        lo, hi = self.day_positions(date_range)
+        if hi <= lo:
+            return pd.DataFrame(columns=['Period', 'TotalAmount', 'Invoices', 'ActiveCustomers'])
+        days = np.arange(lo, hi) + self.first_day
+        starts = np.unique(bucket_start(days, time_unit))
+        # Bucket boundaries as prefix positions, the first and last clipped to the range
+        bounds = np.r_[np.maximum(starts - self.first_day, lo), hi]
+        rows = self.country_rows(country_filter)
+        revenue = np.diff(self.revenue_prefix[rows][:, bounds], axis=1).sum(axis=0)
+        invoices = np.diff(self.invoice_prefix[rows][:, bounds], axis=1).sum(axis=0)
+
+        triples, totals = self.customers[time_unit]
+        if isinstance(rows, slice):
+            active = totals.reindex(starts, fill_value=0).to_numpy().copy()
+        else:
+            selected = triples[triples['Country'].isin(rows) & triples['Bucket'].between(starts[0], starts[-1])]
+            active = selected.drop_duplicates(['Bucket', 'Customer'])['Bucket'].value_counts().reindex(starts, fill_value=0).to_numpy().copy()
+
+        if lines is not None:
+            # Buckets cut by the range (with data outside it): count their customers on the filtered lines
+            line_days = lines['InvoiceDate'].to_numpy().astype('datetime64[D]').astype(np.int64)
+            line_customers = lines['Customer ID'].to_numpy()
+            if max(starts[0], self.first_day) < lo + self.first_day:
+                first_end = starts[1] if len(starts) > 1 else hi + self.first_day
+                active[0] = pd.unique(line_customers[line_days < first_end]).size
+            if hi < self.n_days and bucket_start(np.array([hi + self.first_day]), time_unit)[0] == starts[-1]:
+                active[-1] = pd.unique(line_customers[line_days >= starts[-1]]).size
+
+        # Every line belongs to an invoice of its day and country: buckets with no invoice have no lines
+        kept = invoices > 0
+        return pd.DataFrame({
+            'Period': bucket_labels(starts[kept], time_unit),
+            'TotalAmount': revenue[kept],
+            'Invoices': invoices[kept],
+            'ActiveCustomers': active[kept],
+        })
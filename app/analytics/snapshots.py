@@ -0,0 +1,197 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from .data import CORE_COLUMNS, processed_path, processed_dir, compact_frame, read_data, read_cube
+from .filters import FilterIndex, filter_data, filter_cube, filter_state_key, dataset_token
+from .cohorts import calculate_cohorts, calculate_clv_empirical
+from .rfm import calculate_rfm
+from .kpis import revenue_trend, kpi_summary
+
+# Materialized analytics, rebuilt after each run of src/process_data.py:
+#   data/processed/snapshots/LATEST                  name of the current build
+#   data/processed/snapshots/<build>/manifest.json   format, dataset token and presets of the build
+#   data/processed/snapshots/<build>/<preset>/       one file per table (Parquet, kpis as JSON)
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_FORMAT = 2
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+
+# Tables stored per preset, named like the page memoization keys (utils.memoized)
+SNAPSHOT_TABLES = ['kpis', 'cohorts', 'rfm', 'clv_empirical', 'trend:Mois', 'trend:Trimestre']
+COHORT_PARTS = ['retention', 'sizes', 'counts']
+RFM_SCORE_LABELS = {'R': range(4, 0, -1), 'F': range(1, 5), 'M': range(1, 5)}
+
+def preset_filters(df, top_countries=10):
+    """Filter states worth precomputing: the default view, each returns mode and the largest countries."""
+    dates = df['InvoiceDate']
+    default = {
+        'country_filter': ['All'],
+        'date_range': (dates.min().date(), dates.max().date()),
+        'min_order_value': 0,
+        'returns_mode': 'Inclure',
+    }
+    presets = [default] + [dict(default, returns_mode=mode) for mode in ('Exclure', 'Neutraliser')]
+    revenue = df.groupby('Country', observed=True)['TotalAmount'].sum()
+    presets += [dict(default, country_filter=[country]) for country in revenue.nlargest(top_countries).index]
+    return presets
+
+def compute_tables(df, filters, cube=None, index=None):
+    """Every snapshot table for one filter state, computed the way the pages do."""
+    filtered_df = filter_data(df, index=index, **filters)
+    filtered_cube = filter_cube(cube, **filters)
+    source = filtered_cube if filtered_cube is not None else filtered_df
+    return {
+        'kpis': kpi_summary(source),
+        'cohorts': calculate_cohorts(source),
+        'rfm': calculate_rfm(source),
+        'clv_empirical': calculate_clv_empirical(source),
+        'trend:Mois': revenue_trend(source, 'Mois'),
+        'trend:Trimestre': revenue_trend(source, 'Trimestre'),
+    }
+
+def table_file(name, part=None):
+    """File name of a stored table (':' is not portable in file names)."""
+    stem = name.replace(':', '_') + (f'_{part}' if part else '')
+    return stem + ('.json' if name == 'kpis' else '.parquet')
+
+def write_frame(frame, path):
+    """Write a Series or DataFrame to Parquet (column labels stored as strings)."""
+    if isinstance(frame, pd.Series):
+        frame = frame.to_frame()
+    frame.rename(columns=str).to_parquet(path)
+
+def write_tables(tables, preset_dir):
+    """Store the tables of one preset."""
+    os.makedirs(preset_dir)
+    with open(os.path.join(preset_dir, table_file('kpis')), 'w') as f:
+        json.dump(tables['kpis'], f)
+    for part, frame in zip(COHORT_PARTS, tables['cohorts']):
+        write_frame(frame, os.path.join(preset_dir, table_file('cohorts', part)))
+    rfm = tables['rfm'].astype({column: 'int8' for column in RFM_SCORE_LABELS})
+    write_frame(rfm, os.path.join(preset_dir, table_file('rfm')))
+    for name in ('clv_empirical', 'trend:Mois', 'trend:Trimestre'):
+        write_frame(tables[name], os.path.join(preset_dir, table_file(name)))
+
+def read_table(preset_dir, name):
+    """Load one stored table back into the exact type returned by the analytics function."""
+    if name == 'kpis':
+        with open(os.path.join(preset_dir, table_file('kpis'))) as f:
+            return json.load(f)
+    if name == 'cohorts':
+        retention, sizes, counts = (pd.read_parquet(os.path.join(preset_dir, table_file('cohorts', part)))
+                                    for part in COHORT_PARTS)
+        # Cohort matrices are indexed by months since acquisition
+        for matrix in (retention, counts):
+            matrix.columns = matrix.columns.astype(int).rename('CohortIndex')
+        sizes = sizes.iloc[:, 0]
+        return retention, sizes.rename(int(sizes.name)), counts
+    frame = pd.read_parquet(os.path.join(preset_dir, table_file(name)))
+    if name == 'rfm':
+        for column, labels in RFM_SCORE_LABELS.items():
+            frame[column] = pd.Categorical(frame[column], categories=labels, ordered=True)
+        return frame
+    if name == 'clv_empirical':
+        return frame.iloc[:, 0]
+    return frame
+
+def build_snapshots(data_dir=None, top_countries=10, keep=3, verbose=True):
+    """Precompute the snapshot tables of every preset and publish them as the latest build."""
+    start = time.perf_counter()
+    df = compact_frame(read_data(CORE_COLUMNS, data_dir))
+    cube = read_cube(data_dir)
+    index = FilterIndex(df)
+    token = dataset_token(df)
+
+    root = os.path.join(processed_dir(data_dir), SNAPSHOT_DIR)
+    build = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    build_dir = os.path.join(root, build)
+    staging_dir = build_dir + '.tmp'
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    presets = []
+    for filters in preset_filters(df, top_countries):
+        key = filter_state_key(filters, token)
+        write_tables(compute_tables(df, filters, cube, index), os.path.join(staging_dir, key))
+        presets.append({'key': key, 'filters': {**filters, 'date_range': [str(d) for d in filters['date_range']]}})
+        if verbose:
+            print(f"  {', '.join(filters['country_filter'])} / {filters['returns_mode']}: {key[:12]}")
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'built_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'dataset_token': token,
+        'tables': SNAPSHOT_TABLES,
+        'presets': presets,
+    }
+    with open(os.path.join(staging_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Publish: complete build directory first, then the pointer (readers never see a partial build)
+    os.replace(staging_dir, build_dir)
+    latest_tmp = os.path.join(root, LATEST_FILE + '.tmp')
+    with open(latest_tmp, 'w') as f:
+        f.write(build)
+    os.replace(latest_tmp, os.path.join(root, LATEST_FILE))
+
+    builds = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)) and not name.endswith('.tmp'))
+    for old in builds[:-keep]:
+        shutil.rmtree(os.path.join(root, old))
+
+    if verbose:
+        print(f"Snapshot {build}: {len(presets)} presets in {time.perf_counter() - start:.1f}s -> {build_dir}")
+    return build_dir
+
+class SnapshotStore:
+    """Read side of the latest snapshot build: tables looked up by filter state key."""
+
+    def __init__(self, build_dir, manifest):
+        self.build_dir = build_dir
+        self.manifest = manifest
+        self.keys = {preset['key'] for preset in manifest['presets']}
+        self.tables = set(manifest['tables'])
+
+    @classmethod
+    def open(cls, data_dir=None):
+        """Latest build, or None when no compatible snapshot has been built."""
+        root = processed_path(SNAPSHOT_DIR, data_dir)
+        try:
+            with open(os.path.join(root, LATEST_FILE)) as f:
+                build_dir = os.path.join(root, f.read().strip())
+            with open(os.path.join(build_dir, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            return None
+        return cls(build_dir, manifest)
+
+    @property
+    def built_at(self):
+        return self.manifest['built_at']
+
+    def has(self, key, name=None):
+        """Whether the filter state (and table) is materialized in this build."""
+        return key in self.keys and (name is None or name in self.tables)
+
+    def load(self, key, name):
+        return read_table(os.path.join(self.build_dir, key), name)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m app.analytics.snapshots',
+                                     description="Precompute RFM, cohort, CLV and KPI tables for the default view and common presets.")
+    parser.add_argument('--data-dir', default=None, help="Processed data directory (default: data/processed).")
+    parser.add_argument('--top-countries', type=int, default=10, help="Countries with their own preset, by revenue.")
+    parser.add_argument('--keep', type=int, default=3, help="Number of builds kept on disk.")
+    args = parser.parse_args(argv)
+    print("Building analytics snapshot...")
+    build_snapshots(args.data_dir, args.top_countries, args.keep)
+
+if __name__ == '__main__':
+    main()
@@ -2,22 +2,20 @@ import streamlit as st
 import pandas as pd
 import utils
 import plotly.express as px
-import plotly.graph_objects as go
-import seaborn as sns
-import matplotlib.pyplot as plt
 
 st.markdown("# 🔍 Analyse des Cohortes")
 
 # Load and Filter Data
-df = utils.load_data()
+df = utils.load_data(utils.CORE_COLUMNS)
 filtered_df = utils.render_filters(df)
 
 if filtered_df.empty:
     st.warning("Aucune donnée pour les filtres sélectionnés.")
     st.stop()
 
-# Calculate Cohorts
-retention_matrix, cohort_sizes, cohort_counts = utils.calculate_cohorts(filtered_df)
+# Calculate Cohorts (from the customer-month cube when the filters allow it)
+cube = utils.filtered_cube()
+retention_matrix, cohort_sizes, cohort_counts = utils.memoized('cohorts', utils.calculate_cohorts, cube if cube is not None else filtered_df)
 
 # 1. Retention Heatmap
 st.subheader("Heatmap de Rétention")
@@ -47,7 +45,7 @@ st.plotly_chart(fig, use_container_width=True)
 st.subheader("Revenu par Cohorte")
 
 # Calculate revenue per cohort per month
-filtered_df = utils.add_cohort_columns(filtered_df)
+filtered_df = utils.memoized('cohort_columns', utils.add_cohort_columns, filtered_df)
 cohort_revenue = filtered_df.groupby(['CohortMonth', 'CohortIndex'])['TotalAmount'].sum().reset_index()
 cohort_revenue['CohortMonth'] = cohort_revenue['CohortMonth'].astype(str)
 
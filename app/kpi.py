@@ -6,26 +6,82 @@ import plotly.express as px
 st.markdown("# 📊 KPIs & Overview")
 
 # Load and Filter Data
-df = utils.load_data()
-filtered_df = utils.render_filters(df)
-
-if filtered_df.empty:
-    st.warning("Aucune donnée pour les filtres sélectionnés.")
-    st.stop()
-
-# Calculate Metrics
-total_revenue = filtered_df['TotalAmount'].sum()
-active_customers = filtered_df['Customer ID'].nunique()
-avg_order_value = filtered_df.groupby('Invoice')['TotalAmount'].sum().mean()
+df = utils.load_data(utils.CORE_COLUMNS)
+filtered_df = utils.render_filters(df, approximate=True)
+approximate = utils.approximate_mode()
+rollups = utils.get_rollups(df, st.session_state['dataset_token'])
+
+if approximate:
+    # Approximate mode: whole months, no line-level work. Revenue and invoices from the rollup prefix sums,
+    # distinct customers from the HyperLogLog sketches, retention and CLV from the customer-month cube
+    filters = utils.approximate_filters()
+    totals = rollups.range_totals(filters['date_range'], filters['country_filter'])
+    if totals['invoices'] == 0:
+        st.warning("Aucune donnée pour les filtres sélectionnés.")
+        st.stop()
+    source = utils.filter_cube(utils.load_cube(), **filters)
+    total_revenue = totals['total_revenue']
+    active_customers = round(utils.approximate_customers())
+    avg_order_value = total_revenue / totals['invoices']
+    retention_matrix, _, _ = utils.memoized('cohorts~months', utils.calculate_cohorts, source)
+    clv_curve = utils.memoized('clv_empirical~months', utils.calculate_clv_empirical, source)
+else:
+    if filtered_df.empty:
+        st.warning("Aucune donnée pour les filtres sélectionnés.")
+        st.stop()
+
+    # Serve aggregates from the customer-month cube when the filters allow it
+    cube = utils.filtered_cube()
+    source = cube if cube is not None else filtered_df
+
+    # Calculate Metrics
+    filters = st.session_state['filters']
+    if filters['min_order_value'] <= 0 and filters['returns_mode'] == 'Inclure':
+        # Revenue and invoices of any date range from the rollup prefix sums, active customers from the source
+        totals = rollups.range_totals(filters['date_range'], filters['country_filter'])
+        total_revenue = totals['total_revenue']
+        avg_order_value = total_revenue / totals['invoices'] if totals['invoices'] else 0.0
+        active_customers = utils.memoized('active_customers', lambda: int(source['Customer ID'].nunique()))
+    else:
+        kpis = utils.memoized('kpis', utils.kpi_summary, source)
+        total_revenue = kpis['total_revenue']
+        active_customers = kpis['active_customers']
+        avg_order_value = kpis['avg_order_value']
+
+    # Retention (Global Average for selected period)
+    retention_matrix, _, _ = utils.memoized('cohorts', utils.calculate_cohorts, source)
+    clv_curve = utils.memoized('clv_empirical', utils.calculate_clv_empirical, source)
 
-# Retention (Global Average for selected period)
-retention_matrix, _, _ = utils.calculate_cohorts(filtered_df)
 avg_retention = retention_matrix.iloc[:, 1:].mean().mean() # Avg of retention rates > month 0
 
 # CLV (Empirical)
-clv_curve = utils.calculate_clv_empirical(filtered_df)
 avg_clv = clv_curve.max() if not clv_curve.empty else 0
 
+if approximate:
+    sketch_index = utils.get_sketch_index()
+    invoice_sketch = sketch_index.invoice_sketch(filters['country_filter'], filters['date_range'])
+    q1, median, q3 = invoice_sketch.quantile([0.25, 0.5, 0.75])
+    start, end = filters['date_range']
+    st.caption(f"Mode approximatif (mois entiers, du {start:%d/%m/%Y} au {end:%d/%m/%Y}) : clients "
+               f"±{sketch_index.customer_error:.1%}. Panier : médiane £{median:,.0f} "
+               f"(Q1 £{q1:,.0f} – Q3 £{q3:,.0f}, ±{sketch_index.relative_accuracy:.0%}).")
+
+# Live mode: headline KPIs from the running aggregates, refreshed from new batches only
+live_mode = st.sidebar.toggle("Données temps réel", value=False,
+                              help="Intègre les lots déposés dans data/live/incoming sans recalculer l'historique.")
+if live_mode:
+    feed = utils.get_live_feed()
+    st.sidebar.button("Actualiser")
+    feed.poll()
+    live_kpis = feed.aggregates.kpis()
+    total_revenue = live_kpis['total_revenue']
+    active_customers = live_kpis['active_customers']
+    avg_order_value = live_kpis['avg_order_value']
+    avg_retention = live_kpis['avg_retention']
+    avg_clv = live_kpis['avg_clv']
+    st.caption(f"Temps réel (tous pays, toutes dates) : {live_kpis['batches']} lots intégrés, "
+               f"dernière facture le {live_kpis['last_invoice_date']:%d/%m/%Y %H:%M}.")
+
 # Layout Metrics
 col1, col2, col3, col4 = st.columns(4)
 
@@ -53,18 +109,23 @@ st.caption("Indicateur clé de la valeur générée par chaque client actif sur
 st.subheader("Tendances")
 time_unit = st.session_state.get('time_unit', 'Mois')
 
-if time_unit == 'Mois':
-    filtered_df['Period'] = filtered_df['InvoiceDate'].dt.to_period('M').astype(str)
-    title_suffix = "Mensuel"
-elif time_unit == 'Trimestre':
-    filtered_df['Period'] = filtered_df['InvoiceDate'].dt.to_period('Q').astype(str)
-    title_suffix = "Trimestriel"
+title_suffix = {'Mois': "Mensuelle", 'Trimestre': "Trimestrielle", 'Semaine': "Hebdomadaire", 'Jour': "Quotidienne"}[time_unit]
+trend_metrics = {"Chiffre d'Affaires": 'TotalAmount', "Factures": 'Invoices', "Clients Actifs": 'ActiveCustomers'}
+trend_metric = st.radio("Indicateur :", list(trend_metrics), horizontal=True)
+
+if approximate:
+    # Whole months from the rollups alone (buckets cut by a month boundary count their customers over the whole bucket)
+    sales_trend = utils.memoized(f'rollup~months:{time_unit}', rollups.trend, time_unit,
+                                 filters['date_range'], filters['country_filter'])
+elif filters['min_order_value'] <= 0 and filters['returns_mode'] == 'Inclure':
+    # Bucket sums from the rollups built at load time (edge buckets cut by the period use the filtered lines)
+    sales_trend = utils.memoized(f'rollup:{time_unit}', rollups.trend, time_unit,
+                                 filters['date_range'], filters['country_filter'], filtered_df)
 else:
-    filtered_df['Period'] = filtered_df['InvoiceDate'].dt.date
-    title_suffix = "Quotidien"
-
-sales_trend = filtered_df.groupby('Period')['TotalAmount'].sum().reset_index()
-fig = px.line(sales_trend, x='Period', y='TotalAmount', title=f'Évolution du CA {title_suffix}')
+    # The cube is monthly: weekly and daily trends need the line items
+    trend_source = source if time_unit in ('Mois', 'Trimestre') else filtered_df
+    sales_trend = utils.memoized(f'trend:{time_unit}', utils.revenue_trend, trend_source, time_unit)
+fig = px.line(sales_trend, x='Period', y=trend_metrics[trend_metric], title=f"Évolution {title_suffix} : {trend_metric}")
 st.plotly_chart(fig, use_container_width=True)
 
 # Definitions
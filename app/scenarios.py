@@ -1,12 +1,14 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import utils
+import plotly.express as px
 import plotly.graph_objects as go
 
 st.markdown("# 🎛️ Simulation de Scénarios")
 
 # Load and Filter Data
-df = utils.load_data()
+df = utils.load_data(utils.CORE_COLUMNS)
 filtered_df = utils.render_filters(df)
 
 if filtered_df.empty:
@@ -16,10 +18,15 @@ if filtered_df.empty:
 # 1. Baseline Metrics Calculation
 st.subheader("Paramètres Actuels (Baseline)")
 
-# Calculate Baseline Inputs
-avg_order_value = filtered_df.groupby('Invoice')['TotalAmount'].sum().mean()
-purchase_freq = filtered_df.groupby('Customer ID')['Invoice'].nunique().mean()
-retention_matrix, _, _ = utils.calculate_cohorts(filtered_df)
+# Calculate Baseline Inputs (from the customer-month cube when the filters allow it)
+cube = utils.filtered_cube()
+if cube is not None:
+    avg_order_value = cube['Revenue'].sum() / cube['Invoices'].sum()
+    purchase_freq = cube.groupby('Customer ID')['Invoices'].sum().mean()
+else:
+    avg_order_value = filtered_df.groupby('Invoice', observed=True)['TotalAmount'].sum().mean()
+    purchase_freq = filtered_df.groupby('Customer ID')['Invoice'].nunique().mean()
+retention_matrix, _, _ = utils.memoized('cohorts', utils.calculate_cohorts, cube if cube is not None else filtered_df)
 baseline_retention = retention_matrix.iloc[:, 1:].mean().mean() # Avg retention
 
 col1, col2, col3 = st.columns(3)
@@ -35,7 +42,7 @@ discount_rate = st.sidebar.slider("Taux d'Actualisation (d)", 0, 20, 10, 1) / 10
 avg_discount_sim = st.sidebar.slider("Remise Moyenne (%)", 0, 50, 0, 1) / 100
 
 # Cohort Selector (Target)
-filtered_df = utils.add_cohort_columns(filtered_df)
+filtered_df = utils.memoized('cohort_columns', utils.add_cohort_columns, filtered_df)
 cohorts_list = ['Toutes'] + sorted(filtered_df['CohortMonth'].unique().astype(str).tolist())
 target_cohort = st.selectbox("Cohorte Cible", cohorts_list)
 
@@ -49,22 +56,17 @@ else:
     simulation_df = filtered_df
 
 # Recalculate Baseline for Simulation Scope
-avg_order_value_sim = simulation_df.groupby('Invoice')['TotalAmount'].sum().mean()
+avg_order_value_sim = simulation_df.groupby('Invoice', observed=True)['TotalAmount'].sum().mean()
 purchase_freq_sim = simulation_df.groupby('Customer ID')['Invoice'].nunique().mean()
-retention_matrix_sim, _, _ = utils.calculate_cohorts(simulation_df)
+retention_matrix_sim, _, _ = utils.memoized(f'cohorts:{target_cohort}', utils.calculate_cohorts, simulation_df)
 baseline_retention_sim = retention_matrix_sim.iloc[:, 1:].mean().mean() if retention_matrix_sim.shape[1] > 1 else 0
 
 # 3. Scenario Calculation
 scenario_retention = min(max(baseline_retention_sim * (1 + retention_delta), 0), 0.99)
-# Adjusted Margin = Margin - Avg Discount (Simplified approximation of impact on profitability)
-adjusted_margin = margin_sim - avg_discount_sim
-
-def calc_clv(aov, freq, margin, r, d):
-    if (1 + d - r) <= 0: return 0
-    return (aov * freq * margin * r) / (1 + d - r)
-
-baseline_clv = calc_clv(avg_order_value_sim, purchase_freq_sim, margin_sim, baseline_retention_sim, discount_rate)
-scenario_clv = calc_clv(avg_order_value_sim, purchase_freq_sim, adjusted_margin, scenario_retention, discount_rate)
+# Scenario margin = Margin - Avg Discount (Simplified approximation of impact on profitability)
+baseline_clv = utils.calculate_clv_formula(avg_order_value_sim, purchase_freq_sim, margin_sim, baseline_retention_sim, discount_rate)
+scenario_clv = float(utils.scenario_clv(avg_order_value_sim, purchase_freq_sim, baseline_retention_sim,
+                                        margin_sim, retention_delta, discount_rate, avg_discount_sim))
 
 # 4. Results & Comparison
 st.subheader("Résultats de la Simulation")
@@ -83,13 +85,83 @@ fig = go.Figure(data=[
 fig.update_layout(title="Comparaison CLV : Baseline vs Scénario", barmode='group')
 st.plotly_chart(fig, use_container_width=True)
 
+# Uncertainty: bootstrap over the customers of the simulation scope
+with st.expander("📏 Intervalles de confiance (bootstrap)"):
+    st.caption("Les clients sont rééchantillonnés avec remise ; intervalles percentiles à 95 %.")
+    n_replicates = st.select_slider("Nombre de rééchantillonnages", [200, 500, 1000, 2000, 5000], value=1000)
+    if st.checkbox("Calculer les intervalles"):
+        # Replicates depend on the data only: slider changes reuse them
+        replicates = utils.memoized(f'bootstrap:{target_cohort}:{n_replicates}', utils.bootstrap_replicates,
+                                    simulation_df, n_replicates)
+        intervals = utils.scenario_intervals((baseline_retention_sim, avg_order_value_sim, purchase_freq_sim), replicates,
+                                             margin_sim, retention_delta, discount_rate, avg_discount_sim)
+        st.dataframe(intervals.rename(index={
+            'Retention': 'Taux de Rétention', 'AvgOrderValue': 'Panier Moyen', 'PurchaseFreq': "Fréquence d'Achat",
+            'BaselineCLV': 'CLV Baseline', 'ScenarioCLV': 'CLV Scénario',
+        }, columns={'Estimate': 'Estimation', 'Lower': 'Borne Basse', 'Upper': 'Borne Haute', 'StdErr': 'Écart-type'})
+                     .style.format(precision=3), width='stretch')
+
 # Sensitivity Analysis (Optional)
 st.markdown("### Analyse de Sensibilité")
 st.caption("Impact de la variation du taux de rétention sur la CLV (toutes choses égales par ailleurs)")
 
-r_range = [baseline_retention_sim * (1 + i/100) for i in range(-20, 21, 5)]
-clv_range = [calc_clv(avg_order_value_sim, purchase_freq_sim, adjusted_margin, r, discount_rate) for r in r_range]
+# Whole curve evaluated at once on a grid of retention variations
+retention_deltas = np.arange(-20, 21, 5) / 100
+r_range = np.clip(baseline_retention_sim * (1 + retention_deltas), 0, 0.99)
+clv_range = utils.clv_grid(avg_order_value_sim, purchase_freq_sim, baseline_retention_sim,
+                           margin_sim, retention_deltas, discount_rate, avg_discount_sim).ravel()
 
-fig_sens = go.Figure(data=go.Scatter(x=[r * 100 for r in r_range], y=clv_range, mode='lines+markers'))
+fig_sens = go.Figure(data=go.Scatter(x=r_range * 100, y=clv_range, mode='lines+markers'))
 fig_sens.update_layout(title="Sensibilité CLV vs Rétention", xaxis_title="Taux de Rétention (%)", yaxis_title="CLV (£)")
 st.plotly_chart(fig_sens, use_container_width=True)
+
+# 2-D sensitivity surface: margin x retention variation (discount rate and average discount as set)
+st.caption("Surface de sensibilité : CLV selon la marge et la variation de rétention")
+margins = np.arange(0, 101, 5) / 100
+surface_deltas = np.arange(-20, 21, 2) / 100
+surface = utils.clv_grid(avg_order_value_sim, purchase_freq_sim, baseline_retention_sim,
+                         margins, surface_deltas, discount_rate, avg_discount_sim)[:, :, 0, 0]
+fig_surface = px.imshow(surface, x=[f"{d:+.0%}" for d in surface_deltas], y=[f"{m:.0%}" for m in margins],
+                        labels=dict(x="Variation Rétention", y="Marge", color="CLV (£)"),
+                        color_continuous_scale='Blues', aspect='auto', origin='lower')
+st.plotly_chart(fig_surface, use_container_width=True)
+
+# Tornado: CLV swing when each parameter moves across a range, the others kept at the scenario values
+st.caption("Impact de chaque paramètre sur la CLV du scénario")
+tornado = utils.scenario_tornado(
+    avg_order_value_sim, purchase_freq_sim, baseline_retention_sim,
+    dict(margin=margin_sim, retention_delta=retention_delta, discount_rate=discount_rate, avg_discount=avg_discount_sim),
+    dict(margin=(max(margin_sim - 0.1, 0), min(margin_sim + 0.1, 1)),
+         retention_delta=(retention_delta - 0.1, retention_delta + 0.1),
+         discount_rate=(max(discount_rate - 0.05, 0), discount_rate + 0.05),
+         avg_discount=(max(avg_discount_sim - 0.05, 0), avg_discount_sim + 0.05)),
+)
+labels = {'margin': "Marge (±10 pts)", 'retention_delta': "Rétention (±10 %)",
+          'discount_rate': "Taux d'actualisation (±5 pts)", 'avg_discount': "Remise moyenne (±5 pts)"}
+tornado = tornado.iloc[::-1]
+names = tornado['Parameter'].map(labels)
+fig_tornado = go.Figure(data=[
+    go.Bar(name='Bas', y=names, x=tornado['CLV_Low'] - tornado['CLV_Base'], orientation='h', marker_color='indianred'),
+    go.Bar(name='Haut', y=names, x=tornado['CLV_High'] - tornado['CLV_Base'], orientation='h', marker_color='seagreen'),
+])
+fig_tornado.update_layout(title="Analyse Tornado (écart à la CLV du scénario)", barmode='overlay', xaxis_title="Δ CLV (£)")
+st.plotly_chart(fig_tornado, use_container_width=True)
+
+# 5. Scenario applied to every target at once
+st.markdown("### Comparaison des Cibles")
+st.caption("Le scénario courant appliqué à chaque cohorte ou segment RFM, classé par gain total de CLV")
+target_type = st.radio("Cibles :", ["Cohortes", "Segments RFM"], horizontal=True)
+by = 'cohort' if target_type == "Cohortes" else 'segment'
+source = cube if cube is not None else filtered_df
+rfm_df = utils.memoized('rfm', utils.calculate_rfm, source) if by == 'segment' else None
+baselines = utils.memoized(f'targets:{by}', utils.target_baselines, source, by, rfm_df)
+ranking = utils.simulate_targets(baselines, margin_sim, retention_delta, discount_rate, avg_discount_sim)
+
+fig_targets = px.bar(ranking.reset_index().head(15), x='Target', y='TotalUplift',
+                     labels={'Target': target_type, 'TotalUplift': "Gain total de CLV (£)"},
+                     title="Gain de CLV par cible (Scénario - Baseline) x Clients")
+st.plotly_chart(fig_targets, use_container_width=True)
+st.dataframe(ranking.rename(columns={
+    'Customers': 'Clients', 'AvgOrderValue': 'Panier Moyen', 'PurchaseFreq': 'Fréquence', 'Retention': 'Rétention',
+    'BaselineCLV': 'CLV Baseline', 'ScenarioCLV': 'CLV Scénario', 'Uplift': 'Gain / Client', 'TotalUplift': 'Gain Total',
+}).style.format(precision=2), width='stretch')
@@ -6,15 +6,16 @@ import plotly.express as px
 st.markdown("# 🎯 Segmentation RFM")
 
 # Load and Filter Data
-df = utils.load_data()
+df = utils.load_data(utils.CORE_COLUMNS)
 filtered_df = utils.render_filters(df)
 
 if filtered_df.empty:
     st.warning("Aucune donnée pour les filtres sélectionnés.")
     st.stop()
 
-# Calculate RFM
-rfm_df = utils.calculate_rfm(filtered_df)
+# Calculate RFM (from the customer-month cube when the filters allow it)
+cube = utils.filtered_cube()
+rfm_df = utils.memoized('rfm', utils.calculate_rfm, cube if cube is not None else filtered_df)
 
 # Aggregation by Segment
 segment_agg = rfm_df.groupby('Segment').agg({
@@ -57,3 +58,55 @@ st.plotly_chart(fig_tree, use_container_width=True)
 with st.expander("Voir les détails des clients par segment"):
     selected_seg = st.selectbox("Choisir un segment :", segment_agg.index)
     st.dataframe(rfm_df[rfm_df['Segment'] == selected_seg][['Recency', 'Frequency', 'Monetary', 'RFM_Score']].sort_values('Monetary', ascending=False), width='stretch')
+
+# Segment migration: RFM as of every month-end (one sweep) and moves between consecutive snapshots
+st.subheader("Migration des Segments")
+history = utils.memoized('rfm_history', utils.rfm_history, cube if cube is not None else filtered_df)
+if history.empty or history['Snapshot'].nunique() < 2:
+    st.info("Pas assez de mois sur la période pour suivre la migration des segments.")
+else:
+    segment_counts = history.groupby(['Snapshot', 'Segment']).size().rename('Count').reset_index()
+    segment_counts['Snapshot'] = segment_counts['Snapshot'].astype(str)
+    fig_history = px.area(segment_counts, x='Snapshot', y='Count', color='Segment',
+                          title="Clients par Segment en fin de mois")
+    st.plotly_chart(fig_history, use_container_width=True)
+    
+    transitions = utils.memoized('segment_transitions', utils.segment_transitions, history)
+    snapshot_months = transitions['ToSnapshot'].drop_duplicates().sort_values().astype(str).tolist()
+    selected_month = st.selectbox("Transitions vers la fin de mois :", snapshot_months, index=len(snapshot_months) - 1)
+    month_moves = transitions[transitions['ToSnapshot'].astype(str) == selected_month]
+    matrix = month_moves.pivot_table(index='From', columns='To', values='Customers', fill_value=0, aggfunc='sum')
+    fig_moves = px.imshow(matrix, text_auto=True, color_continuous_scale='Blues', aspect='auto',
+                          labels=dict(x="Segment d'arrivée", y="Segment de départ", color="Clients"),
+                          title=f"Matrice de transition ({month_moves['FromSnapshot'].iloc[0]} → {selected_month})")
+    st.plotly_chart(fig_moves, use_container_width=True)
+
+# Returns: matched to their original purchase at ingestion (src/process_data.py), rates for the filtered customers
+st.subheader("Retours")
+returns = utils.get_returns()
+if returns is None:
+    st.info("Les retours appariés ne sont pas encore calculés : relancez `python src/process_data.py`.")
+else:
+    matched_returns, return_summary = returns
+    return_summary = return_summary[return_summary['Customer ID'].isin(rfm_df.index)]
+    matched_returns = matched_returns[matched_returns['Customer ID'].isin(rfm_df.index)]
+    return_view = st.radio("Taux de retour par :", ["Segment", "Cohorte", "Produit"], horizontal=True)
+    if return_view == "Segment":
+        return_by = rfm_df['Segment']
+    elif return_view == "Cohorte":
+        return_by = utils.customer_cohorts(cube if cube is not None else filtered_df).astype(str)
+    else:
+        return_by = 'StockCode'
+    rates = utils.return_rates(return_summary, return_by, matched_returns)
+    st.dataframe(rates[['Customers', 'SoldAmount', 'ReturnedAmount', 'ReturnRate', 'QuantityReturnRate', 'MatchedShare',
+                        'MedianDaysToReturn']].style.format({
+        'SoldAmount': '£{:,.0f}',
+        'ReturnedAmount': '£{:,.0f}',
+        'ReturnRate': '{:.1%}',
+        'QuantityReturnRate': '{:.1%}',
+        'MatchedShare': '{:.0%}',
+        'MedianDaysToReturn': '{:.0f} jours',
+    }), width='stretch')
+    matched_share = (matched_returns['Match'] != 'unmatched').mean() if len(matched_returns) else 0
+    st.caption(f"Calculé à l'ingestion sur tout l'historique des clients filtrés. {matched_share:.0%} des lignes retournées "
+               "sont rattachées à leur achat d'origine (même client et produit, date antérieure, quantité identique en priorité).")
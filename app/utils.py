@@ -1,368 +1,176 @@
-import pandas as pd
-import numpy as np
-import streamlit as st
-import datetime
-
-@st.cache_data
-def load_data():
-    """Load the cleaned dataset."""
-    # Adjust path if necessary based on where app is run
-    try:
-        df = pd.read_csv('data/processed/online_retail_cleaned.csv')
-    except FileNotFoundError:
-        df = pd.read_csv('../data/processed/online_retail_cleaned.csv')
-        
-    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
-    df['InvoiceMonth'] = df['InvoiceDate'].dt.to_period('M')
-    return df
-
-def filter_data(df, country_filter, date_range, customer_type_filter=None, min_order_value=0, exclude_returns=False):
-    """Filter the dataset based on user inputs."""
-    filtered_df = df.copy()
-    
-    # Date Range
-    if date_range:
-        start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
-        filtered_df = filtered_df[(filtered_df['InvoiceDate'] >= start_date) & (filtered_df['InvoiceDate'] <= end_date)]
-    
-    # Country
-    if country_filter and 'All' not in country_filter:
-        filtered_df = filtered_df[filtered_df['Country'].isin(country_filter)]
-        
-    # Exclude Returns
-    if exclude_returns:
-        filtered_df = filtered_df[~filtered_df['Invoice'].astype(str).str.startswith('C')]
-        filtered_df = filtered_df[filtered_df['Quantity'] > 0]
-        
-    # Min Order Value (Filter invoices with total amount < threshold)
-    if min_order_value > 0:
-        invoice_totals = filtered_df.groupby('Invoice')['TotalAmount'].sum()
-        valid_invoices = invoice_totals[invoice_totals >= min_order_value].index
-        filtered_df = filtered_df[filtered_df['Invoice'].isin(valid_invoices)]
-        
-    return filtered_df
-
-def add_cohort_columns(df):
-    """Add CohortMonth and CohortIndex columns to the dataframe."""
-    df = df.copy()
-    
-    # Define Cohort Month (Month of first purchase)
-    df['CohortMonth'] = df.groupby('Customer ID')['InvoiceDate'].transform('min').dt.to_period('M')
-    
-    # Calculate Cohort Index (Months since first purchase)
-    def get_date_int(df, column):
-        year = df[column].dt.year
-        month = df[column].dt.month
-        return year, month
+import io
+import tempfile
 
-    invoice_year, invoice_month = get_date_int(df, 'InvoiceMonth')
-    cohort_year, cohort_month = get_date_int(df, 'CohortMonth')
-    years_diff = invoice_year - cohort_year
-    months_diff = invoice_month - cohort_month
-    df['CohortIndex'] = years_diff * 12 + months_diff + 1
-    
-    return df
-
-def calculate_cohorts(df):
-    """Calculate retention matrix and cohort sizes."""
-    df = add_cohort_columns(df)
-    
-    # Retention Matrix
-    grouping = df.groupby(['CohortMonth', 'CohortIndex'])
-    cohort_data = grouping['Customer ID'].apply(pd.Series.nunique).reset_index()
-    cohort_counts = cohort_data.pivot(index='CohortMonth', columns='CohortIndex', values='Customer ID')
-    cohort_sizes = cohort_counts.iloc[:, 0]
-    retention = cohort_counts.divide(cohort_sizes, axis=0)
-    
-    return retention, cohort_sizes, cohort_counts
-
-def calculate_rfm(df):
-    """Calculate RFM scores and segments."""
-    snapshot_date = df['InvoiceDate'].max() + pd.Timedelta(days=1)
-    
-    rfm = df.groupby('Customer ID').agg({
-        'InvoiceDate': lambda x: (snapshot_date - x.max()).days,
-        'Invoice': 'nunique',
-        'TotalAmount': 'sum'
-    })
-    
-    rfm.rename(columns={'InvoiceDate': 'Recency', 'Invoice': 'Frequency', 'TotalAmount': 'Monetary'}, inplace=True)
-    
-    # Create Quartiles (1-4, 4 is best)
-    # Recency: Lower is better -> 4 is lowest quartile
-    r_labels = range(4, 0, -1)
-    f_labels = range(1, 5)
-    m_labels = range(1, 5)
-    
-    r_quartiles = pd.qcut(rfm['Recency'], q=4, labels=r_labels)
-    # Handle duplicates in Frequency/Monetary with rank method if needed, or just duplicates='drop'
-    # Using rank(method='first') is safer for qcut with many duplicates
-    f_quartiles = pd.qcut(rfm['Frequency'].rank(method='first'), q=4, labels=f_labels)
-    m_quartiles = pd.qcut(rfm['Monetary'].rank(method='first'), q=4, labels=m_labels)
-    
-    rfm = rfm.assign(R=r_quartiles.values, F=f_quartiles.values, M=m_quartiles.values)
-    
-    def join_rfm(x): return str(x['R']) + str(x['F']) + str(x['M'])
-    rfm['RFM_Segment'] = rfm.apply(join_rfm, axis=1)
-    rfm['RFM_Score'] = rfm[['R', 'F', 'M']].sum(axis=1)
-    
-    # Define Segments
-    def segment_customer(df):
-        if df['RFM_Score'] >= 9:
-            return 'Champions'
-        elif (df['RFM_Score'] >= 8) and (df['RFM_Score'] < 9):
-            return 'Loyal Customers'
-        elif (df['RFM_Score'] >= 7) and (df['RFM_Score'] < 8):
-            return 'Potential Loyalists'
-        elif (df['RFM_Score'] >= 6) and (df['RFM_Score'] < 7):
-            return 'Promising'
-        elif (df['RFM_Score'] >= 5) and (df['RFM_Score'] < 6):
-            return 'Needs Attention'
-        elif (df['RFM_Score'] >= 4) and (df['RFM_Score'] < 5):
-            return 'About To Sleep'
-        else:
-            return 'At Risk'
-            
-    rfm['Segment'] = rfm.apply(segment_customer, axis=1)
-    
-    return rfm
-
-def calculate_clv_empirical(df):
-    """Calculate Empirical CLV (Cumulative Revenue per Cohort Age)."""
-    # Ensure CohortIndex exists
-    if 'CohortIndex' not in df.columns:
-        df = add_cohort_columns(df)
-
-    # Average revenue per customer at that age
-    # Approach:
-    # 1. Calculate total revenue per cohort per age.
-    # 2. Divide by initial cohort size.
-    # 3. Cumulate over age.
-    
-    cohort_sizes = df.groupby('CohortMonth')['Customer ID'].nunique()
-    
-    cohort_revenue_df = df.groupby(['CohortMonth', 'CohortIndex'])['TotalAmount'].sum().reset_index()
-    cohort_revenue_df = cohort_revenue_df.merge(cohort_sizes.rename('CohortSize'), on='CohortMonth')
-    cohort_revenue_df['RevPerCustomer'] = cohort_revenue_df['TotalAmount'] / cohort_revenue_df['CohortSize']
-    
-    # Average across all cohorts for each age
-    avg_clv_per_age = cohort_revenue_df.groupby('CohortIndex')['RevPerCustomer'].mean().cumsum()
-    
-    return avg_clv_per_age
-
-def calculate_clv_formula(avg_order_value, purchase_freq, margin, retention_rate, discount_rate):
-    """Calculate CLV using simple formula: (AOV * F * Margin * r) / (1 + d - r)."""
-    # CLV = (Gross Margin * Retention Rate) / (1 + Discount Rate - Retention Rate)
-    # Gross Margin = AOV * F * Margin%
-    
-    gross_margin = avg_order_value * purchase_freq * margin
-    if (1 + discount_rate - retention_rate) == 0:
-        return 0 # Avoid division by zero
-    clv = (gross_margin * retention_rate) / (1 + discount_rate - retention_rate)
-    return clv
-
-def simulate_scenarios(df, margin_change, retention_change, discount_rate):
-    """Simulate scenarios for CLV."""
-    # Baseline metrics
-    rfm = calculate_rfm(df)
-    avg_order_value = df.groupby('Invoice')['TotalAmount'].sum().mean()
-    purchase_freq = df.groupby('Customer ID')['Invoice'].nunique().mean() # Average frequency over the period
-import pandas as pd
-import numpy as np
 import streamlit as st
-import datetime
 
-@st.cache_data
-def load_data():
-    """Load the cleaned dataset."""
-    # Adjust path if necessary based on where app is run
+from analytics import (CORE_COLUMNS, processed_path, compact_frame, read_data, read_cube, is_cube,
+                       FilterIndex, filter_data, filter_cube, filter_state_key, dataset_token, AnalyticsCache,
+                       month_ordinals, months_to_periods, add_cohort_columns, cohort_pairs,
+                       calculate_cohorts, calculate_clv_empirical, SEGMENT_SCORE_BINS, SEGMENT_LABELS,
+                       calculate_rfm, score_rfm, revenue_trend, kpi_summary,
+                       calculate_clv_formula, simulate_scenarios, scenario_clv, clv_grid, scenario_tornado,
+                       target_baselines, simulate_targets, bootstrap_replicates, scenario_intervals,
+                       fit_predict_clv, rfm_history, segment_transitions, LiveAggregates, LiveFeed,
+                       SketchIndex, whole_months, read_returns, customer_cohorts, return_rates, RollupStore)
+from analytics.snapshots import SnapshotStore
+from analytics.basket import BASKET_COLUMNS, basket_index, cross_sell, read_basket_index
+from analytics.exports import EXPORT_FORMATS, EXPORT_MIME_TYPES, select_customers, write_export
+
+# Streamlit layer of the dashboard: shared resources, per-filter-state memoization and the sidebar.
+# The computations themselves live in the Streamlit-free `analytics` package.
+
+@st.cache_resource(show_spinner=False)
+def load_data(columns=None):
+    """Load the cleaned dataset (incremental Parquet store, then Parquet file, then CSV) in compact form.
+    
+    The frame is shared by every session as a read-only resource: pages must not modify it in place.
+    """
+    return compact_frame(read_data(columns))
+
+@st.cache_resource(show_spinner=False)
+def load_cube():
+    """Load the customer-month cube written by process_data.py (None if it has not been built)."""
+    return read_cube()
+
+def filtered_cube():
+    """Cube filtered with the current sidebar state (set by render_filters), or None if unavailable."""
+    filters = st.session_state.get('filters')
+    if filters is None:
+        return None
+    return memoized('cube', lambda: filter_cube(load_cube(), **filters))
+
+@st.cache_resource(show_spinner=False)
+def get_rollups(_df, token):
+    """Day/week/month/quarter rollups per country of a loaded dataset, built once (keyed by the dataset token)."""
+    return RollupStore(_df)
+
+@st.cache_resource(show_spinner=False)
+def get_filter_index(_df, token):
+    """FilterIndex of a loaded dataset, shared across reruns.
+    
+    Keyed by the dataset token: hashing the frame itself on every call would cost more than the index.
+    """
+    return FilterIndex(_df)
+
+@st.cache_resource(show_spinner=False)
+def get_analytics_cache():
+    """Process-wide AnalyticsCache."""
+    return AnalyticsCache()
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot():
+    """Latest materialized snapshot (python -m app.analytics.snapshots), or None."""
+    return SnapshotStore.open()
+
+def current_state_key():
+    """Filter state key of the current sidebar selection (None before render_filters)."""
+    filters = st.session_state.get('filters')
+    if filters is None:
+        return None
+    return filter_state_key(filters, st.session_state.get('dataset_token'))
+
+def snapshot_built_at():
+    """Build time of the snapshot serving the current filters, or None when they are computed live."""
+    snapshot = get_snapshot()
+    state_key = current_state_key()
+    if snapshot is None or state_key is None or not snapshot.has(state_key):
+        return None
+    return snapshot.built_at
+
+@st.cache_resource(show_spinner=False)
+def get_clv_warm_start():
+    """Parameters of the last predictive CLV fit of this process, reused as starting point."""
+    return {}
+
+def predict_customer_clv(df):
+    """BG/NBD + Gamma-Gamma predictions per customer, warm-started from the previous fit."""
+    warm_start = get_clv_warm_start()
+    predictions, params = fit_predict_clv(df, initial=warm_start.get('params'))
+    warm_start['params'] = params
+    return predictions
+
+@st.cache_resource(show_spinner=False)
+def get_live_feed():
+    """Live feed of the process, its aggregates seeded once with the loaded history."""
+    aggregates = LiveAggregates()
+    aggregates.update(load_data(CORE_COLUMNS))
+    return LiveFeed(aggregates)
+
+@st.cache_resource(show_spinner=False)
+def get_sketch_index():
+    """Per (month, country) sketches of the loaded data for the approximate mode, built once per process."""
+    return SketchIndex(load_data(CORE_COLUMNS))
+
+def approximate_mode():
+    """Whether the approximate mode is on and the current filters can be answered without the line items."""
+    filters = st.session_state.get('filters')
+    if not st.session_state.get('approximate') or filters is None or filters['date_range'] is None:
+        return False
+    # Sketches, rollups and cube are per (month, country): invoice thresholds and return handling need the lines
+    return filters['min_order_value'] <= 0 and filters['returns_mode'] == 'Inclure' and load_cube() is not None
+
+def approximate_filters():
+    """Current filters with the period widened to whole months (approximate mode)."""
+    filters = st.session_state['filters']
+    return dict(filters, date_range=whole_months(filters['date_range']))
+
+def approximate_customers():
+    """Estimated active customers of the current filters, over whole months (approximate mode)."""
+    filters = approximate_filters()
+    return get_sketch_index().active_customers(filters['country_filter'], filters['date_range'])
+
+@st.cache_resource(show_spinner=False)
+def get_basket():
+    """Product 'frequently bought with' index (stored, or built from the history) and per-customer cross-sell."""
+    lines = compact_frame(read_data(BASKET_COLUMNS))
+    index = read_basket_index()
+    if index is None:
+        index = basket_index(lines)
+    return index, cross_sell(lines, index)
+
+@st.cache_resource(show_spinner=False)
+def get_returns():
+    """Returns matched to their purchases at ingestion (matches, per customer-product summary), or None."""
+    return read_returns()
+
+def export_file(table, fmt, rows=None, columns=None):
+    """Rewound temporary file with table written chunk by chunk in fmt, for a deferred download button.
+    
+    rows and columns select what is written (see write_export); the file is deleted once closed.
+    """
+    # Unbuffered: download_button reads raw files, not buffered ones
+    spool = tempfile.TemporaryFile(buffering=0)
     try:
-        df = pd.read_csv('data/processed/online_retail_cleaned.csv')
-    except FileNotFoundError:
-        df = pd.read_csv('../data/processed/online_retail_cleaned.csv')
-        
-    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
-    df['InvoiceMonth'] = df['InvoiceDate'].dt.to_period('M')
-    return df
-
-def filter_data(df, country_filter, date_range, customer_type_filter=None, min_order_value=0, returns_mode='Inclure'):
-    """Filter the dataset based on user inputs."""
-    filtered_df = df.copy()
-    
-    # Date Range
-    if date_range:
-        start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
-        filtered_df = filtered_df[(filtered_df['InvoiceDate'] >= start_date) & (filtered_df['InvoiceDate'] <= end_date)]
-    
-    # Country
-    if country_filter and 'All' not in country_filter:
-        filtered_df = filtered_df[filtered_df['Country'].isin(country_filter)]
-        
-    # Returns Handling
-    if returns_mode == 'Exclure':
-        filtered_df = filtered_df[~filtered_df['Invoice'].astype(str).str.startswith('C')]
-    elif returns_mode == 'Neutraliser':
-        # Set negative values to 0 (keep transaction but remove financial impact)
-        filtered_df.loc[filtered_df['TotalAmount'] < 0, 'TotalAmount'] = 0
-        
-    # Min Order Value (Filter invoices with total amount < threshold)
-    if min_order_value > 0:
-        invoice_totals = filtered_df.groupby('Invoice')['TotalAmount'].sum()
-        valid_invoices = invoice_totals[invoice_totals >= min_order_value].index
-        filtered_df = filtered_df[filtered_df['Invoice'].isin(valid_invoices)]
-        
-    return filtered_df
-
-def add_cohort_columns(df):
-    """Add CohortMonth and CohortIndex columns to the dataframe."""
-    df = df.copy()
-    
-    # Define Cohort Month (Month of first purchase)
-    df['CohortMonth'] = df.groupby('Customer ID')['InvoiceDate'].transform('min').dt.to_period('M')
-    
-    # Calculate Cohort Index (Months since first purchase)
-    def get_date_int(df, column):
-        year = df[column].dt.year
-        month = df[column].dt.month
-        return year, month
-
-    invoice_year, invoice_month = get_date_int(df, 'InvoiceMonth')
-    cohort_year, cohort_month = get_date_int(df, 'CohortMonth')
-    years_diff = invoice_year - cohort_year
-    months_diff = invoice_month - cohort_month
-    df['CohortIndex'] = years_diff * 12 + months_diff + 1
-    
-    return df
-
-def calculate_cohorts(df):
-    """Calculate retention matrix and cohort sizes."""
-    df = add_cohort_columns(df)
-    
-    # Retention Matrix
-    grouping = df.groupby(['CohortMonth', 'CohortIndex'])
-    cohort_data = grouping['Customer ID'].apply(pd.Series.nunique).reset_index()
-    cohort_counts = cohort_data.pivot(index='CohortMonth', columns='CohortIndex', values='Customer ID')
-    cohort_sizes = cohort_counts.iloc[:, 0]
-    retention = cohort_counts.divide(cohort_sizes, axis=0)
-    
-    return retention, cohort_sizes, cohort_counts
-
-def calculate_rfm(df):
-    """Calculate RFM scores and segments."""
-    snapshot_date = df['InvoiceDate'].max() + pd.Timedelta(days=1)
-    
-    rfm = df.groupby('Customer ID').agg({
-        'InvoiceDate': lambda x: (snapshot_date - x.max()).days,
-        'Invoice': 'nunique',
-        'TotalAmount': 'sum'
-    })
-    
-    rfm.rename(columns={'InvoiceDate': 'Recency', 'Invoice': 'Frequency', 'TotalAmount': 'Monetary'}, inplace=True)
-    
-    # Create Quartiles (1-4, 4 is best)
-    # Recency: Lower is better -> 4 is lowest quartile
-    r_labels = range(4, 0, -1)
-    f_labels = range(1, 5)
-    m_labels = range(1, 5)
-    
-    r_quartiles = pd.qcut(rfm['Recency'], q=4, labels=r_labels)
-    # Handle duplicates in Frequency/Monetary with rank method if needed, or just duplicates='drop'
-    # Using rank(method='first') is safer for qcut with many duplicates
-    f_quartiles = pd.qcut(rfm['Frequency'].rank(method='first'), q=4, labels=f_labels)
-    m_quartiles = pd.qcut(rfm['Monetary'].rank(method='first'), q=4, labels=m_labels)
-    
-    rfm = rfm.assign(R=r_quartiles.values, F=f_quartiles.values, M=m_quartiles.values)
-    
-    def join_rfm(x): return str(x['R']) + str(x['F']) + str(x['M'])
-    rfm['RFM_Segment'] = rfm.apply(join_rfm, axis=1)
-    rfm['RFM_Score'] = rfm[['R', 'F', 'M']].sum(axis=1)
-    
-    # Define Segments
-    def segment_customer(df):
-        if df['RFM_Score'] >= 9:
-            return 'Champions'
-        elif (df['RFM_Score'] >= 8) and (df['RFM_Score'] < 9):
-            return 'Loyal Customers'
-        elif (df['RFM_Score'] >= 7) and (df['RFM_Score'] < 8):
-            return 'Potential Loyalists'
-        elif (df['RFM_Score'] >= 6) and (df['RFM_Score'] < 7):
-            return 'Promising'
-        elif (df['RFM_Score'] >= 5) and (df['RFM_Score'] < 6):
-            return 'Needs Attention'
-        elif (df['RFM_Score'] >= 4) and (df['RFM_Score'] < 5):
-            return 'About To Sleep'
-        else:
-            return 'At Risk'
-            
-    rfm['Segment'] = rfm.apply(segment_customer, axis=1)
-    
-    return rfm
-
-def calculate_clv_empirical(df):
-    """Calculate Empirical CLV (Cumulative Revenue per Cohort Age)."""
-    # Ensure CohortIndex exists
-    if 'CohortIndex' not in df.columns:
-        df = add_cohort_columns(df)
-
-    # Average revenue per customer at that age
-    # Approach:
-    # 1. Calculate total revenue per cohort per age.
-    # 2. Divide by initial cohort size.
-    # 3. Cumulate over age.
-    
-    cohort_sizes = df.groupby('CohortMonth')['Customer ID'].nunique()
-    
-    cohort_revenue_df = df.groupby(['CohortMonth', 'CohortIndex'])['TotalAmount'].sum().reset_index()
-    cohort_revenue_df = cohort_revenue_df.merge(cohort_sizes.rename('CohortSize'), on='CohortMonth')
-    cohort_revenue_df['RevPerCustomer'] = cohort_revenue_df['TotalAmount'] / cohort_revenue_df['CohortSize']
-    
-    # Average across all cohorts for each age
-    avg_clv_per_age = cohort_revenue_df.groupby('CohortIndex')['RevPerCustomer'].mean().cumsum()
-    
-    return avg_clv_per_age
-
-def calculate_clv_formula(avg_order_value, purchase_freq, margin, retention_rate, discount_rate):
-    """Calculate CLV using simple formula: (AOV * F * Margin * r) / (1 + d - r)."""
-    # CLV = (Gross Margin * Retention Rate) / (1 + Discount Rate - Retention Rate)
-    # Gross Margin = AOV * F * Margin%
-    
-    gross_margin = avg_order_value * purchase_freq * margin
-    if (1 + discount_rate - retention_rate) == 0:
-        return 0 # Avoid division by zero
-    clv = (gross_margin * retention_rate) / (1 + discount_rate - retention_rate)
-    return clv
+        buffered = io.BufferedWriter(spool)
+        write_export(table, buffered, fmt, rows=rows, columns=columns)
+        buffered.detach()
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+def memoized(name, func, *args):
+    """func(*args) for the current filter state, shared across pages through the analytics cache.
+    
+    Tables materialized in the snapshot for this filter state are read from disk instead of computed.
+    """
+    state_key = current_state_key()
+    if state_key is None:
+        return func(*args)
+    snapshot = get_snapshot()
+    if snapshot is not None and snapshot.has(state_key, name):
+        compute = lambda: snapshot.load(state_key, name)
+    else:
+        compute = lambda: func(*args)
+    return get_analytics_cache().get_or_compute((state_key, name), compute)
 
-def simulate_scenarios(df, margin_change, retention_change, discount_rate):
-    """Simulate scenarios for CLV."""
-    # Baseline metrics
-    rfm = calculate_rfm(df)
-    avg_order_value = df.groupby('Invoice')['TotalAmount'].sum().mean()
-    purchase_freq = df.groupby('Customer ID')['Invoice'].nunique().mean() # Average frequency over the period
-    
-    # Retention Rate (Approximate as average retention from cohorts)
-    retention_matrix, _, _ = calculate_cohorts(df)
-    avg_retention = retention_matrix.iloc[:, 1:].mean().mean() # Average of all retention rates (excluding month 1 which is 100%)
-    
-    # Baseline CLV
-    baseline_clv = calculate_clv_formula(avg_order_value, purchase_freq, 1.0, avg_retention, discount_rate) # Assuming 100% margin initially or user input
-    # Wait, margin is usually a percentage. Let's assume baseline margin is passed or we use 1.0 if not.
-    # The prompt says "Simuler des scénarios (ex. +5 % rétention, −10 % marge...)"
-    # So we need a base margin. Let's assume 20% net margin if not specified, or let user define.
-    # For this function, let's take absolute values or deltas.
-    
-    # Let's refine: The function should take BASE parameters and SCENARIO parameters.
-    # But here we calculate baseline from data.
+def render_filters(df, approximate=False):
+    """Render sidebar filters and return filtered dataframe.
     
-    # Let's return a dictionary with baseline and scenario values.
-    return {
-        'baseline_clv': baseline_clv,
-        'avg_retention': avg_retention,
-        'avg_order_value': avg_order_value,
-        'purchase_freq': purchase_freq
-    }
-
-def render_filters(df):
-    """Render sidebar filters and return filtered dataframe."""
+    Pages that support the approximate mode pass approximate=True: when it is on, the line items are not
+    filtered and None is returned (see approximate_mode).
+    """
     st.sidebar.header("Filtres")
     
     # Date Range
@@ -371,7 +179,7 @@ def render_filters(df):
     date_range = st.sidebar.date_input("Période", [min_date, max_date], min_value=min_date, max_value=max_date)
     
     # Time Unit (for aggregation in charts)
-    time_unit = st.sidebar.selectbox("Unité de Temps", ["Mois", "Trimestre"], index=0)
+    time_unit = st.sidebar.selectbox("Unité de Temps", ["Mois", "Trimestre", "Semaine", "Jour"], index=0)
     st.session_state['time_unit'] = time_unit
     
     # Country
@@ -384,18 +192,47 @@ def render_filters(df):
     # Min Order Value
     min_order = st.sidebar.number_input("Seuil de commande (£)", min_value=0, value=0, step=10)
     
-    # Apply filters
-    if len(date_range) == 2:
-        filtered_df = filter_data(df, country, date_range, min_order_value=min_order, returns_mode=returns_mode)
+    # Approximate mode: whole months answered from pre-built aggregates and sketches, without filtering lines
+    st.session_state['approximate'] = approximate and st.sidebar.toggle(
+        "Mode approximatif", value=False,
+        help="Indicateurs sur des mois entiers, sans filtrer les transactions : CA et factures des agrégats, "
+             "clients estimés par HyperLogLog, rétention et CLV du cube client × mois. "
+             "Sans effet avec un seuil de commande ou un mode retours autre que Inclure.")
+    
+    # Shared with filtered_cube() and memoized() so pages reuse results for the same filters
+    st.session_state['filters'] = {
+        'country_filter': country,
+        'date_range': tuple(date_range) if len(date_range) == 2 else None,
+        'min_order_value': min_order,
+        'returns_mode': returns_mode,
+    }
+    st.session_state['dataset_token'] = dataset_token(df)
+    
+    # Apply filters (skipped in approximate mode, whose pages read the aggregates instead)
+    if approximate_mode():
+        filters = approximate_filters()
+        totals = get_rollups(df, st.session_state['dataset_token']).range_totals(filters['date_range'], filters['country_filter'])
+        st.sidebar.markdown("---")
+        st.sidebar.write(f"**Factures:** {totals['invoices']} (mois entiers)")
+        st.sidebar.write(f"**Clients:** ≈{approximate_customers():,.0f} (±{get_sketch_index().customer_error:.1%})")
+        filtered_df = None
     else:
-        filtered_df = df # Fallback if date not fully selected
+        if len(date_range) == 2:
+            filtered_df = memoized('filtered', lambda: filter_data(df, country, date_range, min_order_value=min_order,
+                                                                   returns_mode=returns_mode,
+                                                                   index=get_filter_index(df, st.session_state['dataset_token'])))
+        else:
+            filtered_df = df # Fallback if date not fully selected
         
-    # Display Filter Stats
-    st.sidebar.markdown("---")
-    st.sidebar.write(f"**Transactions:** {len(filtered_df)}")
-    st.sidebar.write(f"**Clients:** {filtered_df['Customer ID'].nunique()}")
+        # Display Filter Stats
+        st.sidebar.markdown("---")
+        st.sidebar.write(f"**Transactions:** {len(filtered_df)}")
+        st.sidebar.write(f"**Clients:** {filtered_df['Customer ID'].nunique()}")
     
     if returns_mode == 'Exclure':
         st.sidebar.caption("🚫 Retours Exclus")
     
+    stats = get_analytics_cache().stats()
+    st.sidebar.caption(f"Cache : {stats['hits']} hits / {stats['misses']} misses ({stats['entries']} entrées)")
+    
     return filtered_df
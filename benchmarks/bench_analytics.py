@@ -0,0 +1,181 @@
+"""Benchmark the functions of the app/analytics package on synthetic Online Retail data.
+
+Usage (from the project root):
+    python benchmarks/bench_analytics.py --rows 100000 1000000 --customers 6000 --countries 40
+
+Each function is timed over several repeats, then run once more under tracemalloc to record
+its peak Python/NumPy memory. Results are written as JSON so that runs can be compared over time.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+import analytics
+
+FUNCTIONS = ['load_data', 'filter_data', 'add_cohort_columns', 'calculate_cohorts',
+             'calculate_rfm', 'calculate_clv_empirical', 'simulate_scenarios']
+
+def generate_dataset(n_rows, n_customers=6000, n_countries=40, n_products=4000,
+                     lines_per_invoice=20, cancellation_rate=0.02, start='2009-12-01', months=24, seed=0):
+    """Synthetic cleaned dataset with the schema written by src/process_data.py."""
+    rng = np.random.default_rng(seed)
+    n_invoices = max(1, n_rows // lines_per_invoice)
+
+    # Invoices: customer, date (sorted) and cancellation flag
+    start_ts = pd.Timestamp(start)
+    span_minutes = int((start_ts + pd.DateOffset(months=months) - start_ts).total_seconds() // 60)
+    invoice_dates = start_ts + pd.to_timedelta(np.sort(rng.integers(0, span_minutes, n_invoices)), unit='min')
+    # Skewed activity: a minority of customers places most orders
+    invoice_customers = (rng.pareto(1.2, n_invoices) * n_customers / 10).astype(np.int64) % n_customers
+    is_cancellation = rng.random(n_invoices) < cancellation_rate
+    invoice_numbers = pd.Series(np.arange(n_invoices) + 489434).astype(str)
+    invoice_numbers[is_cancellation] = 'C' + invoice_numbers[is_cancellation]
+
+    # Lines: each row belongs to an invoice (rows are grouped and ordered by invoice)
+    line_invoice = np.sort(rng.integers(0, n_invoices, n_rows))
+    customer_country = rng.zipf(1.5, n_customers) % n_countries
+    countries = pd.Categorical.from_codes(customer_country[invoice_customers[line_invoice]],
+                                          [f'Country {i:02d}' for i in range(n_countries)])
+    products = rng.integers(0, n_products, n_rows)
+    quantity = rng.integers(1, 25, n_rows)
+    quantity = np.where(is_cancellation[line_invoice], -quantity, quantity)
+    price = np.round(rng.gamma(2.0, 1.5, n_rows), 2)
+
+    df = pd.DataFrame({
+        'Invoice': invoice_numbers.to_numpy()[line_invoice],
+        'StockCode': pd.Categorical.from_codes(products, [f'{20000 + i}' for i in range(n_products)]),
+        'Description': pd.Categorical.from_codes(products, [f'PRODUCT {i}' for i in range(n_products)]),
+        'Quantity': quantity,
+        'InvoiceDate': invoice_dates[line_invoice],
+        'Price': price,
+        'Customer ID': (invoice_customers[line_invoice] + 12346).astype(np.int32),
+        'Country': countries,
+    })
+    df['TotalAmount'] = df['Quantity'] * df['Price']
+    df['InvoiceMonth'] = df['InvoiceDate'].dt.to_period('M')
+    return df
+
+def measure(func, repeat):
+    """Best and median wall time over `repeat` runs, then peak traced memory of one extra run."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'seconds_min': min(timings),
+        'seconds_median': statistics.median(timings),
+        'repeat': repeat,
+        'peak_mb': peak / 1024 ** 2,
+    }
+
+def benchmark_scale(n_rows, args, workdir):
+    """Run every selected function on one synthetic dataset."""
+    print(f"Generating {n_rows:,} rows ({args.customers} customers, {args.countries} countries)...")
+    raw = generate_dataset(n_rows, n_customers=args.customers, n_countries=args.countries,
+                           n_products=args.products, seed=args.seed)
+    processed_dir = os.path.join(workdir, 'data', 'processed')
+    os.makedirs(processed_dir, exist_ok=True)
+    raw.to_parquet(os.path.join(processed_dir, 'online_retail_cleaned.parquet'), index=False)
+
+    df = analytics.compact_frame(raw[analytics.CORE_COLUMNS])
+    del raw
+    countries = df['Country'].cat.categories.tolist()
+    dates = df['InvoiceDate']
+    filters = {
+        'country_filter': countries[: max(1, len(countries) // 4)],
+        'date_range': (dates.min() + (dates.max() - dates.min()) / 4, dates.max()),
+        'min_order_value': 10,
+        'returns_mode': 'Exclure',
+    }
+    index = analytics.FilterIndex(df)
+    cohort_df = analytics.add_cohort_columns(df)
+
+    def load():
+        analytics.compact_frame(analytics.read_data(analytics.CORE_COLUMNS, data_dir=processed_dir))
+
+    calls = {
+        'load_data': load,
+        'filter_data': lambda: analytics.filter_data(df, index=index, **filters),
+        'add_cohort_columns': lambda: analytics.add_cohort_columns(df),
+        'calculate_cohorts': lambda: analytics.calculate_cohorts(df),
+        'calculate_rfm': lambda: analytics.calculate_rfm(df),
+        'calculate_clv_empirical': lambda: analytics.calculate_clv_empirical(cohort_df),
+        'simulate_scenarios': lambda: analytics.simulate_scenarios(df, 0, 0, 0.1),
+    }
+
+    results = []
+    for name in args.functions:
+        stats = measure(calls[name], args.repeat)
+        print(f"  {name:<24} {stats['seconds_min'] * 1000:10.1f} ms  peak {stats['peak_mb']:8.1f} MB")
+        results.append({'rows': n_rows, 'customers': args.customers, 'countries': args.countries,
+                        'function': name, **stats})
+    return results
+
+def run_metadata():
+    """Environment details stored with the results."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analytics functions on synthetic data.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000],
+                        help="Dataset sizes to benchmark (line items), e.g. 100000 1000000 50000000.")
+    parser.add_argument('--customers', type=int, default=6000, help="Number of distinct customers.")
+    parser.add_argument('--countries', type=int, default=40, help="Number of distinct countries.")
+    parser.add_argument('--products', type=int, default=4000, help="Number of distinct products.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per function.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--functions', nargs='+', default=FUNCTIONS, choices=FUNCTIONS)
+    parser.add_argument('--output', default=None,
+                        help="JSON results file (default: benchmarks/results/bench_<timestamp>.json).")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_rows in args.rows:
+            results.extend(benchmark_scale(n_rows, args, workdir))
+
+    report = {'meta': run_metadata(), 'params': vars(args), 'results': results}
+    output = args.output
+    if output is None:
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        output = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', f'bench_{stamp}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == '__main__':
+    main()
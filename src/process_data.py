@@ -1,30 +1,69 @@
 import pandas as pd
 import numpy as np
 import os
+import glob
+import json
+import hashlib
+import argparse
+import shutil
+import io
+import math
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-def load_and_merge_data(raw_data_path):
-    """Load and merge the two datasets."""
+# Invoice and StockCode are codes: read as strings even in a chunk without any 'C' invoice or letter suffix
+# (the exports start with a UTF-8 BOM, read as part of the first column name until clean_data strips it)
+RAW_CSV_OPTIONS = dict(encoding='ISO-8859-1', sep=';', decimal=',',
+                       dtype={'ï»¿Invoice': str, 'Invoice': str, 'StockCode': str})
+STORE_DIR = 'online_retail'
+MANIFEST_FILE = 'manifest.json'
+CUBE_FILE = 'customer_month_cube.parquet'
+CUBE_PARTIALS_DIR = 'cube_partials.tmp'
+CUBE_KEYS = ['Customer ID', 'InvoiceMonth', 'Country']
+RETURNS_FILE = 'returns_matched.parquet'
+RETURN_SUMMARY_FILE = 'returns_by_customer_product.parquet'
+RETURN_KEYS = ['Customer ID', 'StockCode']
+RETURN_COLUMNS = ['Invoice', 'StockCode', 'Customer ID', 'Country', 'InvoiceDate', 'Quantity', 'TotalAmount']
+# Rough number of chunk-sized frames alive at once while cleaning (raw, filtered, typed)
+CHUNK_COPIES = 4
+
+def find_raw_files(raw_data_path):
+    """List the raw CSV exports in a deterministic (sorted) order."""
+    return sorted(glob.glob(os.path.join(raw_data_path, '*.csv')))
+
+def read_raw_file(path):
+    """Read one raw export (';' separated, ISO-8859-1, decimal comma)."""
+    return pd.read_csv(path, **RAW_CSV_OPTIONS)
+
+def load_and_merge_data(raw_data_path, files=None):
+    """Load and merge the raw datasets (every CSV in raw_data_path by default)."""
     print("Loading datasets...")
-    df09 = pd.read_csv(os.path.join(raw_data_path, '2009-2010.csv'), encoding='ISO-8859-1', sep=';', decimal=',')
-    df10 = pd.read_csv(os.path.join(raw_data_path, '2010-2011.csv'), encoding='ISO-8859-1', sep=';', decimal=',')
+    if files is None:
+        files = find_raw_files(raw_data_path)
     
-    print(f"2009-2010 shape: {df09.shape}")
-    print(f"2010-2011 shape: {df10.shape}")
+    frames = []
+    for path in files:
+        raw = read_raw_file(path)
+        print(f"{os.path.splitext(os.path.basename(path))[0]} shape: {raw.shape}")
+        frames.append(raw)
     
-    df = pd.concat([df09, df10], ignore_index=True)
+    df = pd.concat(frames, ignore_index=True)
     print(f"Merged shape: {df.shape}")
     return df
 
-def clean_data(df):
+def clean_data(df, verbose=True):
     """Clean the dataset according to requirements."""
-    print("Cleaning data...")
+    if verbose:
+        print("Cleaning data...")
     
     df.columns = df.columns.str.replace('ï»¿', '')  # Remove BOM character
     
     # 1. Remove rows with missing Customer ID
     initial_rows = len(df)
     df = df.dropna(subset=['Customer ID'])
-    print(f"Dropped {initial_rows - len(df)} rows with missing Customer ID")
+    if verbose:
+        print(f"Dropped {initial_rows - len(df)} rows with missing Customer ID")
     
     # 2. Convert Customer ID to integer
     df['Customer ID'] = df['Customer ID'].astype(int)
@@ -51,19 +90,483 @@ def clean_data(df):
     
     return df
 
+def split_raw_file(path, chunk_bytes):
+    """Split a raw export into line-aligned (path, start, end) byte ranges of about chunk_bytes each."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        f.readline()  # header
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # move to the end of the current line
+            end = f.tell()
+            ranges.append((path, start, end))
+            start = end
+    return ranges
+
+def read_raw_byte_range(path, start, end):
+    """Parse the lines of a raw export between two byte offsets, prefixed with the file's header line."""
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(header + data), **RAW_CSV_OPTIONS)
+
+def clean_byte_range(task):
+    """Worker task: parse and clean one byte range of a raw file."""
+    return clean_data(read_raw_byte_range(*task), verbose=False)
+
+def load_and_clean_parallel(files, workers, chunk_mb=64):
+    """Parse and clean raw files (split into line-aligned chunks) in a process pool.
+    
+    Chunks are merged in file then byte order, so the result matches load_and_merge_data + clean_data.
+    Assumes no quoted field spans several lines, which holds for the Online Retail exports.
+    """
+    chunk_bytes = max(1, int(chunk_mb * 1024 ** 2))
+    tasks = [task for path in files for task in split_raw_file(path, chunk_bytes)]
+    print(f"Cleaning {len(files)} files as {len(tasks)} chunks on {workers} processes...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(clean_byte_range, tasks))
+    
+    df = pd.concat([part for part in parts if len(part)] or parts[:1], ignore_index=True)
+    print(f"Cleaned shape: {df.shape}")
+    return df
+
+def to_columnar(df):
+    """Cast the cleaned dataset to compact, pre-typed columns for Parquet storage."""
+    df = df.copy()
+    df['Invoice'] = df['Invoice'].astype(str)
+    df['StockCode'] = df['StockCode'].astype(str).astype('category')
+    df['Country'] = df['Country'].astype('category')
+    df['Customer ID'] = df['Customer ID'].astype('int32')
+    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+    # Stored as a period[M] extension column so the app does not recompute it on load
+    df['InvoiceMonth'] = df['InvoiceDate'].dt.to_period('M')
+    return df
+
+def invoice_partial(df):
+    """Aggregate cleaned lines per (Customer ID, InvoiceMonth, Country, Invoice), the combinable unit of the cube."""
+    invoice = df['Invoice'].astype(str)
+    lines = df.assign(Invoice=invoice,
+                      InvoiceMonth=df['InvoiceDate'].dt.to_period('M'),
+                      ReturnAmount=df['TotalAmount'].where(invoice.str.startswith('C'), 0.0))
+    return lines.groupby(CUBE_KEYS + ['Invoice'], observed=True, sort=False).agg(
+        Revenue=('TotalAmount', 'sum'),
+        Lines=('TotalAmount', 'size'),
+        ReturnAmount=('ReturnAmount', 'sum'),
+        FirstInvoiceDate=('InvoiceDate', 'min'),
+        LastInvoiceDate=('InvoiceDate', 'max'),
+    ).reset_index()
+
+def build_customer_month_cube(partials):
+    """Combine invoice-level partial aggregates into the (Customer ID, InvoiceMonth, Country) cube."""
+    invoices = pd.concat(partials, ignore_index=True)
+    # An invoice can be split across two chunks: merge its partials before counting invoices
+    invoices = invoices.groupby(CUBE_KEYS + ['Invoice'], observed=True, sort=False).agg(
+        Revenue=('Revenue', 'sum'),
+        Lines=('Lines', 'sum'),
+        ReturnAmount=('ReturnAmount', 'sum'),
+        FirstInvoiceDate=('FirstInvoiceDate', 'min'),
+        LastInvoiceDate=('LastInvoiceDate', 'max'),
+    ).reset_index()
+    cube = invoices.groupby(CUBE_KEYS, observed=True).agg(
+        Revenue=('Revenue', 'sum'),
+        Invoices=('Invoice', 'size'),
+        Lines=('Lines', 'sum'),
+        ReturnAmount=('ReturnAmount', 'sum'),
+        FirstInvoiceDate=('FirstInvoiceDate', 'min'),
+        LastInvoiceDate=('LastInvoiceDate', 'max'),
+    ).reset_index()
+    cube['Customer ID'] = cube['Customer ID'].astype('int32')
+    cube['Country'] = cube['Country'].astype(str).astype('category')
+    return cube.sort_values(['InvoiceMonth', 'Customer ID'], ignore_index=True)
+
+def write_cube(cube, processed_path):
+    """Save the customer-month cube next to the cleaned data."""
+    cube_file = os.path.join(processed_path, CUBE_FILE)
+    print(f"Saving customer-month cube ({len(cube)} rows) to {cube_file}...")
+    cube.to_parquet(cube_file, index=False)
+
+def update_cube(processed_path, months):
+    """Recompute the cube rows of the given months from the partitioned store."""
+    store_path = os.path.join(processed_path, STORE_DIR)
+    cube_file = os.path.join(processed_path, CUBE_FILE)
+    partials = [invoice_partial(pd.read_parquet(os.path.join(store_path, month))) for month in sorted(months)]
+    fresh = build_customer_month_cube(partials)
+    if os.path.exists(cube_file):
+        cube = pd.read_parquet(cube_file)
+        cube = cube[~cube['InvoiceMonth'].astype(str).isin(months)]
+        fresh = pd.concat([cube, fresh], ignore_index=True)
+        fresh['Country'] = fresh['Country'].astype(str).astype('category')
+        fresh = fresh.sort_values(['InvoiceMonth', 'Customer ID'], ignore_index=True)
+    write_cube(fresh, processed_path)
+
+def match_returns(df):
+    """Pair each cancellation line with the purchase line it reverses, one purchase line per return.
+    
+    Returns are taken in date order: each matches the latest earlier purchase of the same customer and
+    StockCode with the same quantity that no earlier return claimed ('quantity'), failing that the
+    latest unclaimed earlier purchase of that product by the customer ('product'); returns of purchases
+    made before the data starts, or already all claimed, stay 'unmatched'.
+    """
+    lines = df[RETURN_COLUMNS].assign(Invoice=df['Invoice'].astype(str), StockCode=df['StockCode'].astype(str),
+                                      Quantity=df['Quantity'].astype('int64'))
+    is_return = lines['Invoice'].str.startswith('C')
+    returns = lines[is_return].rename(columns={'Invoice': 'ReturnInvoice', 'InvoiceDate': 'ReturnDate'})
+    returns = returns.assign(ReturnQuantity=-returns.pop('Quantity'), ReturnAmount=-returns.pop('TotalAmount'))
+    returns = returns.sort_values('ReturnDate', kind='stable', ignore_index=True)
+    # Only purchases of a (customer, product) with returns can be claimed
+    purchases = lines[~is_return & (lines['Quantity'] > 0)]
+    purchase_keys = pd.MultiIndex.from_frame(purchases[RETURN_KEYS])
+    return_keys = pd.MultiIndex.from_frame(returns[RETURN_KEYS])
+    purchases = purchases[purchase_keys.isin(return_keys)]
+    
+    # Purchases grouped by (customer, product), by date within a group
+    purchase_codes, keys = pd.factorize(pd.MultiIndex.from_frame(purchases[RETURN_KEYS]))
+    order = np.lexsort((purchases['InvoiceDate'].to_numpy(), purchase_codes))
+    purchases, purchase_codes = purchases.iloc[order].reset_index(drop=True), purchase_codes[order]
+    starts = np.searchsorted(purchase_codes, np.arange(len(keys)))
+    ends = np.searchsorted(purchase_codes, np.arange(len(keys)), side='right')
+    purchase_dates, purchase_quantities = purchases['InvoiceDate'].to_numpy(), purchases['Quantity'].to_numpy()
+    
+    return_codes = keys.get_indexer(return_keys) if len(keys) else np.full(len(returns), -1)
+    return_dates, return_quantities = returns['ReturnDate'].to_numpy(), returns['ReturnQuantity'].to_numpy()
+    claimed = np.zeros(len(purchases), dtype=bool)
+    picks = np.full(len(returns), -1)
+    match = np.full(len(returns), 'unmatched', dtype=object)
+    for row in np.flatnonzero(return_codes >= 0):
+        start = starts[return_codes[row]]
+        # Purchases strictly before the return, latest first
+        before = start + np.searchsorted(purchase_dates[start:ends[return_codes[row]]], return_dates[row])
+        candidates = np.arange(before - 1, start - 1, -1)
+        candidates = candidates[~claimed[candidates]]
+        same_quantity = candidates[purchase_quantities[candidates] == return_quantities[row]]
+        if len(same_quantity):
+            picks[row], match[row] = same_quantity[0], 'quantity'
+        elif len(candidates):
+            picks[row], match[row] = candidates[0], 'product'
+        else:
+            continue
+        claimed[picks[row]] = True
+    
+    matched = returns.assign(OriginalInvoice=purchases['Invoice'].reindex(picks).to_numpy(),
+                             OriginalDate=purchases['InvoiceDate'].reindex(picks).to_numpy(),
+                             OriginalQuantity=purchases['Quantity'].reindex(picks).to_numpy(dtype='float64', na_value=np.nan),
+                             Match=pd.array(match, dtype='str'))
+    # Float even when every return is matched, so that per-bucket outputs share one schema
+    matched['DaysToReturn'] = (matched['ReturnDate'] - matched['OriginalDate']).dt.days.astype('float64')
+    matched['Customer ID'] = matched['Customer ID'].astype('int32')
+    return matched
+
+def summarize_returns(df, matched):
+    """Purchased, returned and matched quantities and amounts per (Customer ID, StockCode)."""
+    invoice = df['Invoice'].astype(str)
+    purchases = df[~invoice.str.startswith('C') & (df['Quantity'] > 0)]
+    sold = purchases.groupby([purchases['Customer ID'], purchases['StockCode'].astype(str)], observed=True).agg(
+        SoldQuantity=('Quantity', 'sum'), SoldAmount=('TotalAmount', 'sum'))
+    returned = matched.assign(MatchedQuantity=matched['ReturnQuantity'].where(matched['Match'] != 'unmatched', 0)).groupby(
+        RETURN_KEYS).agg(ReturnedQuantity=('ReturnQuantity', 'sum'), ReturnedAmount=('ReturnAmount', 'sum'),
+                         MatchedQuantity=('MatchedQuantity', 'sum'), ReturnLines=('ReturnQuantity', 'size'))
+    summary = sold.join(returned, how='outer').fillna(0).reset_index()
+    summary['Customer ID'] = summary['Customer ID'].astype('int32')
+    return summary
+
+def write_returns(df, processed_path):
+    """Match returns to their purchases and save the matches and the per customer-product summary."""
+    matched = match_returns(df)
+    print(f"Matched {int((matched['Match'] != 'unmatched').sum())} of {len(matched)} return lines to their purchase")
+    matched.to_parquet(os.path.join(processed_path, RETURNS_FILE), index=False)
+    summarize_returns(df, matched).to_parquet(os.path.join(processed_path, RETURN_SUMMARY_FILE), index=False)
+
+def update_returns(processed_path, customers):
+    """Re-match the returns of the given customers over the partitioned store and replace their rows."""
+    store_path = os.path.join(processed_path, STORE_DIR)
+    customers = sorted(int(customer) for customer in customers)
+    df = pd.read_parquet(store_path, columns=RETURN_COLUMNS, filters=[('Customer ID', 'in', customers)])
+    matched = match_returns(df)
+    print(f"Matched {int((matched['Match'] != 'unmatched').sum())} of {len(matched)} return lines of {len(customers)} customers")
+    for name, fresh, order in ((RETURNS_FILE, matched, ['ReturnDate']),
+                               (RETURN_SUMMARY_FILE, summarize_returns(df, matched), RETURN_KEYS)):
+        path = os.path.join(processed_path, name)
+        if os.path.exists(path):
+            kept = pd.read_parquet(path, filters=[('Customer ID', 'not in', customers)])
+            fresh = pd.concat([kept, fresh], ignore_index=True)
+            if 'Country' in fresh:
+                fresh['Country'] = fresh['Country'].astype(str).astype('category')
+            fresh = fresh.sort_values(order, kind='stable', ignore_index=True)
+        fresh.to_parquet(path, index=False)
+
+def append_parquet(writers, path, df):
+    """Append a frame to the Parquet file at path, opened on first use with the first frame's schema."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if path not in writers:
+        schema = parquet_stream_schema(table)
+        # A column that is entirely missing in the first frame is typed from the later ones as a string
+        schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field for field in schema],
+                           metadata=schema.metadata)
+        writers[path] = pq.ParquetWriter(path, schema)
+    writers[path].write_table(table.cast(writers[path].schema))
+
+def close_writers(writers):
+    for writer in writers.values():
+        writer.close()
+
+def write_returns_by_bucket(parquet_file, processed_path, buckets):
+    """write_returns for a cleaned Parquet file too large for memory, one bucket of customers at a time.
+    
+    Returns only match purchases of the same customer, so lines are first split by Customer ID modulo
+    buckets into temporary files (read back one row group at a time), then each bucket is matched and
+    summarized on its own and appended to the outputs: same rows as write_returns, ordered by bucket.
+    """
+    bucket_dir = os.path.join(processed_path, 'returns_buckets.tmp')
+    shutil.rmtree(bucket_dir, ignore_errors=True)
+    os.makedirs(bucket_dir)
+    writers = {}
+    try:
+        for batch in pq.ParquetFile(parquet_file).iter_batches(columns=RETURN_COLUMNS):
+            lines = batch.to_pandas()
+            for bucket, part in lines.groupby(lines['Customer ID'].to_numpy() % buckets):
+                append_parquet(writers, os.path.join(bucket_dir, f'bucket-{bucket:04d}.parquet'), part)
+    finally:
+        close_writers(writers)
+    
+    outputs = {}
+    matched_lines, return_lines = 0, 0
+    try:
+        for name in sorted(os.listdir(bucket_dir)):
+            lines = pd.read_parquet(os.path.join(bucket_dir, name))
+            matched = match_returns(lines)
+            append_parquet(outputs, os.path.join(processed_path, RETURNS_FILE), matched)
+            append_parquet(outputs, os.path.join(processed_path, RETURN_SUMMARY_FILE), summarize_returns(lines, matched))
+            matched_lines += int((matched['Match'] != 'unmatched').sum())
+            return_lines += len(matched)
+    finally:
+        close_writers(outputs)
+    shutil.rmtree(bucket_dir)
+    print(f"Matched {matched_lines} of {return_lines} return lines to their purchase ({buckets} customer buckets)")
+
+def return_buckets(files, max_memory_mb):
+    """Customer buckets needed for one bucket of lines to take about max_memory_mb (raw size as a proxy)."""
+    raw_bytes = sum(os.path.getsize(path) for path in files)
+    return max(1, math.ceil(raw_bytes / (max_memory_mb * 1024 ** 2)))
+
+def estimate_chunksize(path, max_memory_mb, sample_rows=10000):
+    """Pick a number of rows per chunk so that cleaning one chunk stays within max_memory_mb."""
+    sample = pd.read_csv(path, nrows=sample_rows, **RAW_CSV_OPTIONS)
+    bytes_per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    return max(1000, int(max_memory_mb * 1024 ** 2 / (bytes_per_row * CHUNK_COPIES)))
+
+def parquet_stream_schema(table):
+    """Widen dictionary indices to int32 so every chunk can be written with the first chunk's schema."""
+    fields = [pa.field(field.name, pa.dictionary(pa.int32(), pa.string())) if pa.types.is_dictionary(field.type) else field
+              for field in table.schema]
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+def spill_partials(writers, partial_dir, partials):
+    """Append invoice partials to one temporary Parquet file per month."""
+    for month, part in partials.groupby('InvoiceMonth', observed=True):
+        append_parquet(writers, os.path.join(partial_dir, f'{month}.parquet'), part)
+
+def cube_from_spilled(partial_dir):
+    """Customer-month cube from the spilled invoice partials, reduced one month at a time."""
+    months = [build_customer_month_cube([pd.read_parquet(os.path.join(partial_dir, name))])
+              for name in sorted(os.listdir(partial_dir))]
+    cube = pd.concat(months, ignore_index=True)
+    cube['Country'] = cube['Country'].astype(str).astype('category')
+    return cube.sort_values(['InvoiceMonth', 'Customer ID'], ignore_index=True)
+
+def stream_clean(files, output_csv, output_parquet, chunksize=None, max_memory_mb=256):
+    """Clean raw files chunk by chunk, writing each cleaned chunk straight to the CSV and Parquet outputs.
+    
+    Returns the customer-month cube. Its invoice-level partials are spilled per month to a temporary
+    folder next to output_parquet, then reduced one month at a time, so memory does not grow with the input.
+    """
+    writer = None
+    partial_dir = os.path.join(os.path.dirname(os.path.abspath(output_parquet)), CUBE_PARTIALS_DIR)
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+    partial_writers = {}
+    first_chunk = True
+    total_rows = 0
+    try:
+        with open(output_csv, 'w', newline='', encoding='utf-8') as csv_out:
+            for path in files:
+                rows = chunksize or estimate_chunksize(path, max_memory_mb)
+                print(f"Streaming {os.path.basename(path)} in chunks of {rows} rows...")
+                read_rows, kept_rows = 0, 0
+                for chunk in pd.read_csv(path, chunksize=rows, **RAW_CSV_OPTIONS):
+                    read_rows += len(chunk)
+                    chunk = clean_data(chunk, verbose=False)
+                    if chunk.empty:
+                        continue
+                    chunk.to_csv(csv_out, header=first_chunk, index=False)
+                    table = pa.Table.from_pandas(to_columnar(chunk), preserve_index=False)
+                    if writer is None:
+                        schema = parquet_stream_schema(table)
+                        writer = pq.ParquetWriter(output_parquet, schema)
+                    writer.write_table(table.cast(schema))
+                    spill_partials(partial_writers, partial_dir, invoice_partial(chunk))
+                    first_chunk = False
+                    kept_rows += len(chunk)
+                print(f"{os.path.basename(path)}: kept {kept_rows} of {read_rows} rows")
+                total_rows += kept_rows
+    finally:
+        if writer is not None:
+            writer.close()
+        close_writers(partial_writers)
+    print(f"Cleaned rows written: {total_rows}")
+    cube = cube_from_spilled(partial_dir)
+    shutil.rmtree(partial_dir)
+    return cube
+
+def file_signature(path):
+    """Identify a raw file version by name, size and modification time."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+def load_manifest(processed_path):
+    """Read the incremental ingestion manifest (empty on first run)."""
+    manifest_file = os.path.join(processed_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return {'files': {}, 'high_water_mark': None, 'partitions': {}}
+    with open(manifest_file) as f:
+        return json.load(f)
+
+def save_manifest(manifest, processed_path):
+    """Write the manifest atomically so an interrupted run leaves the previous one intact."""
+    manifest_file = os.path.join(processed_path, MANIFEST_FILE)
+    tmp_file = manifest_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, manifest_file)
+
+def rows_past_high_water_mark(df, high_water_mark):
+    """Keep rows strictly after the stored (InvoiceDate, Invoice) high-water mark."""
+    if high_water_mark is None:
+        return df
+    hwm_date = pd.Timestamp(high_water_mark['InvoiceDate'])
+    hwm_invoice = str(high_water_mark['Invoice'])
+    invoice = df['Invoice'].astype(str)
+    mask = (df['InvoiceDate'] > hwm_date) | ((df['InvoiceDate'] == hwm_date) & (invoice > hwm_invoice))
+    return df[mask]
+
+def write_partitions(df, store_path, part_name):
+    """Append a cleaned delta to the month-partitioned store (one Parquet part per month)."""
+    df = to_columnar(df)
+    written = {}
+    for month, part in df.groupby('InvoiceMonth', sort=True):
+        month_dir = os.path.join(store_path, str(month))
+        os.makedirs(month_dir, exist_ok=True)
+        # Deterministic part names: re-running the same delta overwrites instead of duplicating
+        part.to_parquet(os.path.join(month_dir, f'part-{part_name}.parquet'), index=False)
+        written[str(month)] = len(part)
+    return written
+
+def run_incremental(raw_path, processed_path):
+    """Clean only new raw files (or new rows of updated files) and append them to the partitioned store."""
+    manifest = load_manifest(processed_path)
+    store_path = os.path.join(processed_path, STORE_DIR)
+    touched_months, touched_customers = set(), set()
+    
+    for path in find_raw_files(raw_path):
+        name = os.path.basename(path)
+        signature = file_signature(path)
+        known = manifest['files'].get(name)
+        if known is not None and known['signature'] == signature:
+            print(f"{name}: unchanged, skipped")
+            continue
+        
+        df = clean_data(read_raw_file(path))
+        # A changed file is a re-delivered export, and a new file can overlap the last one ingested:
+        # only rows past the high-water mark are new
+        cleaned_rows = len(df)
+        df = rows_past_high_water_mark(df, manifest['high_water_mark'])
+        print(f"{name}: {len(df)} new rows ({cleaned_rows - len(df)} already ingested)")
+        
+        part_name = hashlib.sha1(f"{name}:{signature['size']}:{signature['mtime']}".encode()).hexdigest()[:12]
+        written = write_partitions(df, store_path, part_name) if len(df) else {}
+        for month, rows in written.items():
+            manifest['partitions'][month] = manifest['partitions'].get(month, 0) + rows
+        touched_months.update(written)
+        touched_customers.update(df['Customer ID'].unique().tolist())
+        
+        if len(df):
+            last_date = df['InvoiceDate'].max()
+            last_invoice = df.loc[df['InvoiceDate'] == last_date, 'Invoice'].astype(str).max()
+            hwm = manifest['high_water_mark']
+            if hwm is None or (last_date, last_invoice) > (pd.Timestamp(hwm['InvoiceDate']), hwm['Invoice']):
+                manifest['high_water_mark'] = {'InvoiceDate': last_date.isoformat(), 'Invoice': last_invoice}
+        
+        ingested = known['rows'] if known is not None else 0
+        manifest['files'][name] = {'signature': signature, 'rows': ingested + len(df)}
+        save_manifest(manifest, processed_path)
+    
+    print(f"Store: {store_path} ({sum(manifest['partitions'].values())} rows in {len(manifest['partitions'])} partitions)")
+    if touched_months:
+        update_cube(processed_path, touched_months)
+        # New rows are past the high-water mark, so only the matches of customers with new rows can change
+        # (a new return can still reverse a purchase of any earlier month: their whole history is re-matched)
+        update_returns(processed_path, touched_customers)
+
 def main():
+    parser = argparse.ArgumentParser(description="Clean the Online Retail II raw exports.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only ingest new raw files/rows into the month-partitioned store (data/processed/online_retail/).")
+    parser.add_argument('--stream', action='store_true',
+                        help="Clean the raw files chunk by chunk with bounded memory instead of loading them at once.")
+    parser.add_argument('--max-memory-mb', type=int, default=256,
+                        help="Approximate memory budget per chunk in streaming mode (default: 256).")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Rows per chunk in streaming mode (overrides --max-memory-mb).")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of processes used to parse and clean the raw files (default: 1, serial).")
+    args = parser.parse_args()
+    
     raw_path = 'data/raw'
     processed_path = 'data/processed'
     
     if not os.path.exists(processed_path):
         os.makedirs(processed_path)
+    
+    if args.incremental:
+        run_incremental(raw_path, processed_path)
+        print("Done.")
+        return
         
-    df = load_and_merge_data(raw_path)
-    df = clean_data(df)
+    # A full rebuild supersedes any incremental store, which load_data would otherwise read first
+    store_path = os.path.join(processed_path, STORE_DIR)
+    if os.path.exists(store_path):
+        print(f"Removing incremental store {store_path}...")
+        shutil.rmtree(store_path)
+    if os.path.exists(os.path.join(processed_path, MANIFEST_FILE)):
+        os.remove(os.path.join(processed_path, MANIFEST_FILE))
     
     output_file = os.path.join(processed_path, 'online_retail_cleaned.csv')
+    parquet_file = os.path.join(processed_path, 'online_retail_cleaned.parquet')
+    
+    if args.stream:
+        files = find_raw_files(raw_path)
+        cube = stream_clean(files, output_file, parquet_file,
+                            chunksize=args.chunksize, max_memory_mb=args.max_memory_mb)
+        write_cube(cube, processed_path)
+        write_returns_by_bucket(parquet_file, processed_path, return_buckets(files, args.max_memory_mb))
+        print("Done.")
+        return
+    
+    if args.workers > 1:
+        df = load_and_clean_parallel(find_raw_files(raw_path), args.workers)
+    else:
+        df = load_and_merge_data(raw_path)
+        df = clean_data(df)
+    
     print(f"Saving cleaned data to {output_file}...")
     df.to_csv(output_file, index=False)
+    
+    print(f"Saving columnar data to {parquet_file}...")
+    to_columnar(df).to_parquet(parquet_file, index=False)
+    write_cube(build_customer_month_cube([invoice_partial(df)]), processed_path)
+    write_returns(df, processed_path)
     print("Done.")
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ('app', 'src', 'benchmarks'):
+    sys.path.insert(0, os.path.join(ROOT, folder))
+
+from analytics import CORE_COLUMNS, compact_frame
+from bench_analytics import generate_dataset
+
+RAW_COLUMNS = ['Invoice', 'StockCode', 'Description', 'Quantity', 'InvoiceDate', 'Price', 'Customer ID', 'Country']
+
+def to_raw_export(df, seed=0):
+    """Line items in the raw export format: ISO-8859-1, ';' separated, decimal comma, float Customer ID.
+
+    About 5% of the invoices lose their customer and a few lines get a negative price, so that
+    clean_data has rows to drop.
+    """
+    rng = np.random.default_rng(seed)
+    raw = df[RAW_COLUMNS].astype({'Invoice': str, 'StockCode': str, 'Description': str, 'Country': str})
+    raw['Customer ID'] = raw['Customer ID'].astype(float)
+    anonymous = raw['Invoice'].isin(rng.choice(raw['Invoice'].unique(), size=raw['Invoice'].nunique() // 20))
+    raw.loc[anonymous, 'Customer ID'] = np.nan
+    raw.loc[rng.random(len(raw)) < 0.002, 'Price'] = -1.5
+    raw['InvoiceDate'] = raw['InvoiceDate'].dt.strftime('%d/%m/%Y %H:%M')
+    return raw
+
+def write_raw_export(raw, path):
+    # The real exports start with a UTF-8 BOM read as ISO-8859-1 ('ï»¿Invoice')
+    raw.rename(columns={'Invoice': '﻿Invoice'}).to_csv(path, sep=';', decimal=',', index=False, encoding='utf-8')
+
+@pytest.fixture(scope='session')
+def dataset():
+    """Synthetic cleaned line items (2 years, 6 countries, with cancellations), minute-precision dates."""
+    df = generate_dataset(20000, n_customers=400, n_countries=6, n_products=300, seed=1)
+    return df.assign(InvoiceDate=df['InvoiceDate'].dt.floor('min'))
+
+@pytest.fixture(scope='session')
+def lines(dataset):
+    """The synthetic dataset as loaded by the app (compact_frame of CORE_COLUMNS)."""
+    return compact_frame(dataset[CORE_COLUMNS])
+
+@pytest.fixture
+def raw_dir(dataset, tmp_path):
+    """data/raw with the synthetic dataset split into two yearly exports."""
+    raw = to_raw_export(dataset)
+    raw_path = tmp_path / 'raw'
+    raw_path.mkdir()
+    first_year = dataset['InvoiceDate'] < pd.Timestamp('2010-12-01')
+    write_raw_export(raw[first_year.to_numpy()], raw_path / '2009-2010.csv')
+    write_raw_export(raw[~first_year.to_numpy()], raw_path / '2010-2011.csv')
+    return raw_path
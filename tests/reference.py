@@ -0,0 +1,112 @@
+"""Straightforward pandas versions of the original dashboard computations, used as test oracles."""
+import pandas as pd
+
+def filter_lines(df, country_filter, date_range, min_order_value=0, returns_mode='Inclure'):
+    """Sidebar filters applied with plain boolean masks and an invoice groupby."""
+    df = df.assign(Invoice=df['Invoice'].astype(str), Country=df['Country'].astype(str))
+    if date_range:
+        start = pd.to_datetime(date_range[0])
+        end = pd.to_datetime(date_range[1]) + pd.Timedelta(days=1)
+        df = df[(df['InvoiceDate'] >= start) & (df['InvoiceDate'] < end)]
+    if country_filter and 'All' not in country_filter:
+        df = df[df['Country'].isin(country_filter)]
+    if returns_mode == 'Exclure':
+        df = df[~df['Invoice'].str.startswith('C')]
+    amounts = df['TotalAmount'].clip(lower=0) if returns_mode == 'Neutraliser' else df['TotalAmount']
+    if min_order_value > 0:
+        totals = amounts.groupby(df['Invoice']).transform('sum')
+        df, amounts = df[totals >= min_order_value], amounts[totals >= min_order_value]
+    return df.assign(TotalAmount=amounts)
+
+def cohort_counts(df):
+    """Distinct customers per (CohortMonth, CohortIndex)."""
+    months = df['InvoiceDate'].dt.to_period('M')
+    cohorts = months.groupby(df['Customer ID']).transform('min')
+    index = (months - cohorts).apply(lambda offset: offset.n) + 1
+    counts = df.groupby([cohorts.rename('CohortMonth'), index.rename('CohortIndex')])['Customer ID'].nunique()
+    return counts.unstack('CohortIndex').astype(float)
+
+def rfm_values(df, snapshot_date=None):
+    """Recency, Frequency and Monetary per customer (snapshot date: the day after the last invoice by default)."""
+    if snapshot_date is None:
+        snapshot_date = df['InvoiceDate'].max() + pd.Timedelta(days=1)
+    rfm = df.groupby('Customer ID').agg(
+        Recency=('InvoiceDate', lambda dates: (snapshot_date - dates.max()).days),
+        Frequency=('Invoice', 'nunique'),
+        Monetary=('TotalAmount', 'sum'),
+    )
+    return rfm
+
+def segment(score):
+    """Segment of an RFM_Score, as the original if/elif chain assigned it."""
+    if score >= 9:
+        return 'Champions'
+    elif score >= 8:
+        return 'Loyal Customers'
+    elif score >= 7:
+        return 'Potential Loyalists'
+    elif score >= 6:
+        return 'Promising'
+    elif score >= 5:
+        return 'Needs Attention'
+    elif score >= 4:
+        return 'About To Sleep'
+    return 'At Risk'
+
+def revenue_trend(df, time_unit):
+    """Revenue, invoices and active customers per month, quarter, week (Monday) or day."""
+    if time_unit in ('Mois', 'Trimestre'):
+        period = df['InvoiceDate'].dt.to_period('M' if time_unit == 'Mois' else 'Q').astype(str)
+    else:
+        days = df['InvoiceDate'].dt.normalize()
+        period = (days - pd.to_timedelta(days.dt.dayofweek, unit='D') if time_unit == 'Semaine' else days).dt.date
+    return df.groupby(period.rename('Period')).agg(
+        TotalAmount=('TotalAmount', 'sum'), Invoices=('Invoice', 'nunique'), ActiveCustomers=('Customer ID', 'nunique'),
+    ).reset_index()
+
+def calc_clv(aov, freq, margin, r, d):
+    """CLV formula of the original simulation page (0 when 1 + d - r is not positive)."""
+    if (1 + d - r) <= 0:
+        return 0
+    return (aov * freq * margin * r) / (1 + d - r)
+
+def scenario_clv(aov, freq, base_retention, margin, retention_delta, discount_rate, avg_discount):
+    """Scenario CLV of the original simulation page: scaled, clipped retention and discounted margin."""
+    retention = min(max(base_retention * (1 + retention_delta), 0), 0.99)
+    return calc_clv(aov, freq, margin - avg_discount, retention, discount_rate)
+
+def scenario_baseline(df):
+    """AOV, purchase frequency and average retention of line items, as the simulation page computes them."""
+    counts = cohort_counts(df)
+    retention = counts.div(counts[1], axis=0)
+    return {
+        'avg_order_value': df.groupby('Invoice', observed=True)['TotalAmount'].sum().mean(),
+        'purchase_freq': df.groupby('Customer ID')['Invoice'].nunique().mean(),
+        'avg_retention': retention.iloc[:, 1:].mean().mean() if retention.shape[1] > 1 else 0,
+    }
+
+def association_rules(df, min_count=2):
+    """Support, confidence and lift of product pairs from a self-merge of the distinct purchase (invoice, product) pairs."""
+    purchases = df[~df['Invoice'].astype(str).str.startswith('C') & (df['Quantity'] > 0)]
+    pairs = purchases[['Invoice', 'StockCode']].astype(str).drop_duplicates()
+    n_invoices = pairs['Invoice'].nunique()
+    item_counts = pairs['StockCode'].value_counts()
+    both = pairs.merge(pairs, on='Invoice', suffixes=('_a', '_b'))
+    both = both[both['StockCode_a'] != both['StockCode_b']]
+    rules = both.groupby(['StockCode_a', 'StockCode_b']).size().rename('Count').reset_index()
+    rules = rules[rules['Count'] >= min_count].rename(columns={'StockCode_a': 'Antecedent', 'StockCode_b': 'Consequent'})
+    rules['Support'] = rules['Count'] / n_invoices
+    rules['Confidence'] = rules['Count'] / rules['Antecedent'].map(item_counts)
+    rules['Lift'] = rules['Confidence'] / (rules['Consequent'].map(item_counts) / n_invoices)
+    return rules.reset_index(drop=True)
+
+def cross_sell(df, index, n_recommendations=3):
+    """Top products per customer by summed lift from the products they bought, excluding those."""
+    purchases = df[~df['Invoice'].astype(str).str.startswith('C') & (df['Quantity'] > 0)]
+    bought = purchases[['Customer ID', 'StockCode']].astype({'StockCode': str}).drop_duplicates()
+    scores = bought.merge(index, left_on='StockCode', right_on='Antecedent').groupby(['Customer ID', 'Consequent'])['Lift'].sum()
+    scores = scores.reset_index()
+    owned = set(zip(bought['Customer ID'], bought['StockCode']))
+    scores = scores[[pair not in owned for pair in zip(scores['Customer ID'], scores['Consequent'])]]
+    scores = scores.sort_values(['Customer ID', 'Lift', 'Consequent'], ascending=[True, False, True])
+    return scores.groupby('Customer ID').head(n_recommendations).groupby('Customer ID')['Consequent'].agg(', '.join)
@@ -0,0 +1,330 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import reference
+from analytics import (FilterIndex, filter_data, filter_cube, calculate_cohorts, calculate_rfm, rfm_values, calculate_clv_empirical,
+                       kpi_summary, revenue_trend, PartitionedStore, calculate_clv_formula, simulate_scenarios,
+                       scenario_clv, clv_grid, scenario_tornado, target_baselines, simulate_targets,
+                       bootstrap_replicates, scenario_intervals, score_rfm, rfm_history, segment_transitions,
+                       RollupStore)
+from analytics.bootstrap import bootstrap_inputs, replicate_metrics
+from analytics.clv_models import customer_summary, BetaGeoModel, GammaGammaModel
+from analytics.basket import association_rules, basket_index, cross_sell
+from analytics.snapshots import SnapshotStore, build_snapshots, compute_tables
+from process_data import invoice_partial, build_customer_month_cube, write_partitions, STORE_DIR, CUBE_FILE
+
+FILTER_STATES = [
+    dict(country_filter=['All'], date_range=None),
+    dict(country_filter=['Country 00', 'Country 02'], date_range=('2010-03-15', '2011-02-20')),
+    dict(country_filter=['All'], date_range=('2010-01-01', '2010-12-31'), returns_mode='Exclure'),
+    dict(country_filter=['Country 01'], date_range=None, min_order_value=150, returns_mode='Neutraliser'),
+]
+# Whole months only: the states the cube can answer
+CUBE_STATES = [
+    dict(country_filter=['All'], date_range=None),
+    dict(country_filter=['Country 00', 'Country 03'], date_range=('2010-02-01', '2011-01-31')),
+]
+
+@pytest.fixture(scope='module')
+def cube(dataset):
+    return build_customer_month_cube([invoice_partial(dataset)])
+
+def sorted_lines(df):
+    return df.sort_values(['InvoiceDate', 'Invoice', 'TotalAmount'], ignore_index=True)
+
+@pytest.mark.parametrize('filters', FILTER_STATES)
+def test_filter_index_matches_masks(lines, filters):
+    index = FilterIndex(lines)
+    filtered = filter_data(lines, index=index, **filters)
+    expected = reference.filter_lines(lines, **filters)
+    assert len(filtered) == len(expected)
+    np.testing.assert_allclose(filtered['TotalAmount'].to_numpy(), expected['TotalAmount'].to_numpy())
+    # Unsorted frames go through the argsort path
+    shuffled = lines.sample(frac=1, random_state=0)
+    pd.testing.assert_frame_equal(sorted_lines(filter_data(shuffled, **filters)), sorted_lines(filtered))
+
+@pytest.mark.parametrize('filters', FILTER_STATES)
+def test_rfm_matches_reference(lines, filters):
+    filtered = filter_data(lines, **filters)
+    expected = reference.filter_lines(lines, **filters)
+    pd.testing.assert_frame_equal(rfm_values(filtered), reference.rfm_values(expected), check_dtype=False)
+    # Segments from the score lookup table, as the original if/elif chain assigned them
+    rfm = calculate_rfm(filtered)
+    assert (rfm['RFM_Score'] == rfm['R'].astype(int) + rfm['F'].astype(int) + rfm['M'].astype(int)).all()
+    assert (rfm['Segment'] == rfm['RFM_Score'].map(reference.segment)).all()
+
+@pytest.mark.parametrize('filters', FILTER_STATES)
+def test_cohorts_match_reference(lines, filters):
+    filtered = filter_data(lines, **filters)
+    _, sizes, counts = calculate_cohorts(filtered)
+    expected = reference.cohort_counts(reference.filter_lines(lines, **filters))
+    pd.testing.assert_frame_equal(counts, expected, check_names=False)
+    pd.testing.assert_series_equal(sizes, expected[1], check_names=False)
+
+@pytest.mark.parametrize('filters', CUBE_STATES)
+def test_cube_matches_lines(lines, cube, filters):
+    filtered_cube = filter_cube(cube, **filters)
+    assert filtered_cube is not None
+    filtered = filter_data(lines, **filters)
+    for computed, expected in zip(calculate_cohorts(filtered_cube), calculate_cohorts(filtered)):
+        pd.testing.assert_frame_equal(pd.DataFrame(computed), pd.DataFrame(expected))
+    pd.testing.assert_frame_equal(calculate_rfm(filtered_cube), calculate_rfm(filtered), check_dtype=False)
+    pd.testing.assert_series_equal(calculate_clv_empirical(filtered_cube), calculate_clv_empirical(filtered))
+    assert kpi_summary(filtered_cube) == pytest.approx(kpi_summary(filtered))
+    for time_unit in ('Mois', 'Trimestre'):
+        pd.testing.assert_frame_equal(revenue_trend(filtered_cube, time_unit), revenue_trend(filtered, time_unit),
+                                      check_dtype=False)
+
+def test_cube_refuses_partial_months(cube):
+    assert filter_cube(cube, ['All'], ('2010-02-10', '2010-06-30')) is None
+    assert filter_cube(cube, ['All'], None, min_order_value=10) is None
+
+@pytest.mark.parametrize('filters', FILTER_STATES)
+def test_out_of_core_matches_in_memory(dataset, lines, tmp_path, filters):
+    write_partitions(dataset.drop(columns='InvoiceMonth'), str(tmp_path / STORE_DIR), 'test')
+    date_range = filters['date_range'] or (lines['InvoiceDate'].min().date(), lines['InvoiceDate'].max().date())
+    filters = dict(filters, date_range=date_range)
+    store_cube = PartitionedStore(data_dir=str(tmp_path)).cube(**filters)
+    filtered = filter_data(lines, **filters)
+    pd.testing.assert_frame_equal(calculate_rfm(store_cube), calculate_rfm(filtered), check_dtype=False)
+    pd.testing.assert_frame_equal(calculate_cohorts(store_cube)[2], calculate_cohorts(filtered)[2])
+    assert kpi_summary(store_cube) == pytest.approx(kpi_summary(filtered))
+
+@pytest.mark.parametrize('filters', FILTER_STATES[:2])
+@pytest.mark.parametrize('time_unit', ['Mois', 'Trimestre', 'Semaine', 'Jour'])
+def test_rollups_match_revenue_trend(lines, filters, time_unit):
+    rollups = RollupStore(lines)
+    filtered = filter_data(lines, **filters)
+    trend = rollups.trend(time_unit, filters['date_range'], filters['country_filter'], filtered)
+    expected = reference.revenue_trend(filtered, time_unit)
+    pd.testing.assert_frame_equal(trend, expected, check_dtype=False)
+    # Days and weeks without sales have no row, as in revenue_trend
+    pd.testing.assert_frame_equal(trend, revenue_trend(filtered, time_unit), check_dtype=False)
+
+@pytest.mark.parametrize('filters', FILTER_STATES[:2])
+def test_rollup_range_totals_match_kpis(lines, filters):
+    totals = RollupStore(lines).range_totals(filters['date_range'], filters['country_filter'])
+    kpis = kpi_summary(filter_data(lines, **filters))
+    assert totals['total_revenue'] == pytest.approx(kpis['total_revenue'])
+    assert totals['total_revenue'] / totals['invoices'] == pytest.approx(kpis['avg_order_value'])
+
+@pytest.mark.parametrize('filters', FILTER_STATES[:2])
+def test_simulate_scenarios_matches_reference(lines, filters):
+    filtered = filter_data(lines, **filters)
+    baseline = simulate_scenarios(filtered, 0.2, 0.05, 0.1)
+    expected = reference.scenario_baseline(reference.filter_lines(lines, **filters))
+    for key in ('avg_order_value', 'purchase_freq', 'avg_retention'):
+        assert baseline[key] == pytest.approx(expected[key])
+    assert baseline['baseline_clv'] == pytest.approx(reference.calc_clv(
+        expected['avg_order_value'], expected['purchase_freq'], 1.0, expected['avg_retention'], 0.1))
+
+def test_clv_grid_matches_scalar_formula(lines):
+    baseline = simulate_scenarios(lines, 0.2, 0.05, 0.1)
+    inputs = (baseline['avg_order_value'], baseline['purchase_freq'], baseline['avg_retention'])
+    margins, deltas, rates, discounts = [0, 0.2, 0.55], [-0.2, 0, 0.1, 5.0], [0, 0.1, 0.2], [0, 0.05]
+    grid = clv_grid(*inputs, margins, deltas, rates, discounts)
+    assert grid.shape == (3, 4, 3, 2)
+    for i, margin in enumerate(margins):
+        for j, delta in enumerate(deltas):
+            for k, rate in enumerate(rates):
+                for m, discount in enumerate(discounts):
+                    expected = reference.scenario_clv(*inputs, margin, delta, rate, discount)
+                    assert grid[i, j, k, m] == pytest.approx(expected)
+                    assert scenario_clv(*inputs, margin, delta, rate, discount) == pytest.approx(expected)
+    np.testing.assert_allclose(calculate_clv_formula(inputs[0], inputs[1], np.array(margins), inputs[2], 0.1),
+                               [reference.calc_clv(inputs[0], inputs[1], margin, inputs[2], 0.1) for margin in margins])
+
+def test_scenario_tornado_matches_scalar_formula(lines):
+    baseline = simulate_scenarios(lines, 0.2, 0.05, 0.1)
+    inputs = (baseline['avg_order_value'], baseline['purchase_freq'], baseline['avg_retention'])
+    scenario = dict(margin=0.3, retention_delta=0.05, discount_rate=0.1, avg_discount=0.02)
+    ranges = dict(margin=(0.2, 0.4), retention_delta=(-0.05, 0.15), discount_rate=(0.05, 0.15))
+    tornado = scenario_tornado(*inputs, scenario, ranges).set_index('Parameter')
+    assert list(tornado.index) == list(tornado.sort_values('Swing', ascending=False).index)
+    assert sorted(tornado.index) == sorted(ranges)
+    for name, (low, high) in ranges.items():
+        assert tornado.loc[name, 'CLV_Low'] == pytest.approx(reference.scenario_clv(*inputs, **dict(scenario, **{name: low})))
+        assert tornado.loc[name, 'CLV_High'] == pytest.approx(reference.scenario_clv(*inputs, **dict(scenario, **{name: high})))
+    assert tornado['CLV_Base'].iloc[0] == pytest.approx(reference.scenario_clv(*inputs, **scenario))
+
+@pytest.mark.parametrize('by', ['cohort', 'segment'])
+def test_target_baselines_match_page_on_subsets(lines, by):
+    filtered = filter_data(lines, **FILTER_STATES[1])
+    baselines = target_baselines(filtered, by)
+    if by == 'cohort':
+        customer_targets = filtered.groupby('Customer ID')['InvoiceDate'].min().dt.to_period('M').astype(str)
+    else:
+        customer_targets = calculate_rfm(filtered)['Segment']
+    labels = filtered['Customer ID'].map(customer_targets)
+    assert sorted(baselines.index) == sorted(labels.unique())
+    for target, row in baselines.iterrows():
+        subset = filtered[(labels == target).to_numpy()]
+        expected = reference.scenario_baseline(subset)
+        assert row['Customers'] == subset['Customer ID'].nunique()
+        assert row['AvgOrderValue'] == pytest.approx(expected['avg_order_value'])
+        assert row['PurchaseFreq'] == pytest.approx(expected['purchase_freq'])
+        assert row['Retention'] == pytest.approx(expected['avg_retention'])
+
+    ranking = simulate_targets(baselines, 0.25, 0.1, 0.1, 0.05)
+    assert ranking['TotalUplift'].is_monotonic_decreasing
+    for target, row in ranking.iterrows():
+        inputs = (row['AvgOrderValue'], row['PurchaseFreq'], row['Retention'])
+        uplift = reference.scenario_clv(*inputs, 0.25, 0.1, 0.1, 0.05) - reference.calc_clv(inputs[0], inputs[1], 0.25, inputs[2], 0.1)
+        assert row['TotalUplift'] == pytest.approx(uplift * row['Customers'])
+
+def resampled_lines(df, counts):
+    """Line items of a bootstrap resample: customer i (in sorted ID order) repeated counts[i] times as new customers."""
+    customer_ids = np.sort(df['Customer ID'].unique())
+    copies = []
+    for copy in range(counts.max()):
+        part = df[df['Customer ID'].isin(customer_ids[counts > copy])]
+        copies.append(part.assign(**{'Customer ID': part['Customer ID'].astype('int64') * 100 + copy,
+                                     'Invoice': part['Invoice'].astype(str) + f'#{copy}'}))
+    return pd.concat(copies, ignore_index=True)
+
+def test_bootstrap_weights_match_materialized_resample(lines):
+    filtered = filter_data(lines, **FILTER_STATES[1])
+    inputs = bootstrap_inputs(filtered)
+    n_customers = filtered['Customer ID'].nunique()
+    counts = np.random.default_rng(7).multinomial(n_customers, np.full(n_customers, 1 / n_customers), size=3)
+    metrics = replicate_metrics(inputs, counts.astype(float))
+    for replicate, weights in zip(metrics, counts):
+        expected = reference.scenario_baseline(resampled_lines(filtered, weights))
+        np.testing.assert_allclose(replicate, [expected['avg_retention'], expected['avg_order_value'],
+                                               expected['purchase_freq']])
+    # Unit weights give the full-sample estimate
+    expected = reference.scenario_baseline(filtered)
+    np.testing.assert_allclose(replicate_metrics(inputs, np.ones((1, n_customers)))[0],
+                               [expected['avg_retention'], expected['avg_order_value'], expected['purchase_freq']])
+
+def test_bootstrap_is_reproducible(lines, cube):
+    replicates = bootstrap_replicates(lines, 300, seed=3, batch_size=64)
+    pd.testing.assert_frame_equal(bootstrap_replicates(lines, 300, seed=3, batch_size=64), replicates)
+    assert not bootstrap_replicates(lines, 300, seed=4, batch_size=64).equals(replicates)
+    # Customer codes follow sorted IDs: the cube draws the same resamples as the lines
+    pd.testing.assert_frame_equal(bootstrap_replicates(cube, 300, seed=3, batch_size=64), replicates)
+
+    estimate = simulate_scenarios(lines, 0.2, 0.0, 0.1)
+    intervals = scenario_intervals((estimate['avg_retention'], estimate['avg_order_value'], estimate['purchase_freq']),
+                                   replicates, 0.2, 0.05, 0.1, 0.02)
+    assert (intervals['Lower'] < intervals['Upper']).all()
+    assert intervals.loc['ScenarioCLV', 'Estimate'] == pytest.approx(reference.scenario_clv(
+        estimate['avg_order_value'], estimate['purchase_freq'], estimate['avg_retention'], 0.2, 0.05, 0.1, 0.02))
+
+def test_customer_summary_leaves_out_cancellations(lines, cube):
+    summary = customer_summary(lines)
+    purchases = lines[~lines['Invoice'].astype(str).str.startswith('C')]
+    assert len(purchases) < len(lines)
+    customers = purchases.groupby('Customer ID', observed=True)
+    first, last = customers['InvoiceDate'].min(), customers['InvoiceDate'].max()
+    invoices = customers['Invoice'].nunique()
+    day = pd.Timedelta(days=1)
+    np.testing.assert_array_equal(summary['frequency'], invoices - 1)
+    np.testing.assert_allclose(summary['recency'], (last - first) / day)
+    np.testing.assert_allclose(summary['T'], (lines['InvoiceDate'].max() - first) / day)
+    np.testing.assert_allclose(summary['monetary'], customers['TotalAmount'].sum() / invoices)
+    with pytest.raises(ValueError):
+        customer_summary(cube)
+
+def simulate_bgnbd(n_customers, r, alpha, a, b, T=None, seed=0):
+    """Summaries drawn from the BG/NBD process: Poisson purchases, dropout after each repeat purchase.
+
+    Observation lengths T are uniform between 30 and 90 days unless given.
+    """
+    rng = np.random.default_rng(seed)
+    rates = rng.gamma(r, 1 / alpha, n_customers)
+    dropouts = rng.beta(a, b, n_customers)
+    T = rng.uniform(30, 90, n_customers) if T is None else np.full(n_customers, float(T))
+    frequency, recency = np.zeros(n_customers), np.zeros(n_customers)
+    for customer in range(n_customers):
+        t = rng.exponential(1 / rates[customer])
+        while t < T[customer]:
+            frequency[customer] += 1
+            recency[customer] = t
+            if rng.random() < dropouts[customer]:
+                break
+            t += rng.exponential(1 / rates[customer])
+    return pd.DataFrame({'frequency': frequency, 'recency': recency, 'T': T})
+
+def test_bgnbd_recovers_simulated_parameters():
+    params = {'r': 0.25, 'alpha': 4.0, 'a': 0.8, 'b': 2.5}
+    summary = simulate_bgnbd(20000, **params)
+    fitted = BetaGeoModel().fit(summary).params
+    for name, value in params.items():
+        assert fitted[name] == pytest.approx(value, rel=0.2), name
+    # Expected purchases of a new customer over 60 days: the mean simulated frequency over 60 days
+    model = BetaGeoModel()
+    model.params = params
+    new_customer = pd.DataFrame({'frequency': [0.0], 'recency': [0.0], 'T': [0.0]})
+    assert model.expected_purchases(60, new_customer)[0] == pytest.approx(
+        simulate_bgnbd(20000, **params, T=60, seed=1)['frequency'].mean(), rel=0.05)
+
+def test_gamma_gamma_recovers_simulated_parameters():
+    p, q, v = 6.0, 4.0, 15.0
+    rng = np.random.default_rng(0)
+    transactions = rng.integers(1, 8, 20000)
+    scales = rng.gamma(q, 1 / v, len(transactions))
+    monetary = np.array([rng.gamma(p, 1 / scale, n).mean() for n, scale in zip(transactions, scales)])
+    summary = pd.DataFrame({'frequency': transactions - 1, 'monetary': monetary})
+    fitted = GammaGammaModel().fit(summary).params
+    for name, value in {'p': p, 'q': q, 'v': v}.items():
+        assert fitted[name] == pytest.approx(value, rel=0.15), name
+    # One-time buyers are left out of the fit
+    one_time = summary.assign(monetary=np.where(summary['frequency'] == 0, 1e6, summary['monetary']))
+    assert GammaGammaModel().fit(one_time).params == pytest.approx(fitted)
+
+@pytest.mark.parametrize('source', ['lines', 'cube'])
+def test_rfm_history_matches_month_end_scoring(lines, cube, source):
+    history = rfm_history(lines if source == 'lines' else cube)
+    snapshots = history['Snapshot'].unique()
+    assert len(snapshots) == lines['InvoiceDate'].dt.to_period('M').nunique()
+    for snapshot in snapshots:
+        # Data up to the month-end, scored with the first day of the next month as snapshot date
+        next_month = (snapshot + 1).to_timestamp()
+        expected = score_rfm(reference.rfm_values(lines[lines['InvoiceDate'] < next_month], next_month))
+        computed = history[history['Snapshot'] == snapshot].drop(columns='Snapshot')
+        pd.testing.assert_frame_equal(computed, expected, check_dtype=False, check_categorical=False)
+
+def test_segment_transitions_match_consecutive_snapshots(lines):
+    history = rfm_history(lines)
+    transitions = segment_transitions(history)
+    snapshots = history['Snapshot'].unique()
+    for before, after in zip(snapshots[:-1], snapshots[1:]):
+        previous = history.loc[history['Snapshot'] == before, 'Segment']
+        current = history.loc[history['Snapshot'] == after, 'Segment']
+        moves = pd.DataFrame({'From': previous.reindex(current.index).fillna('New'), 'To': current})
+        expected = moves.groupby(['From', 'To']).size()
+        computed = transitions[transitions['ToSnapshot'] == after].set_index(['From', 'To'])['Customers']
+        assert (transitions.loc[transitions['ToSnapshot'] == after, 'FromSnapshot'] == before).all()
+        pd.testing.assert_series_equal(computed, expected, check_names=False, check_dtype=False)
+
+def test_association_rules_match_pair_counts(dataset):
+    rules = association_rules(dataset).sort_values(['Antecedent', 'Consequent'], ignore_index=True)
+    expected = reference.association_rules(dataset).sort_values(['Antecedent', 'Consequent'], ignore_index=True)
+    assert len(rules) > 0
+    pd.testing.assert_frame_equal(rules, expected, check_dtype=False)
+
+def test_cross_sell_matches_summed_lifts(dataset):
+    index = basket_index(dataset, top_k=5)
+    assert (index.groupby('Antecedent')['Rank'].max() <= 5).all()
+    assert (index.groupby('Antecedent')['Lift'].diff().dropna() <= 0).all()
+    recommendations = cross_sell(dataset, index)['CrossSell']
+    expected = reference.cross_sell(dataset, index)
+    pd.testing.assert_series_equal(recommendations.sort_index(), expected, check_names=False, check_index_type=False)
+
+def test_snapshots_round_trip(dataset, lines, cube, tmp_path):
+    dataset.to_parquet(tmp_path / 'online_retail_cleaned.parquet', index=False)
+    cube.to_parquet(tmp_path / CUBE_FILE, index=False)
+    build_snapshots(str(tmp_path), top_countries=2, verbose=False)
+    store = SnapshotStore.open(str(tmp_path))
+    assert len(store.manifest['presets']) == 5
+    index = FilterIndex(lines)
+    for preset in store.manifest['presets']:
+        expected = compute_tables(lines, dict(preset['filters'], date_range=tuple(preset['filters']['date_range'])), cube, index)
+        assert store.load(preset['key'], 'kpis') == pytest.approx(expected['kpis'])
+        for computed, table in zip(store.load(preset['key'], 'cohorts'), expected['cohorts']):
+            pd.testing.assert_frame_equal(pd.DataFrame(computed), pd.DataFrame(table))
+        pd.testing.assert_frame_equal(store.load(preset['key'], 'rfm'), expected['rfm'], check_dtype=False)
+        pd.testing.assert_series_equal(store.load(preset['key'], 'clv_empirical'), expected['clv_empirical'])
+        pd.testing.assert_frame_equal(store.load(preset['key'], 'trend:Mois'), expected['trend:Mois'], check_dtype=False)
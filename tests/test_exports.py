@@ -0,0 +1,54 @@
+import io
+
+import pandas as pd
+import pytest
+
+from analytics import calculate_rfm
+from analytics.exports import ACTIVATION_COLUMNS, activation_list, write_export
+from process_data import match_returns, summarize_returns
+
+@pytest.fixture(scope='module')
+def returns_summary(dataset):
+    return summarize_returns(dataset, match_returns(dataset))
+
+def read_export(data, fmt):
+    if fmt == 'parquet':
+        return pd.read_parquet(io.BytesIO(data))
+    return pd.read_csv(io.BytesIO(data), index_col=0, compression='gzip' if fmt == 'csv.gz' else None)
+
+def test_activation_list_matches_rfm_selection(lines, returns_summary):
+    table = activation_list(lines, ['Segment', 'RFM_Score', 'ReturnRate'], segments=['Champions'],
+                            returns_summary=returns_summary)
+    rfm = calculate_rfm(lines)
+    champions = rfm[rfm['Segment'] == 'Champions']
+    assert list(table.columns) == ['Segment', 'RFM_Score', 'ReturnRate']
+    pd.testing.assert_index_equal(table.index, champions.index)
+
+@pytest.mark.parametrize('predicates', [dict(segments=['Champions'], min_score=13), dict(min_clv=1e12)])
+def test_activation_list_empty_selection(lines, returns_summary, predicates):
+    table = activation_list(lines, returns_summary=returns_summary, recommendations=pd.DataFrame({'CrossSell': []}),
+                            **predicates)
+    assert table.empty and list(table.columns) == ACTIVATION_COLUMNS
+
+@pytest.mark.parametrize('fmt', ['csv', 'csv.gz', 'parquet'])
+def test_write_export_chunks_match_one_pass(lines, fmt):
+    table = activation_list(lines, ['Recency', 'Frequency', 'Monetary', 'Segment'])
+    chunked, whole = io.BytesIO(), io.BytesIO()
+    assert write_export(table, chunked, fmt, chunk_rows=7) == len(table)
+    write_export(table, whole, fmt, chunk_rows=len(table))
+    pd.testing.assert_frame_equal(read_export(chunked.getvalue(), fmt), read_export(whole.getvalue(), fmt))
+    empty = io.BytesIO()
+    assert write_export(table.iloc[:0], empty, fmt) == 0
+    assert list(read_export(empty.getvalue(), fmt).columns) == list(table.columns)
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+def test_write_export_selects_rows_and_columns(lines, fmt):
+    table = activation_list(lines, ['Recency', 'Frequency', 'Monetary', 'Segment'])
+    rows = table.sort_values('Monetary', ascending=False).index[:50]
+    selected = io.BytesIO()
+    assert write_export(table, selected, fmt, chunk_rows=7, rows=rows, columns=['Segment', 'Monetary']) == 50
+    whole = io.BytesIO()
+    write_export(table.loc[rows, ['Segment', 'Monetary']], whole, fmt)
+    pd.testing.assert_frame_equal(read_export(selected.getvalue(), fmt), read_export(whole.getvalue(), fmt))
+    with pytest.raises(KeyError):
+        write_export(table, io.BytesIO(), fmt, rows=[-1])
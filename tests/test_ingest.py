@@ -0,0 +1,122 @@
+import os
+
+import pandas as pd
+import pytest
+
+import process_data
+from process_data import (load_and_merge_data, clean_data, to_columnar, invoice_partial, build_customer_month_cube,
+                          run_incremental, find_raw_files, stream_clean, load_and_clean_parallel, match_returns,
+                          write_returns, write_returns_by_bucket)
+from analytics import CORE_COLUMNS, read_data
+
+@pytest.fixture
+def cleaned(raw_dir):
+    """Reference: the serial full rebuild (load_and_merge_data + clean_data), typed for storage."""
+    return to_columnar(clean_data(load_and_merge_data(str(raw_dir)), verbose=False)).reset_index(drop=True)
+
+def test_parquet_matches_csv(cleaned, tmp_path):
+    cleaned.drop(columns='InvoiceMonth').to_csv(tmp_path / 'online_retail_cleaned.csv', index=False)
+    from_csv = read_data(CORE_COLUMNS, data_dir=str(tmp_path))
+    cleaned.to_parquet(tmp_path / 'online_retail_cleaned.parquet', index=False)
+    from_parquet = read_data(CORE_COLUMNS, data_dir=str(tmp_path))
+    assert list(from_parquet.columns) == CORE_COLUMNS
+    assert isinstance(from_parquet['Country'].dtype, pd.CategoricalDtype)
+    assert from_parquet['Customer ID'].dtype == 'int32'
+    assert isinstance(from_parquet['InvoiceMonth'].dtype, pd.PeriodDtype)
+    pd.testing.assert_frame_equal(from_parquet, from_csv, check_dtype=False, check_categorical=False)
+
+def test_parallel_matches_serial(raw_dir, cleaned):
+    df = load_and_clean_parallel(find_raw_files(str(raw_dir)), workers=2, chunk_mb=1)
+    pd.testing.assert_frame_equal(to_columnar(df), cleaned)
+
+def test_stream_matches_full(raw_dir, cleaned, tmp_path):
+    parquet_file = tmp_path / 'cleaned.parquet'
+    cube = stream_clean(find_raw_files(str(raw_dir)), tmp_path / 'cleaned.csv', parquet_file, chunksize=1500)
+    streamed = pd.read_parquet(parquet_file)
+    pd.testing.assert_frame_equal(streamed, cleaned, check_categorical=False)
+    pd.testing.assert_frame_equal(cube, build_customer_month_cube([invoice_partial(cleaned)]))
+    assert not (tmp_path / process_data.CUBE_PARTIALS_DIR).exists()
+    # UTF-8 like the batch path, whatever the locale
+    from_csv = pd.read_csv(tmp_path / 'cleaned.csv', encoding='utf-8', dtype={'Invoice': str, 'StockCode': str})
+    pd.testing.assert_series_equal(from_csv['Country'], cleaned['Country'].astype(str), check_dtype=False)
+
+def test_incremental_matches_full(raw_dir, cleaned, tmp_path):
+    processed = tmp_path / 'processed'
+    processed.mkdir()
+    run_incremental(str(raw_dir), str(processed))
+    # A second run with unchanged files is a no-op
+    run_incremental(str(raw_dir), str(processed))
+    stored = read_data(data_dir=str(processed))
+    expected = cleaned.sort_values('InvoiceDate', kind='stable', ignore_index=True)
+    pd.testing.assert_frame_equal(stored[expected.columns], expected, check_categorical=False)
+    cube = pd.read_parquet(processed / process_data.CUBE_FILE)
+    pd.testing.assert_frame_equal(cube, build_customer_month_cube([invoice_partial(cleaned)]))
+
+def test_incremental_skips_rows_of_overlapping_new_file(raw_dir, cleaned, tmp_path):
+    processed = tmp_path / 'processed'
+    processed.mkdir()
+    run_incremental(str(raw_dir), str(processed))
+    # A new export repeating the last 4 rows already ingested, followed by one new invoice
+    last_file = find_raw_files(str(raw_dir))[-1]
+    with open(last_file, encoding='utf-8') as f:
+        header, *rows = f.read().splitlines()
+    new_row = rows[-1].split(';')
+    new_row[0], new_row[4] = '999999', '31/12/2011 10:00'
+    with open(raw_dir / '2012.csv', 'w', encoding='utf-8') as f:
+        f.write('\n'.join([header] + rows[-4:] + [';'.join(new_row)]) + '\n')
+    run_incremental(str(raw_dir), str(processed))
+    stored = read_data(data_dir=str(processed))
+    assert len(stored) == len(cleaned) + 1
+    assert (stored['Invoice'] == '999999').sum() == 1
+
+def test_parallel_small_chunks_keep_string_codes(raw_dir):
+    # ~20 KB chunks: most contain no cancellation, so Invoice would otherwise parse as integers
+    df = load_and_clean_parallel(find_raw_files(str(raw_dir)), workers=2, chunk_mb=0.02)
+    serial = clean_data(load_and_merge_data(str(raw_dir)), verbose=False).reset_index(drop=True)
+    assert df['Invoice'].map(type).eq(str).all() and df['StockCode'].map(type).eq(str).all()
+    pd.testing.assert_frame_equal(df, serial)
+
+def assert_returns_equal(path, expected_path):
+    for name, keys in ((process_data.RETURNS_FILE, ['ReturnInvoice', 'StockCode', 'ReturnQuantity', 'ReturnDate']),
+                       (process_data.RETURN_SUMMARY_FILE, ['Customer ID', 'StockCode'])):
+        expected = pd.read_parquet(expected_path / name).sort_values(keys, ignore_index=True)
+        actual = pd.read_parquet(path / name).sort_values(keys, ignore_index=True)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_categorical=False)
+
+def test_match_returns_claims_each_purchase_once():
+    df = pd.DataFrame({
+        'Invoice': ['1', '2', 'C3', 'C4', 'C5'],
+        'StockCode': ['A'] * 5,
+        'Customer ID': [7] * 5,
+        'Country': ['France'] * 5,
+        'InvoiceDate': pd.to_datetime(['2010-01-01', '2010-02-01', '2010-03-01', '2010-03-02', '2010-03-03']),
+        'Quantity': [5, 2, -2, -2, -1],
+        'TotalAmount': [5.0, 2.0, -2.0, -2.0, -1.0],
+    })
+    matched = match_returns(df)
+    assert matched['OriginalInvoice'].tolist()[:2] == ['2', '1']
+    assert matched['Match'].tolist() == ['quantity', 'product', 'unmatched']
+
+def test_returns_by_bucket_match_in_memory(cleaned, tmp_path):
+    parquet_file = tmp_path / 'cleaned.parquet'
+    cleaned.to_parquet(parquet_file, index=False, row_group_size=2000)
+    (tmp_path / 'full').mkdir()
+    (tmp_path / 'buckets').mkdir()
+    write_returns(cleaned, str(tmp_path / 'full'))
+    write_returns_by_bucket(str(parquet_file), str(tmp_path / 'buckets'), buckets=7)
+    assert not (tmp_path / 'buckets' / 'returns_buckets.tmp').exists()
+    assert_returns_equal(tmp_path / 'buckets', tmp_path / 'full')
+
+def test_incremental_returns_match_full(raw_dir, cleaned, tmp_path):
+    processed, full = tmp_path / 'processed', tmp_path / 'full'
+    processed.mkdir()
+    full.mkdir()
+    # First year, then the second year as a new export: only its customers are re-matched
+    last_file = find_raw_files(str(raw_dir))[-1]
+    held = tmp_path / 'held.csv'
+    os.replace(last_file, held)
+    run_incremental(str(raw_dir), str(processed))
+    os.replace(held, last_file)
+    run_incremental(str(raw_dir), str(processed))
+    write_returns(cleaned, str(full))
+    assert_returns_equal(processed, full)
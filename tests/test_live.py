@@ -0,0 +1,49 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import LiveAggregates, LiveFeed, kpi_summary, calculate_cohorts, calculate_clv_empirical, calculate_rfm
+
+def live_batches(lines, n_batches=12, seed=0):
+    """The dataset cut into batches at random rows (invoices split across batches), in shuffled order."""
+    rng = np.random.default_rng(seed)
+    bounds = np.r_[0, np.sort(rng.choice(len(lines), n_batches - 1, replace=False)), len(lines)]
+    batches = [lines.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    return [batches[i] for i in rng.permutation(n_batches)]
+
+def test_live_aggregates_match_batch_computation(lines):
+    aggregates = LiveAggregates()
+    for batch in live_batches(lines):
+        aggregates.update(batch)
+    kpis = aggregates.kpis()
+    assert {key: kpis[key] for key in ('total_revenue', 'active_customers', 'avg_order_value')} == pytest.approx(kpi_summary(lines))
+    retention, _, _ = calculate_cohorts(lines)
+    assert kpis['avg_retention'] == pytest.approx(retention.iloc[:, 1:].mean().mean())
+    assert kpis['avg_clv'] == pytest.approx(calculate_clv_empirical(lines).max())
+    assert kpis['lines'] == len(lines) and kpis['last_invoice_date'] == lines['InvoiceDate'].max()
+    pd.testing.assert_frame_equal(aggregates.rfm(), calculate_rfm(lines), check_dtype=False, check_exact=False)
+
+def test_live_feed_reads_dropped_files(lines, tmp_path):
+    aggregates = LiveAggregates()
+    aggregates.update(lines.iloc[:1000])
+    (tmp_path / 'incoming').mkdir()
+    lines.iloc[1000:1500].to_csv(tmp_path / 'incoming' / 'batch_0001.csv', index=False)
+    # A file still being written (temporary name) and one just modified are left for a later poll
+    lines.iloc[2000:2500].to_csv(tmp_path / 'incoming' / 'batch_0002.csv.tmp', index=False)
+    lines.iloc[2500:3000].to_csv(tmp_path / 'incoming' / 'batch_0003.csv', index=False)
+    settled = time.time() - 60
+    os.utime(tmp_path / 'incoming' / 'batch_0001.csv', (settled, settled))
+    feed = LiveFeed(aggregates, folder=str(tmp_path), settle_seconds=30)
+    feed.submit(lines.iloc[1500:2000])
+    assert feed.poll() == 1000
+    assert (tmp_path / 'ingested' / 'batch_0001.csv').exists()
+    assert sorted(os.listdir(tmp_path / 'incoming')) == ['batch_0002.csv.tmp', 'batch_0003.csv']
+    assert aggregates.kpis()['total_revenue'] == pytest.approx(kpi_summary(lines.iloc[:2000])['total_revenue'])
+    os.replace(tmp_path / 'incoming' / 'batch_0002.csv.tmp', tmp_path / 'incoming' / 'batch_0002.csv')
+    for name in ('batch_0002.csv', 'batch_0003.csv'):
+        os.utime(tmp_path / 'incoming' / name, (settled, settled))
+    assert feed.poll() == 1000
+    assert aggregates.kpis()['total_revenue'] == pytest.approx(kpi_summary(lines.iloc[:3000])['total_revenue'])
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from analytics import SketchIndex, QuantileSketch, HyperLogLog, filter_data, whole_months
+
+def test_whole_months():
+    assert [str(d) for d in whole_months(('2010-02-10', '2011-06-20'))] == ['2010-02-01', '2011-06-30']
+
+def test_hyperloglog_within_error():
+    values = np.arange(200_000) * 7 + 3
+    sketch = HyperLogLog().add(values[:120_000]).merge(HyperLogLog().add(values[80_000:]))
+    assert sketch.count() == pytest.approx(len(values), rel=4 * sketch.relative_error)
+
+def test_quantile_sketch_within_accuracy():
+    values = np.random.default_rng(0).lognormal(5, 1, 50_000)
+    sketch = QuantileSketch(0.01).add(values)
+    for q in (0.25, 0.5, 0.75):
+        assert sketch.quantile(q) == pytest.approx(np.quantile(values, q, method='lower'), rel=0.011)
+
+@pytest.mark.parametrize('country_filter', [['All'], ['Country 00', 'Country 02']])
+def test_sketch_index_active_customers(lines, country_filter):
+    index = SketchIndex(lines)
+    date_range = whole_months(('2010-03-15', '2011-02-20'))
+    exact = filter_data(lines, country_filter, date_range)['Customer ID'].nunique()
+    assert index.active_customers(country_filter, date_range) == pytest.approx(exact, rel=4 * index.customer_error)